@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""This module edits many files from the command line, without a
+display.
+
+It finds, replaces, converts encodings and normalizes newlines the
+same way the editor does: files are decoded by file_io.read_text like
+the FileLoader decodes them, searched over a Document snapshot with
+the functions of the find bar, and written by file_io.write_text like
+the FileSaver writes them. Files are processed by a pool of processes,
+and the result of every file is printed as soon as it and the files
+before it are done, one line of text or JSON per file.
+
+Usage:
+    python -m text_editor --batch [options] path [path ...]
+"""
+
+import argparse
+import codecs
+import json
+import os
+import re
+import sys
+from collections import deque, namedtuple
+from document import Document
+from file_io import FileFormat, BOMS, read_text, write_text
+import search
+
+# Files with a zero character among their first BINARY_SAMPLE
+# characters are considered binary and skipped.
+BINARY_SAMPLE = search.BINARY_SAMPLE
+# Number of files a worker of the pool gets at once.
+CHUNK_SIZE = 16
+# Number of chunks handed to the pool ahead of the one whose results
+# are printed next, per worker.
+CHUNKS_AHEAD = 4
+# Newlines by their names on the command line.
+NEWLINES = {"lf": "\n", "crlf": "\r\n", "cr": "\r", "native": os.linesep}
+# Exit statuses
+OK = 0
+NO_MATCHES = 1
+ERRORS = 2
+
+# What is done to every file: pattern is a compiled query or None,
+# replacement is None when only searching, encoding and newline are
+# None when they are kept, bom is None when its presence is kept.
+Job = namedtuple("Job", "pattern replacement expand encoding newline bom "
+                        "dry_run max_matches")
+
+
+def target_format(file_format, encoding=None, newline=None, bom=None):
+    """Returns the format a file is converted to.
+    Args:
+        file_format (FileFormat): format the file were read with;
+        encoding (str): name of the new encoding, None to keep it;
+        newline (str): new newline, None to keep it;
+        bom (bool): whether the file starts with a byte order mark,
+            None to keep it. UTF-16 and UTF-32 always get one, they
+            can't be told apart from other encodings without it.
+    Returns:
+        (FileFormat): the new format.
+    Raises:
+        LookupError: if there is no codec for the encoding.
+    """
+    if encoding is None:
+        encoding = file_format.encoding
+    # Codecs that write their own BOM are replaced by the little
+    # endian ones, the BOM is written by write_text
+    name = codecs.lookup(encoding).name
+    if name in ("utf-16", "utf-32"):
+        encoding = name + "-le"
+    elif name == "utf-8-sig":
+        encoding, bom = "utf-8", True if bom is None else bom
+    name = codecs.lookup(encoding).name
+    if name == codecs.lookup(file_format.encoding).name:
+        # Other spelling of the same encoding is no conversion
+        encoding = file_format.encoding
+    if bom is None:
+        bom = bool(file_format.bom)
+    if name.startswith(("utf-16", "utf-32")):
+        bom = True
+    mark = b""
+    if bom:
+        mark = next((mark for mark, bom_encoding in BOMS
+                     if codecs.lookup(bom_encoding).name == name), b"")
+    return FileFormat(encoding, mark, newline or file_format.newline)
+
+
+def process_file(path, job):
+    """Does the job to one file, task of the process pool.
+    Returns:
+        dict: result of the file, see format_result.
+    """
+    result = {"file": path}
+    try:
+        text, file_format, _ = read_text(path)
+    except OSError as error:
+        result["error"] = str(error)
+        return result
+    if "\0" in text[:BINARY_SAMPLE]:
+        result["skipped"] = "binary"
+        return result
+    result["format"] = file_format.describe()
+    document = Document(text)
+    del text
+    changed = False
+
+    if job.pattern is not None:
+        matches = 0
+        lines = []
+        if job.replacement is None:
+            for starts, _ in search.find_all(job.pattern,
+                                             document.snapshot()):
+                for start in starts:
+                    matches += 1
+                    if len(lines) >= job.max_matches:
+                        continue
+                    line, column = document.offset_to_position(start)
+                    lines.append((line + 1, column + 1, document.get_line(
+                        line)[:search.MAX_LINE_LENGTH]))
+            result["lines"] = lines
+        else:
+            # The same edits as the Replace all of the find bar
+            edits = search.plan_replacements(
+                job.pattern, document.snapshot(), job.replacement,
+                expand=job.expand)
+            merged = search.merge_edits(edits, document)
+            for start, end, replacement in reversed(merged):
+                document.replace(start, end - start, replacement)
+            matches = len(edits)
+            changed = matches > 0
+        result["matches"] = matches
+
+    try:
+        new_format = target_format(file_format, job.encoding, job.newline,
+                                   job.bom)
+    except LookupError as error:
+        result["error"] = str(error)
+        return result
+    if new_format != file_format._replace(mixed=False):
+        changed = True
+    if changed and new_format != file_format:
+        # Mixed newlines are written as one kind too
+        result["new_format"] = new_format.describe()
+    result["changed"] = changed
+    if changed and not job.dry_run:
+        try:
+            result["written"] = write_text(path, document.iter_chunks(),
+                                           new_format)
+        except (OSError, ValueError) as error:
+            result["error"] = str(error)
+    return result
+
+
+def process_files(paths, job):
+    """Task of the process pool, does the job to a chunk of files."""
+    return [process_file(path, job) for path in paths]
+
+
+def iter_paths(paths):
+    """Yields the files and the files of the directory trees, the
+    same ones the search in files goes through."""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from search.iter_files(path)
+        else:
+            yield path
+
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(paths, job, workers=None):
+    """Does the job to the files.
+    Args:
+        paths (iterable): paths to the files;
+        job (Job): what is done to every file;
+        workers (int): number of processes, the files are processed
+            in this process if 1, the number of CPUs if None.
+    Yields:
+        dict: results of the files, in the order of the paths.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = iter_chunks(paths, CHUNK_SIZE)
+    if workers == 1:
+        for chunk in chunks:
+            yield from process_files(chunk, job)
+        return
+    # The process pool is imported only when it is used
+    import concurrent.futures # pylint: disable=import-outside-toplevel
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers) as executor:
+        # Only a few chunks are submitted ahead, so the results are
+        # streamed and the list of the files is never held at once
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(process_files, chunk, job))
+            if len(pending) >= workers * CHUNKS_AHEAD:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def format_result(result):
+    """Formats the result of a file as lines of text.
+    Args:
+        result (dict): result of process_file, with the "file" key and
+            any of "error", "skipped", "format", "new_format",
+            "matches", "lines", "changed" and "written".
+    Returns:
+        list: the lines.
+    """
+    path = result["file"]
+    if "error" in result:
+        return ["{}: error: {}".format(path, result["error"])]
+    lines = ["{}:{}:{}: {}".format(path, *line)
+             for line in result.get("lines", ())]
+    if result.get("changed"):
+        parts = []
+        if "lines" not in result and result.get("matches"):
+            parts.append("{} replaced".format(result["matches"]))
+        if "new_format" in result:
+            parts.append("{} -> {}".format(result["format"],
+                                           result["new_format"]))
+        if "written" not in result:
+            parts.append("not written")
+        lines.append("{}: {}".format(path, ", ".join(parts)))
+    return lines
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m text_editor --batch",
+        description="Finds, replaces, converts encodings and normalizes "
+                    "newlines in files without opening the editor.")
+    parser.add_argument("paths", nargs="+", metavar="path",
+                        help="file or directory, directories are "
+                             "searched recursively")
+    parser.add_argument("--find", metavar="QUERY",
+                        help="text, or pattern with --regex, to look for")
+    parser.add_argument("--replace", metavar="TEXT",
+                        help="replaces all matches of --find, "
+                             "backreferences are expanded with --regex")
+    parser.add_argument("--regex", action="store_true",
+                        help="the query is a regular expression")
+    parser.add_argument("--match-case", action="store_true",
+                        help="the case of the letters must match")
+    parser.add_argument("--encoding", metavar="NAME",
+                        help="converts the files to the encoding")
+    parser.add_argument("--newline", choices=sorted(NEWLINES),
+                        help="converts the newlines of the files")
+    bom = parser.add_mutually_exclusive_group()
+    bom.add_argument("--bom", dest="bom", action="store_true",
+                     default=None, help="adds a byte order mark")
+    bom.add_argument("--no-bom", dest="bom", action="store_false",
+                     help="removes the byte order mark")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="reports the changes without writing them")
+    parser.add_argument("--max-matches", type=int,
+                        default=search.MAX_FILE_MATCHES, metavar="N",
+                        help="matched lines reported per file")
+    parser.add_argument("--jobs", "-j", type=int, metavar="N",
+                        help="number of processes, the number of CPUs "
+                             "by default")
+    parser.add_argument("--json", action="store_true",
+                        help="prints the result of every file as a line "
+                             "of JSON")
+    return parser
+
+
+def make_job(args, parser):
+    """Makes the Job from the parsed arguments, exits with a usage
+    error if they don't fit together."""
+    if args.replace is not None and args.find is None:
+        parser.error("--replace needs --find")
+    if (args.find is None and args.encoding is None
+            and args.newline is None and args.bom is None):
+        parser.error("nothing to do, give --find, --encoding, --newline "
+                     "or --bom")
+    if args.encoding is not None:
+        try:
+            codecs.lookup(args.encoding)
+        except LookupError:
+            parser.error("unknown encoding: {}".format(args.encoding))
+    pattern = None
+    if args.find is not None:
+        mode = search.query_mode(args.regex, args.match_case)
+        try:
+            pattern = search.compile_query(args.find, mode)
+        except re.error as error:
+            parser.error("invalid pattern: {}".format(error))
+    return Job(pattern, args.replace, args.regex, args.encoding,
+               NEWLINES.get(args.newline), args.bom, args.dry_run,
+               args.max_matches)
+
+
+def main(argv=None):
+    """Runs the batch mode.
+    Args:
+        argv (list): command line arguments, the ones of the process
+            if None.
+    Returns:
+        int: exit status, OK, NO_MATCHES if only searching and nothing
+            were found, or ERRORS if some files failed.
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    job = make_job(args, parser)
+
+    files = matches = changed = errors = 0
+    for result in run(iter_paths(args.paths), job, args.jobs):
+        files += 1
+        matches += result.get("matches", 0)
+        changed += bool(result.get("changed"))
+        errors += "error" in result
+        if args.json:
+            print(json.dumps(result), flush=True)
+            continue
+        for line in format_result(result):
+            print(line, flush=True,
+                  file=sys.stderr if "error" in result else sys.stdout)
+    print("{} files, {} matches, {} {}, {} errors".format(
+        files, matches, changed,
+        "to change" if args.dry_run else "changed", errors), file=sys.stderr)
+    if errors:
+        return ERRORS
+    if job.pattern is not None and job.replacement is None and not matches:
+        return NO_MATCHES
+    return OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Measures how long text_editor takes to start.
+
+Every run starts a new interpreter that opens the file and reports
+when the editor reached each stage, times are counted from the start
+of the interpreter:
+    import - text_editor module is imported;
+    first_paint - the text widget is drawn for the first time;
+    editable - the file is completely loaded and can be edited.
+
+Needs a display. Usage:
+    python benchmarks/startup.py [--runs N] [--json] [file]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ("import", "first_paint", "editable")
+# Seconds a run may take before it is given up, the editor may never
+# be drawn without a display or a window manager.
+TIMEOUT = 60
+# Milliseconds between the checks of the child for the last stage.
+CHECK_INTERVAL = 1
+
+
+def run_child(file):
+    """Starts the editor with the file and prints timestamps of the
+    stages as JSON.
+    Returns:
+        int: exit status, 1 if the editor didn't reach the last stage
+            in TIMEOUT seconds.
+    """
+    deadline = time.time() + TIMEOUT
+    sys.path.insert(0, ROOT)
+    import tkinter as tk # pylint: disable=import-outside-toplevel
+    import text_editor # pylint: disable=import-outside-toplevel
+    times = {"import": time.time()}
+
+    root = tk.Tk()
+    editor = text_editor.TextEditor(root, file=file, session_file=None,
+                                    journal_dir=None)
+    editor.text.bind('<Expose>',
+                     lambda event: times.setdefault("first_paint", time.time()),
+                     add=True)
+
+    def check():
+        if "first_paint" in times and editor.loader is None:
+            times["editable"] = time.time()
+            print(json.dumps(times))
+            root.destroy()
+        elif time.time() > deadline:
+            print("Timed out, reached: {}".format(", ".join(times)),
+                  file=sys.stderr)
+            root.destroy()
+        else:
+            root.after(CHECK_INTERVAL, check)
+
+    root.after(CHECK_INTERVAL, check)
+    root.mainloop()
+    return 0 if "editable" in times else 1
+
+
+def measure(file, runs):
+    """Returns dict of lists of milliseconds each stage took.
+    Raises:
+        subprocess.CalledProcessError: if a run failed or timed out in
+            the child;
+        subprocess.TimeoutExpired: if a run didn't end in time.
+    """
+    results = {stage: [] for stage in STAGES}
+    for _ in range(runs):
+        started = time.time()
+        # The child gives up on its own, the timeout here catches a
+        # child stuck before its loop runs
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", file],
+            check=True, capture_output=True, text=True,
+            timeout=TIMEOUT * 2).stdout
+        times = json.loads(output.splitlines()[-1])
+        for stage in STAGES:
+            results[stage].append((times[stage] - started) * 1000)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", nargs="?",
+                        default=os.path.join(ROOT, "text_editor.py"),
+                        help="file to open, text_editor.py by default")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as JSON")
+    parser.add_argument("--child", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.exit(run_child(args.file))
+
+    try:
+        results = measure(os.path.abspath(args.file), args.runs)
+    except subprocess.CalledProcessError as error:
+        # The last line of the child's output tells what went wrong
+        lines = error.stderr.strip().splitlines()
+        sys.exit("Run failed: {}".format(lines[-1] if lines else error))
+    except subprocess.TimeoutExpired:
+        sys.exit("Run didn't end in {} seconds".format(TIMEOUT * 2))
+    summary = {stage: {"median": statistics.median(values),
+                       "min": min(values), "max": max(values)}
+               for stage, values in results.items()}
+    if args.json:
+        print(json.dumps({"file": args.file, "runs": args.runs,
+                          "ms": summary}, indent=1))
+        return
+    for stage in STAGES:
+        print("{:12} median {median:8.1f} ms  min {min:8.1f} ms  "
+              "max {max:8.1f} ms".format(stage, **summary[stage]))
+
+
+if __name__ == '__main__':
+    main()
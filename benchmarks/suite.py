@@ -0,0 +1,454 @@
+#!/usr/bin/env python
+"""Benchmarks of the core operations of the editor.
+
+Synthetic files of every size and shape are generated in a temporary
+directory, the shapes are:
+    short - lines of 40 characters;
+    long - lines of 10,000 characters;
+    huge_line - the whole file on a single line.
+
+Model benchmarks time the Document, the decoding and encoding of the
+files, search and diff without any window, so they run everywhere.
+The diff compares texts of DIFF_LINES distinct lines that look like
+source code, with DIFF_EDITS lines changed, inserted or deleted at
+random places, like a big file after a few edits.
+GUI benchmarks open the files in a TextEditor and time
+FileMenuMethods.open, save, typing, scrolling, LineNumbers refresh,
+paste and search. They need a display, e.g. Xvfb:
+    xvfb-run python benchmarks/suite.py
+and are skipped when there is none.
+
+Results are written as JSON. They are compared with the baseline if
+it exists, and the script exits with status 1 if any benchmark got
+slower than the tolerance allows. Usage:
+    python benchmarks/suite.py [--sizes 1M,16M] [--shapes short,long]
+        [--repeat N] [--output FILE] [--baseline FILE]
+        [--update-baseline] [--tolerance 0.25] [--no-gui]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+import file_io
+import search
+from diff import diff_lines
+from document import Document
+from undo import UndoHistory
+
+SHAPES = ("short", "long", "huge_line")
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+# Word searched for, there is one in every NEEDLE_EVERY lines or
+# NEEDLE_EVERY * 40 characters of the huge line.
+NEEDLE = "needle"
+NEEDLE_EVERY = 1000
+# Number of keystrokes, scrolled pages and refreshes timed by one run.
+KEYSTROKES = 200
+PAGES = 50
+REFRESHES = 50
+# Size of the pasted text, in characters.
+PASTE_SIZE = 1024 * 1024
+# Number of lines of the texts compared by the diff benchmarks, and
+# number of lines edited between them.
+DIFF_LINES = 1000000
+DIFF_EDITS = 100
+# Baseline times below this number of seconds are too noisy to be
+# compared.
+MIN_COMPARED = 0.0005
+
+
+def parse_size(size):
+    """Converts sizes like "512K", "16M" or "1G" to bytes."""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    size = size.strip().upper()
+    if size[-1:] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def make_file(directory, shape, size, label):
+    """Writes a file of the shape and of exactly size bytes.
+    Returns:
+        str: path to the file.
+    """
+    if shape == "short":
+        line = "a short line of text with a few words.\n"
+        lines = [line] * (NEEDLE_EVERY - 1) + [
+            line.replace("words", NEEDLE, 1)]
+    elif shape == "long":
+        line = ("a long line " * 834)[:9999] + "\n"
+        lines = [line] * 9 + [line.replace("long", NEEDLE, 1)]
+    else:
+        words = "no newlines at all " * (NEEDLE_EVERY * 2)
+        lines = [words + NEEDLE + " "]
+    block = "".join(lines).encode("utf-8")
+    path = os.path.join(directory, "{}_{}.txt".format(shape, label))
+    with open(path, 'wb') as work_file:
+        written = 0
+        while written < size:
+            chunk = block[:size - written]
+            work_file.write(chunk)
+            written += len(chunk)
+    return path
+
+
+def measure(function, repeat, setup=None):
+    """Calls the function repeat times.
+    Returns:
+        list: seconds every call took. A float returned by the
+            function is used instead, it is the time of one of the
+            operations done by the call.
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        started = time.perf_counter()
+        result = function(argument) if setup is not None else function()
+        elapsed = time.perf_counter() - started
+        times.append(result if isinstance(result, float) else elapsed)
+    return times
+
+
+def summary(times, **extra):
+    result = {"seconds": min(times), "median": statistics.median(times),
+              "runs": len(times)}
+    result.update(extra)
+    return result
+
+
+def per_operation(latencies):
+    """Mean latency of one operation, with its 99th percentile."""
+    latencies = sorted(latencies)
+    return statistics.mean(latencies), latencies[
+        min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+
+# Model benchmarks
+
+def model_benchmarks(path, repeat):
+    results = {}
+    text, file_format, _ = file_io.read_text(path)
+
+    results["load"] = summary(measure(
+        lambda: Document(file_io.read_text(path)[0]), repeat))
+
+    document = Document(text)
+
+    def save():
+        output = path + ".out"
+        with open(output, 'w', encoding=file_format.encoding,
+                  errors=file_io.ENCODING_ERRORS,
+                  newline=file_format.newline,
+                  buffering=file_io.WRITE_BUFFER) as work_file:
+            for chunk in document.iter_chunks():
+                work_file.write(chunk)
+        os.remove(output)
+    results["save"] = summary(measure(save, repeat))
+
+    def typing():
+        history = UndoHistory()
+        random.seed(0)
+        latencies = []
+        offset = len(document) // 2
+        for _ in range(KEYSTROKES):
+            started = time.perf_counter()
+            document.insert(offset, "x")
+            history.record("insert", offset, "x")
+            document.line_of_offset(offset)
+            latencies.append(time.perf_counter() - started)
+            offset += 1
+        return per_operation(latencies)[0]
+    results["typing"] = summary(measure(typing, repeat))
+
+    def line_access():
+        random.seed(0)
+        started = time.perf_counter()
+        for _ in range(PAGES):
+            first = random.randrange(document.line_count)
+            for line in range(first, min(first + 50, document.line_count)):
+                document.get_line(line)[:1000]
+        return (time.perf_counter() - started) / PAGES
+    results["scroll"] = summary(measure(line_access, repeat))
+
+    paste = "pasted text\n" * (PASTE_SIZE // 12)
+    results["paste"] = summary(measure(
+        lambda pasted: pasted.insert(len(text) // 2, paste), repeat,
+        setup=lambda: Document(text)))
+
+    pattern = search.compile_query(NEEDLE)
+    results["search"] = summary(measure(
+        lambda: list(search.find_all(pattern, document.snapshot())), repeat))
+    return results
+
+
+def diff_benchmarks(repeat):
+    random.seed(0)
+    lines = ["    value_{} = compute({}, offset={})".format(
+        line, random.randrange(10 ** 6), random.random())
+             for line in range(DIFF_LINES)]
+    old_text = "\n".join(lines)
+    for _ in range(DIFF_EDITS):
+        line = random.randrange(len(lines))
+        edit = random.randrange(3)
+        if edit == 0:
+            lines[line] += "  # changed"
+        elif edit == 1:
+            lines.insert(line, "    inserted({})".format(random.random()))
+        else:
+            del lines[line]
+    new_text = "\n".join(lines)
+    del lines
+
+    # The lines are split from the texts for every run, like the
+    # lines of the file and of the Document are, so equal lines are
+    # different objects
+    results = {}
+    for name, patience in (("diff", False), ("diff_patience", True)):
+        results[name] = summary(measure(
+            lambda texts, patience=patience: diff_lines(
+                *texts, patience=patience),
+            repeat, setup=lambda: (old_text.split("\n"),
+                                   new_text.split("\n"))))
+    return results
+
+
+# GUI benchmarks
+
+def pump(root, condition, timeout=600):
+    """Runs the Tk loop until the condition is true."""
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise RuntimeError("timed out")
+        root.update()
+        time.sleep(0.0005)
+
+
+def gui_benchmarks(root, path, repeat):
+    import text_editor # pylint: disable=import-outside-toplevel
+    from text_editor import MenuMethods, FileMenuMethods # pylint: disable=import-outside-toplevel
+    editor = text_editor.TextEditor(root, session_file=None,
+                                    journal_dir=None)
+    root.update()
+    results = {}
+
+    def open_file():
+        MenuMethods.open(editor.text, editor, path)
+        pump(root, lambda: editor.loader is None)
+        root.update_idletasks()
+
+    def close_file(_=None):
+        editor.close_tab(editor.tab)
+        root.update()
+    results["open"] = summary(measure(
+        lambda _: open_file(), repeat, setup=close_file))
+    if editor.textspace.large_file is not None:
+        # Shown read-only, there is nothing to edit
+        editor.destroy()
+        return results
+    text = editor.text
+
+    def save():
+        FileMenuMethods._save_file(text, path + ".out", editor.tab,
+                                   wait=True)
+        os.remove(path + ".out")
+    results["save"] = summary(measure(save, repeat))
+
+    def typing():
+        text.mark_set("insert", "{}.0".format(
+            int(text.index("end").split(".")[0]) // 2))
+        text.see("insert")
+        root.update()
+        latencies = []
+        for _ in range(KEYSTROKES):
+            started = time.perf_counter()
+            text.insert("insert", "x")
+            root.update_idletasks()
+            latencies.append(time.perf_counter() - started)
+        mean, p99 = per_operation(latencies)
+        typing.p99.append(p99)
+        return mean
+    typing.p99 = []
+    times = measure(typing, repeat)
+    results["typing"] = summary(times, p99=min(typing.p99))
+
+    def scroll():
+        text.yview_moveto(0)
+        root.update()
+        started = time.perf_counter()
+        for _ in range(PAGES):
+            text.yview_scroll(1, "pages")
+            root.update_idletasks()
+        return (time.perf_counter() - started) / PAGES
+    results["scroll"] = summary(measure(scroll, repeat))
+
+    line_numbers = editor.textspace.line_numbers
+
+    def refresh():
+        started = time.perf_counter()
+        for _ in range(REFRESHES):
+            line_numbers.write_numbers()
+        return (time.perf_counter() - started) / REFRESHES
+    results["line_numbers"] = summary(measure(refresh, repeat))
+
+    def paste():
+        text.clipboard_clear()
+        text.clipboard_append("pasted text\n" * (PASTE_SIZE // 12))
+        started = time.perf_counter()
+        MenuMethods.paste(text)
+        root.update_idletasks()
+        elapsed = time.perf_counter() - started
+        text.edit_undo()
+        return elapsed
+    results["paste"] = summary(measure(paste, repeat))
+
+    findbar = editor.findbar
+
+    def find():
+        findbar.query.set(NEEDLE)
+        started = time.perf_counter()
+        findbar.show()
+        pump(root, lambda: findbar._search_job is None
+             and findbar.worker is None)
+        elapsed = time.perf_counter() - started
+        findbar.hide()
+        return elapsed
+    results["search"] = summary(measure(find, repeat))
+
+    text.edit_modified(False)
+    editor.destroy()
+    return results
+
+
+# Running and comparing
+
+def run(sizes, shapes, repeat, gui):
+    """Runs the benchmarks on the files of every size and shape.
+    Returns:
+        dict: results by names like "model.load/short/1M".
+    """
+    root = None
+    if gui:
+        import tkinter as tk # pylint: disable=import-outside-toplevel
+        try:
+            root = tk.Tk()
+            root.geometry("1000x700")
+        except tk.TclError as error:
+            print("GUI benchmarks skipped: {}".format(error),
+                  file=sys.stderr)
+    results = {}
+    directory = tempfile.mkdtemp(prefix="text_editor_bench.")
+    try:
+        for label in sizes:
+            for shape in shapes:
+                path = make_file(directory, shape, parse_size(label), label)
+                groups = [("model", model_benchmarks)]
+                if root is not None:
+                    groups.append(("gui", lambda path, repeat:
+                                   gui_benchmarks(root, path, repeat)))
+                for group, benchmarks in groups:
+                    for name, result in benchmarks(path, repeat).items():
+                        key = "{}.{}/{}/{}".format(group, name, shape, label)
+                        results[key] = result
+                        print("{:36} {:12.3f} ms".format(
+                            key, result["seconds"] * 1000), file=sys.stderr)
+                os.remove(path)
+        for name, result in diff_benchmarks(repeat).items():
+            key = "model.{}/unique/{}".format(name, DIFF_LINES)
+            results[key] = result
+            print("{:36} {:12.3f} ms".format(key, result["seconds"] * 1000),
+                  file=sys.stderr)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        if root is not None:
+            root.destroy()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Compares the results with the baseline ones.
+    Returns:
+        list: (name, baseline seconds, seconds, ratio) of the
+            benchmarks that got slower than the tolerance allows.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or base["seconds"] < MIN_COMPARED:
+            continue
+        ratio = result["seconds"] / base["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, base["seconds"], result["seconds"],
+                                ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1M,16M",
+                        help="comma separated sizes of the files, like "
+                             "1M,16M,1G")
+    parser.add_argument("--shapes", default=",".join(SHAPES),
+                        help="comma separated shapes of the files")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="number of runs of every benchmark")
+    parser.add_argument("--output", help="file the results are written "
+                                         "to, stdout by default")
+    parser.add_argument("--baseline", default=BASELINE,
+                        help="results to compare with")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write the results to the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown, 0.25 is 25%%")
+    parser.add_argument("--no-gui", action="store_true",
+                        help="run only the model benchmarks")
+    args = parser.parse_args()
+
+    shapes = [shape for shape in args.shapes.split(",") if shape]
+    for shape in shapes:
+        if shape not in SHAPES:
+            parser.error("unknown shape: {}".format(shape))
+    results = run([size for size in args.sizes.split(",") if size], shapes,
+                  args.repeat, not args.no_gui)
+    report = {"python": platform.python_version(),
+              "platform": platform.platform(),
+              "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "results": results}
+
+    regressions = []
+    if args.update_baseline:
+        with open(args.baseline, 'w') as work_file:
+            json.dump(report, work_file, indent=1)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as work_file:
+            baseline = json.load(work_file)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        report["regressions"] = [
+            {"name": name, "baseline": base, "seconds": seconds,
+             "ratio": ratio} for name, base, seconds, ratio in regressions]
+        for name, base, seconds, ratio in regressions:
+            print("REGRESSION {}: {:.3f} ms -> {:.3f} ms ({:.0%})".format(
+                name, base * 1000, seconds * 1000, ratio - 1),
+                  file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as work_file:
+            json.dump(report, work_file, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""This module moves big texts through the clipboard without freezing
+    the editor.
+
+On X11 the editor owns the CLIPBOARD selection itself and serves it
+from a snapshot of the Document in pieces, as other programs ask for
+them, so a copied text is never joined into one string or copied into
+Tcl. A paste of the editor's own clipboard reads the same snapshot.
+X11 clipboards die with their owners, so on exit the text is handed
+over to a clipboard tool that keeps serving it. Other windowing
+systems keep the clipboard in the system, and the text is given to Tk
+the usual way.
+
+Big pastes are inserted a chunk at a time from after() jobs, as one
+undo step, while the statusbar shows the progress.
+"""
+
+import os
+import time
+from bisect import bisect_right
+import tkinter as tk
+from tkinter.constants import * # pylint: disable=unused-wildcard-import
+
+# Texts longer than this number of characters are pasted in chunks.
+PASTE_THRESHOLD = 256 * 1024
+# Number of characters inserted at once.
+PASTE_CHUNK = 64 * 1024
+# Time the Tk loop may spend inserting during one step, in seconds.
+TIME_BUDGET = 0.03
+# Delay between the steps, in milliseconds.
+STEP_INTERVAL = 1
+# Mark that follows the end of the pasted text.
+PASTE_MARK = "paste_end"
+# Tools that keep serving the clipboard after the editor exits, with
+# the environment variable they need.
+HANDOFF_COMMANDS = (
+    ("WAYLAND_DISPLAY", ("wl-copy",)),
+    ("DISPLAY", ("xclip", "-selection", "clipboard", "-in")),
+    ("DISPLAY", ("xsel", "--clipboard", "--input")),
+)
+ENCODING = "utf-8"
+
+
+class Clipboard:
+    """Text of the clipboard copied from the editor.
+
+    The text is kept as a snapshot of a Document, a list of
+    (str, start, end) slices which are never modified.
+    """
+    def __init__(self, widget):
+        """
+        Args:
+            widget (tk.Widget): widget that owns the selection.
+        """
+        self.widget = widget
+        self.slices = None
+        self.length = 0
+        # Offsets of the slices in the text, for bisection
+        self._starts = []
+        self._handler = False
+
+    @property
+    def owned(self):
+        """Whether the clipboard holds text copied from the editor."""
+        return self.slices is not None
+
+    def set(self, snapshot):
+        """Puts the text described by the snapshot into the clipboard.
+        Args:
+            snapshot (list): result of Document.snapshot.
+        """
+        self.slices = snapshot
+        self._starts = []
+        self.length = 0
+        for _, first, last in snapshot:
+            self._starts.append(self.length)
+            self.length += last - first
+        if self.widget.tk.call("tk", "windowingsystem") != "x11":
+            self.slices = None
+            self.widget.clipboard_clear()
+            self.widget.clipboard_append("".join(
+                text[first:last] for text, first, last in snapshot))
+            return
+        if not self._handler:
+            self.widget.selection_handle(self._handle, selection="CLIPBOARD")
+            self._handler = True
+        self.widget.selection_own(selection="CLIPBOARD", command=self._lost)
+
+    def iter_chunks(self, size=PASTE_CHUNK):
+        """Yields the text of the owned clipboard in chunks of at most
+        size characters."""
+        for text, first, last in self.slices or ():
+            for start in range(first, last, size):
+                yield text[start:min(start + size, last)]
+
+    def get(self):
+        """Returns the text of the clipboard, None if it is empty."""
+        if self.owned:
+            return "".join(self.iter_chunks())
+        try:
+            return self.widget.clipboard_get()
+        except tk.TclError:
+            return None
+
+    def is_filled(self):
+        """Checks if there is text to paste, without asking the owner
+        of the clipboard for the whole text when it can be helped."""
+        if self.owned:
+            return self.length > 0
+        try:
+            return bool(self.widget.clipboard_get(type="TARGETS"))
+        except tk.TclError:
+            # Not every windowing system knows TARGETS
+            try:
+                return bool(self.widget.clipboard_get())
+            except tk.TclError:
+                return False
+
+    def hand_off(self):
+        """Gives the text to a clipboard tool, so it can still be
+        pasted after the editor exits.
+        Returns:
+            bool: True if a tool took the text.
+        """
+        if not self.owned:
+            return False
+        import shutil # pylint: disable=import-outside-toplevel
+        import subprocess # pylint: disable=import-outside-toplevel
+        for variable, command in HANDOFF_COMMANDS:
+            path = shutil.which(command[0])
+            if not os.environ.get(variable) or path is None:
+                continue
+            try:
+                process = subprocess.Popen(
+                    (path,) + command[1:], stdin=subprocess.PIPE,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    start_new_session=True)
+                for chunk in self.iter_chunks():
+                    process.stdin.write(chunk.encode(ENCODING, "replace"))
+                process.stdin.close()
+            except OSError:
+                continue
+            return True
+        return False
+
+    def _handle(self, offset, length):
+        """Selection handler, returns at most length characters of the
+        text from offset."""
+        offset, end = int(offset), int(offset) + int(length)
+        end = min(end, self.length)
+        pieces = []
+        index = max(bisect_right(self._starts, offset) - 1, 0)
+        while offset < end and index < len(self.slices):
+            text, first, last = self.slices[index]
+            start = first + offset - self._starts[index]
+            stop = min(last, first + end - self._starts[index])
+            pieces.append(text[start:stop])
+            offset += stop - start
+            index += 1
+        return "".join(pieces)
+
+    def _lost(self):
+        """Another program took the clipboard."""
+        self.slices = None
+        self._starts = []
+        self.length = 0
+
+
+class ChunkedPaste:
+    """Inserts a big text at the cursor a chunk at a time.
+
+    The selection is replaced, and the deletion and all the chunks are
+    undone at once. The text is read-only until the paste is over,
+    like when a file is loaded.
+    """
+    def __init__(self, text, chunks, length, on_progress=None, on_done=None):
+        """
+        Args:
+            text (tk.Text): widget the text is pasted into;
+            chunks (iterable): strings the pasted text consists of;
+            length (int): length of the pasted text;
+            on_progress (callable): called with a float in range
+                between 0 and 1 after every step;
+            on_done (callable): called with True when the whole text
+                is pasted, or with False if the paste was cancelled.
+        """
+        self.text = text
+        self.chunks = iter(chunks)
+        self.length = length
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.pasted = 0
+        self.done = False
+        self._autoseparators = None
+        self._job = None
+
+    def start(self):
+        text = self.text
+        self._autoseparators = text.cget("autoseparators")
+        text.edit_separator()
+        text.config(autoseparators=False)
+        if text.tag_ranges(SEL):
+            text.delete(SEL_FIRST, SEL_LAST)
+        text.mark_set(PASTE_MARK, INSERT)
+        text.mark_gravity(PASTE_MARK, RIGHT)
+        text.config(state=DISABLED)
+        self._job = text.after(STEP_INTERVAL, self._step)
+
+    def cancel(self):
+        """Stops the paste, the text pasted so far stays."""
+        if not self.done:
+            self._finish(False)
+
+    def _step(self):
+        self._job = None
+        deadline = time.perf_counter() + TIME_BUDGET
+        while time.perf_counter() < deadline:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self._finish(True)
+                return
+            self.text.config(state=NORMAL)
+            self.text.insert(PASTE_MARK, chunk)
+            self.text.config(state=DISABLED)
+            self.pasted += len(chunk)
+        if self.on_progress and self.length:
+            self.on_progress(min(self.pasted / self.length, 1.0))
+        self._job = self.text.after(STEP_INTERVAL, self._step)
+
+    def _finish(self, completed):
+        self.done = True
+        text = self.text
+        if self._job is not None:
+            text.after_cancel(self._job)
+            self._job = None
+        text.config(state=NORMAL, autoseparators=self._autoseparators)
+        text.edit_separator()
+        text.mark_set(INSERT, PASTE_MARK)
+        text.mark_unset(PASTE_MARK)
+        text.see(INSERT)
+        if self.on_done:
+            self.on_done(completed)
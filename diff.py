@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""This module compares texts line by line.
+
+The lines the texts start and end with in common are cut off first by
+comparing whole slices of the lists of lines, which doesn't cost any
+python work per line. The lines left in between are replaced by an
+array of their hashes and compared with the Myers algorithm, which
+takes time proportional to the number of differences squared, and
+follows runs of equal lines by comparing slices as well. The runs
+found are checked against the lines themselves, a collision of hashes
+makes the lines compared again as they are. When the texts differ too
+much, the lines in between are reported as one changed block.
+
+The patience variant first matches the lines that occur once in both
+texts, and compares only the lines between them with Myers. A big
+text is split at such lines found by scanning the lists in C, so the
+python work depends on the number of differences rather than on the
+length of the texts. Small parts are split at all of their unique
+lines, kept in the order of both texts by the longest increasing
+subsequence.
+"""
+
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+# Number of differences after which the Myers algorithm gives up.
+MAX_COST = 2000
+# Parts of the texts with more lines than this are split at a line
+# found by scanning, smaller ones at all of their unique lines.
+SCAN_THRESHOLD = 256
+# Number of lines tried for a split found by scanning.
+SCAN_SAMPLES = 7
+
+
+def diff_lines(old, new, max_cost=MAX_COST, patience=False):
+    """Finds the blocks of lines that differ between two texts.
+    Args:
+        old (list): lines of the old text;
+        new (list): lines of the new text;
+        max_cost (int): number of differences after which the lines
+            between the common start and end, or between two unique
+            lines with patience, are reported as one block;
+        patience (bool): whether the lines that occur once in both
+            texts are matched first.
+    Returns:
+        list: (old_start, old_end, new_start, new_end) tuples in
+            ascending order, each meaning that old[old_start:old_end]
+            is replaced by new[new_start:new_end].
+    """
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, prefix)
+    old_end, new_end = len(old) - suffix, len(new) - suffix
+    if prefix == old_end and prefix == new_end:
+        return []
+    if patience:
+        matches = _patience(old, new, prefix, old_end, prefix, new_end,
+                            max_cost)
+    else:
+        matches = _hash_and_match(old, new, prefix, old_end, prefix,
+                                  new_end, max_cost)
+        if matches is None:
+            return [(prefix, old_end, prefix, new_end)]
+
+    hunks = []
+    old_line = new_line = prefix
+    for old_match, new_match, length in matches + [(old_end, new_end, 0)]:
+        if old_match > old_line or new_match > new_line:
+            hunks.append((old_line, old_match, new_line, new_match))
+        old_line, new_line = old_match + length, new_match + length
+    return hunks
+
+
+def text_edits(old, new, hunks):
+    """Turns the blocks of diff_lines into edits of the old text,
+    which lines are joined with "\\n".
+    Args:
+        old (list): lines of the old text;
+        new (list): lines of the new text;
+        hunks (list): result of diff_lines.
+    Returns:
+        list: (start, end, text) tuples in descending order, each
+            meaning that characters [start, end) of the old text are
+            replaced by the text. Applied in this order the offsets of
+            the following edits stay valid.
+    """
+    edits = []
+    offset = 0
+    line = 0
+    length = sum(map(len, old)) + len(old) - 1
+    for old_start, old_end, new_start, new_end in hunks:
+        offset += sum(map(len, old[line:old_start])) + old_start - line
+        line = old_start
+        end = offset + sum(map(len, old[old_start:old_end])) \
+            + old_end - old_start
+        if old_end < len(old):
+            # Lines are replaced together with their newlines
+            edits.append((offset, end, "".join(
+                text + "\n" for text in new[new_start:new_end])))
+        elif old_start == 0:
+            edits.append((0, length, "\n".join(new[new_start:new_end])))
+        else:
+            # The last line has no newline, the newline before the
+            # block is replaced instead
+            edits.append((offset - 1, length, "".join(
+                "\n" + text for text in new[new_start:new_end])))
+    edits.reverse()
+    return edits
+
+
+def _common_prefix(old, new):
+    """Number of lines both lists start with."""
+    return _matching_start(old, new, 0, len(old), 0, len(new))
+
+
+def _common_suffix(old, new, prefix):
+    """Number of lines both lists end with, not counting the first
+    prefix lines."""
+    return _matching_end(old, new, prefix, len(old), prefix, len(new))
+
+
+def _matching_start(old, new, old_start, old_end, new_start, new_end):
+    """Number of lines old[old_start:old_end] and new[new_start:new_end]
+    start with. Slices twice as long as the previous ones are compared
+    in C until one differs, and the differing one is bisected, so the
+    work depends on the number of the equal lines rather than on the
+    length of the lists."""
+    size = min(old_end - old_start, new_end - new_start)
+    low, high, step = 0, size, 1
+    while low < high:
+        middle = min(low + step, high)
+        if (old[old_start + low:old_start + middle]
+                == new[new_start + low:new_start + middle]):
+            low = middle
+            step *= 2
+        else:
+            high = middle - 1
+            break
+    while low < high:
+        middle = (low + high + 1) // 2
+        if (old[old_start + low:old_start + middle]
+                == new[new_start + low:new_start + middle]):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _matching_end(old, new, old_start, old_end, new_start, new_end):
+    """Number of lines old[old_start:old_end] and new[new_start:new_end]
+    end with, found the same way."""
+    size = min(old_end - old_start, new_end - new_start)
+    low, high, step = 0, size, 1
+    while low < high:
+        middle = min(low + step, high)
+        if (old[old_end - middle:old_end - low]
+                == new[new_end - middle:new_end - low]):
+            low = middle
+            step *= 2
+        else:
+            high = middle - 1
+            break
+    while low < high:
+        middle = (low + high + 1) // 2
+        if (old[old_end - middle:old_end - low]
+                == new[new_end - middle:new_end - low]):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _hash_and_match(old, new, old_start, old_end, new_start, new_end,
+                    max_cost):
+    """Compares old[old_start:old_end] and new[new_start:new_end] with
+    Myers, as arrays of the hashes of the lines.
+    Returns:
+        list: (old_start, new_start, length) runs of equal lines in
+            ascending order, None if the lines differ too much.
+    """
+    old_lines = old[old_start:old_end]
+    new_lines = new[new_start:new_end]
+    # Integers in an array compare faster than lines, and don't take
+    # an object per line
+    matches = _myers(array("q", map(hash, old_lines)),
+                     array("q", map(hash, new_lines)), max_cost)
+    if matches is not None and not all(
+            old_lines[old_match:old_match + length]
+            == new_lines[new_match:new_match + length]
+            for old_match, new_match, length in matches):
+        # Different lines with equal hashes
+        matches = _myers(old_lines, new_lines, max_cost)
+    if matches is None:
+        return None
+    return [(old_start + old_match, new_start + new_match, length)
+            for old_match, new_match, length in matches]
+
+
+def _patience(old, new, old_start, old_end, new_start, new_end, max_cost):
+    """Compares old[old_start:old_end] and new[new_start:new_end],
+    splitting them at the lines that occur once in both.
+    Returns:
+        list: (old_start, new_start, length) runs of equal lines in
+            ascending order. The lines between the splits that differ
+            too much have no runs.
+    """
+    runs = []
+    # Parts of the texts left to compare
+    parts = [(old_start, old_end, new_start, new_end)]
+    while parts:
+        old_start, old_end, new_start, new_end = parts.pop()
+        length = _matching_start(old, new, old_start, old_end,
+                                 new_start, new_end)
+        if length:
+            runs.append((old_start, new_start, length))
+            old_start += length
+            new_start += length
+        length = _matching_end(old, new, old_start, old_end,
+                               new_start, new_end)
+        if length:
+            old_end -= length
+            new_end -= length
+            runs.append((old_end, new_end, length))
+        if old_start == old_end or new_start == new_end:
+            continue
+
+        if max(old_end - old_start, new_end - new_start) > SCAN_THRESHOLD:
+            anchor = _scan_anchor(old, new, old_start, old_end,
+                                  new_start, new_end)
+            if anchor is not None:
+                old_line, new_line = anchor
+                runs.append((old_line, new_line, 1))
+                parts.append((old_start, old_line, new_start, new_line))
+                parts.append((old_line + 1, old_end, new_line + 1, new_end))
+                continue
+        anchors = _unique_anchors(old[old_start:old_end],
+                                  new[new_start:new_end])
+        if anchors is None:
+            continue
+        if not anchors:
+            runs.extend(_hash_and_match(old, new, old_start, old_end,
+                                        new_start, new_end, max_cost)
+                        or ())
+            continue
+        # Anchors that follow each other make one run, the lines
+        # between the runs are compared again
+        run = None
+        old_line, new_line = old_start, new_start
+        for old_anchor, new_anchor in anchors:
+            old_anchor += old_start
+            new_anchor += new_start
+            if (run is not None and old_anchor == old_line
+                    and new_anchor == new_line):
+                run[2] += 1
+            else:
+                if run is not None:
+                    runs.append(tuple(run))
+                if old_anchor > old_line or new_anchor > new_line:
+                    parts.append((old_line, old_anchor,
+                                  new_line, new_anchor))
+                run = [old_anchor, new_anchor, 1]
+            old_line, new_line = old_anchor + 1, new_anchor + 1
+        runs.append(tuple(run))
+        parts.append((old_line, old_end, new_line, new_end))
+    runs.sort()
+    return runs
+
+
+def _scan_anchor(old, new, old_start, old_end, new_start, new_end):
+    """Looks for a line of new[new_start:new_end] that occurs once in
+    it and once in old[old_start:old_end], trying lines from the
+    middle outwards.
+    Returns:
+        tuple: (old_line, new_line) positions of the line, None if
+            none of the tried lines fits.
+    """
+    size = new_end - new_start
+    tried = 0
+    parts = 2
+    while tried < SCAN_SAMPLES and parts <= size:
+        for part in range(1, parts, 2):
+            new_line = new_start + size * part // parts
+            line = new[new_line]
+            tried += 1
+            old_line = _find(old, line, old_start, old_end)
+            if (old_line is not None
+                    and _find(old, line, old_line + 1, old_end) is None
+                    and _find(new, line, new_start, new_line) is None
+                    and _find(new, line, new_line + 1, new_end) is None):
+                return old_line, new_line
+        parts *= 2
+    return None
+
+
+def _find(lines, line, start, end):
+    """Position of the first line equal to line in lines[start:end],
+    None if there is none."""
+    try:
+        return lines.index(line, start, end)
+    except ValueError:
+        return None
+
+
+def _unique_anchors(old, new):
+    """Finds the lines that occur once in both lists.
+    Returns:
+        list: (old_line, new_line) positions of the lines that keep
+            their order in both lists, ascending, None if the lists
+            have no line in common.
+    """
+    old_counts = Counter(old)
+    new_counts = Counter(new)
+    if old_counts.keys().isdisjoint(new_counts):
+        return None
+    positions = dict(zip(old, range(len(old))))
+    pairs = [(positions[line], new_line) for new_line, line in enumerate(new)
+             if new_counts[line] == 1 and old_counts.get(line) == 1]
+    # Longest increasing subsequence of the old positions by patience
+    # sorting: the smallest old position that ends a subsequence of
+    # every length, with the pair it belongs to
+    tails = []
+    ends = []
+    previous = []
+    for index, (old_line, _) in enumerate(pairs):
+        length = bisect_left(tails, old_line)
+        if length == len(tails):
+            tails.append(old_line)
+            ends.append(index)
+        else:
+            tails[length] = old_line
+            ends[length] = index
+        previous.append(ends[length - 1] if length else -1)
+    anchors = []
+    index = ends[-1] if ends else -1
+    while index >= 0:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _myers(old, new, max_cost):
+    """Finds the longest common subsequence of two lists.
+    Returns:
+        list: (old_start, new_start, length) runs of equal items in
+            ascending order, None if the lists differ in more than
+            max_cost items.
+    """
+    size = len(old) + len(new)
+    limit = min(size, max_cost)
+    # Furthest x reached on every diagonal k = x - y, at index
+    # k + offset. Before every round the diagonals it reads, the ones
+    # from -cost - 1 to cost + 1 of the other parity than its own, are
+    # saved to walk the path back
+    offset = limit + 1
+    furthest = [0] * (2 * limit + 3)
+    trace = []
+    for cost in range(limit + 1):
+        trace.append(furthest[offset - cost - 1:offset + cost + 2:2])
+        for k in range(-cost, cost + 1, 2):
+            if k == -cost or (k != cost and furthest[offset + k - 1]
+                              < furthest[offset + k + 1]):
+                x = furthest[offset + k + 1]
+            else:
+                x = furthest[offset + k - 1] + 1
+            y = x - k
+            if x < len(old) and y < len(new) and old[x] == new[y]:
+                x += 1 + _matching_start(old, new, x + 1, len(old),
+                                         y + 1, len(new))
+                y = x - k
+            furthest[offset + k] = x
+            if x >= len(old) and y >= len(new):
+                return _backtrack(trace, len(old), len(new))
+    return None
+
+
+def _backtrack(trace, x, y):
+    """Walks the path found by _myers back from its end and returns
+    its diagonal runs."""
+    runs = []
+    for cost in range(len(trace) - 1, -1, -1):
+        # Every other diagonal from -cost - 1 is saved for the round
+        furthest = trace[cost]
+        k = x - y
+        below = (k + cost) // 2
+        if k == -cost or (k != cost
+                          and furthest[below] < furthest[below + 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = furthest[(previous_k + cost + 1) // 2]
+        previous_y = previous_x - previous_k
+        # The step goes down from the diagonal above or right from the
+        # one below, the snake of equal items follows it
+        start = previous_x if previous_k == k + 1 else previous_x + 1
+        if x > start:
+            runs.append((start, start - k, x - start))
+        x, y = previous_x, previous_y
+    runs.reverse()
+    return runs
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""This module shows the changes of a text since it was saved, the
+file on disk and the text side by side.
+
+The file is read and compared with a snapshot of the Document in a
+background thread, by the patience variant of diff.diff_lines. Both
+texts are laid out in rows: the lines of the equal blocks are side by
+side, and a changed block takes as many rows as the longer of its
+sides, the other side is filled with empty rows. The blocks are kept
+with the rows they start at, so the lines of a row are found by
+bisection, and only the rows in the viewport are put into the two
+tk.Text widgets, like in the LongLineView. Both vertical scrollbars
+scroll both widgets, so the sides never get out of step.
+"""
+
+from bisect import bisect_left, bisect_right
+from tkinter.constants import * # pylint: disable=unused-wildcard-import
+from diff import diff_lines
+from file_io import read_text
+from watch import FileReloader
+
+# Rows rendered below the last visible one, so a partly visible row at
+# the bottom is not left empty.
+EXTRA_ROWS = 2
+# Rows scrolled by one step of the mouse wheel.
+WHEEL_ROWS = 3
+# Rows shown above a change the view jumps to.
+CONTEXT_ROWS = 3
+# Characters of a line put into the widget, the rest of a longer line
+# is not shown.
+MAX_LINE_LENGTH = 4000
+# Tags of the rows and their colors
+NUMBER_TAG = "diff_number"
+REMOVED_TAG = "diff_removed"
+ADDED_TAG = "diff_added"
+FILLER_TAG = "diff_filler"
+TAG_OPTIONS = {
+    NUMBER_TAG: dict(foreground="gray50"),
+    REMOVED_TAG: dict(background="#ffd7d7"),
+    ADDED_TAG: dict(background="#d7f5d7"),
+    FILLER_TAG: dict(background="gray90"),
+}
+
+
+class FileComparison(FileReloader):
+    """Reads the file again in a background thread and compares it
+    with the text.
+
+    on_done is called with the lines of the file, the lines of the
+    text and the blocks of diff_lines that turn the first into the
+    second. The text is taken as a snapshot of the Document, so it
+    may be edited while the comparison runs.
+    """
+    def _read(self):
+        try:
+            new = "".join(text[first:last] for text, first, last
+                          in self._snapshot).split("\n")
+            text, _, _ = read_text(self.file)
+            old = text.split("\n")
+            del text
+            self._queue.put((old, new, diff_lines(old, new, patience=True)))
+        except (OSError, ValueError) as error:
+            self._queue.put(error)
+
+
+class DiffRows:
+    """Rows of two texts shown side by side.
+
+    A row holds a line of the old text, a line of the new text, or
+    both. The rows of a changed block that one of its sides has no
+    lines for are fillers of that side.
+    """
+    def __init__(self, old, new, hunks):
+        """
+        Args:
+            old (list): lines of the old text;
+            new (list): lines of the new text;
+            hunks (list): result of diff.diff_lines for the lines.
+        """
+        self.old = old
+        self.new = new
+        self.hunks = hunks
+        # (row, old_start, new_start, old_count, new_count, changed)
+        # of the blocks and the rows they start at, for bisection
+        self.blocks = []
+        self._starts = []
+        # Rows the changed blocks start at
+        self.hunk_rows = []
+
+        row = old_line = new_line = 0
+        for old_start, old_end, new_start, new_end in hunks + [
+                (len(old), len(old), len(new), len(new))]:
+            if old_start > old_line:
+                count = old_start - old_line
+                self._add(row, old_line, new_line, count, count, False)
+                row += count
+            if old_end > old_start or new_end > new_start:
+                self.hunk_rows.append(row)
+                self._add(row, old_start, new_start, old_end - old_start,
+                          new_end - new_start, True)
+                row += max(old_end - old_start, new_end - new_start)
+            old_line, new_line = old_end, new_end
+        self.row_count = row
+
+    def _add(self, *block):
+        self.blocks.append(block)
+        self._starts.append(block[0])
+
+    def __len__(self):
+        return self.row_count
+
+    def iter_rows(self, start, count):
+        """Yields (old_line, new_line, changed) of count rows from the
+        row start, the lines are counted from 0 and are None in the
+        fillers."""
+        block = max(bisect_right(self._starts, start) - 1, 0)
+        while count > 0 and block < len(self.blocks):
+            row, old_start, new_start, old_count, new_count, changed = \
+                self.blocks[block]
+            for offset in range(start - row, max(old_count, new_count)):
+                if count == 0:
+                    return
+                yield (old_start + offset if offset < old_count else None,
+                       new_start + offset if offset < new_count else None,
+                       changed)
+                count -= 1
+                start += 1
+            block += 1
+
+
+class DiffView:
+    """Two tk.Text widgets that show the rows of a DiffRows in their
+    viewports, the old text in the first and the new one in the
+    second.
+
+    The view takes over the vertical scrollbars, the mouse wheel and
+    the navigation keys of both widgets, the widgets themselves are
+    never scrolled vertically and are read-only.
+    """
+    def __init__(self, texts, commands, y_scrollbars, rows=None):
+        """
+        Args:
+            texts (tuple): the two tk.Text widgets;
+            commands (tuple): callables that call the widgets' own Tcl
+                commands, so the rendered rows are not taken for edits
+                of their Documents;
+            y_scrollbars (tuple): vertical scrollbars of the widgets;
+            rows (DiffRows): the rows, none are shown if None.
+        """
+        self.texts = texts
+        self.commands = commands
+        self.y_scrollbars = y_scrollbars
+        self.rows = rows if rows is not None else DiffRows([], [], [])
+        # Number of the top row and index of the change jumped to,
+        # None after the rows are scrolled otherwise
+        self.top = 0
+        self.hunk = None
+        self._redraw_job = None
+
+        self.bindtag = "DiffView{}".format(id(self))
+        self.bind_keys()
+        for text in texts:
+            text.bindtags((self.bindtag,) + text.bindtags())
+            text.config(yscrollcommand="", wrap=NONE)
+            for tag, options in TAG_OPTIONS.items():
+                text.tag_config(tag, **options)
+        for scrollbar in y_scrollbars:
+            scrollbar.config(command=self.yview)
+        self.render()
+
+    def bind_keys(self):
+        bindings = {
+            "<MouseWheel>": lambda event: self.scroll(
+                -WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS, UNITS),
+            "<Button-4>": lambda event: self.scroll(-WHEEL_ROWS, UNITS),
+            "<Button-5>": lambda event: self.scroll(WHEEL_ROWS, UNITS),
+            "<Up>": lambda event: self.scroll(-1, UNITS),
+            "<Down>": lambda event: self.scroll(1, UNITS),
+            "<Prior>": lambda event: self.scroll(-1, PAGES),
+            "<Next>": lambda event: self.scroll(1, PAGES),
+            "<Control-Home>": lambda event: self.yview(MOVETO, 0),
+            "<Control-End>": lambda event: self.yview(MOVETO, 1),
+        }
+        for sequence, handler in bindings.items():
+            self.texts[0].bind_class(
+                self.bindtag, sequence,
+                lambda event, handler=handler: handler(event) or "break")
+        self.texts[0].bind_class(self.bindtag, "<Configure>",
+                                 lambda event: self.schedule_render())
+
+    def close(self):
+        """Removes the view and its rows from the widgets."""
+        if self._redraw_job is not None:
+            self.texts[0].after_cancel(self._redraw_job)
+            self._redraw_job = None
+        for text, command in zip(self.texts, self.commands):
+            text.bindtags(tuple(tag for tag in text.bindtags()
+                                if tag != self.bindtag))
+            text.config(state=NORMAL)
+            command("delete", "1.0", END)
+        for sequence in self.texts[0].bind_class(self.bindtag):
+            self.texts[0].unbind_class(self.bindtag, sequence)
+
+    def set_rows(self, rows):
+        """Shows other rows from their top."""
+        self.rows = rows
+        self.top = 0
+        self.hunk = None
+        self.render()
+
+    def visible_rows(self):
+        """Number of rows that fit in the widgets."""
+        text = self.texts[0]
+        linespace = int(text.tk.call(
+            "font", "metrics", text.cget("font"), "-linespace")) or 1
+        return max(text.winfo_height() // linespace, 1)
+
+    # Scrolling
+
+    def yview(self, *args):
+        """Command of the vertical scrollbars, takes the same
+        arguments as tk.Text.yview."""
+        if args[0] == MOVETO:
+            fraction = min(max(float(args[1]), 0.0), 1.0)
+            self.top = int(fraction * len(self.rows))
+            self.hunk = None
+            self._clamp()
+            self.render()
+        elif args[0] == SCROLL:
+            self.scroll(int(args[1]), args[2])
+
+    def scroll(self, number, what):
+        """Scrolls the view by number of rows or pages."""
+        if what.startswith(PAGES):
+            number *= self.visible_rows()
+        self.top += number
+        self.hunk = None
+        self._clamp()
+        self.render()
+
+    def show_row(self, row):
+        """Scrolls the view so the row is near its top."""
+        self.top = row - CONTEXT_ROWS
+        self._clamp()
+        self.render()
+
+    def next_hunk(self):
+        """Scrolls the view to the next change, the first one below
+        the top row if the view were scrolled since the last jump.
+        Returns:
+            int: index of the change, None if there is no next one.
+        """
+        if self.hunk is not None:
+            hunk = self.hunk + 1
+        else:
+            hunk = bisect_left(self.rows.hunk_rows, self.top)
+        return self._show_hunk(hunk)
+
+    def previous_hunk(self):
+        """Scrolls the view to the previous change, the last one above
+        the top row if the view were scrolled since the last jump.
+        Returns:
+            int: index of the change, None if there is no previous one.
+        """
+        if self.hunk is not None:
+            hunk = self.hunk - 1
+        else:
+            hunk = bisect_left(self.rows.hunk_rows, self.top) - 1
+        return self._show_hunk(hunk)
+
+    def _show_hunk(self, hunk):
+        if not 0 <= hunk < len(self.rows.hunk_rows):
+            return None
+        self.show_row(self.rows.hunk_rows[hunk])
+        self.hunk = hunk
+        return hunk
+
+    def _clamp(self):
+        """Doesn't let the last row go above the bottom of the view."""
+        self.top = max(0, min(self.top, len(self.rows) - self.visible_rows()))
+
+    # Rows
+
+    def schedule_render(self):
+        if self._redraw_job is None:
+            self._redraw_job = self.texts[0].after_idle(self.render)
+
+    def render(self):
+        """Puts the rows of the viewport into the widgets and updates
+        the scrollbars."""
+        self._redraw_job = None
+        rows = self.rows
+        visible = self.visible_rows()
+        shown = list(rows.iter_rows(self.top, visible + EXTRA_ROWS))
+        width = len(str(max(len(rows.old), len(rows.new), 1)))
+        filler = " " * (width + 1) + "\n"
+        for side, lines, changed_tag in ((0, rows.old, REMOVED_TAG),
+                                         (1, rows.new, ADDED_TAG)):
+            # Pieces of text and their tags, inserted by one command
+            args = []
+            for row in shown:
+                line = row[side]
+                if line is None:
+                    args += [filler, FILLER_TAG]
+                    continue
+                tags = (changed_tag,) if row[2] else ()
+                args += ["{:>{}} ".format(line + 1, width),
+                         (NUMBER_TAG,) + tags,
+                         lines[line][:MAX_LINE_LENGTH] + "\n", tags]
+            text = self.texts[side]
+            text.config(state=NORMAL)
+            self.commands[side]("delete", "1.0", END)
+            if args:
+                self.commands[side]("insert", "1.0", *args)
+            text.config(state=DISABLED)
+
+        if len(rows):
+            first = self.top / len(rows)
+            last = min(self.top + visible, len(rows)) / len(rows)
+        else:
+            first, last = 0, 1
+        for scrollbar in self.y_scrollbars:
+            scrollbar.set(first, last)
@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+"""This module contains the document model of the text editor.
+
+Document is a piece table: the text is never copied on edits, it is
+described by a sequence of pieces, every piece being a slice of one
+of the append-only buffers. The pieces are kept in a treap ordered by
+position in the document, every node knows the length and the number
+of newlines of its subtree, so inserting, deleting and looking up a
+line take O(log n) on average whatever the size of the document.
+
+Every piece also knows its length in UTF-8 bytes, so conversions
+between character and byte offsets take O(log n) as well. Buffers keep
+byte offsets of their line starts and of every BYTE_STEP characters,
+so a conversion inside of a piece encodes at most BYTE_STEP characters
+however long the line is.
+
+The module doesn't depend on tkinter and can be used headless.
+"""
+
+import codecs
+import random
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+# Text inserted by edits is appended to the last buffer until it
+# grows to this number of characters. Bigger insertions get a buffer
+# of their own.
+ADD_BUFFER_SIZE = 64 * 1024
+# Number of characters scanned at once when newlines of a big buffer
+# are indexed.
+SCAN_SIZE = 16 * 1024 * 1024
+# Buffers with non-ASCII text keep byte offsets of the characters at
+# the multiples of this number, so the conversions of offsets in long
+# lines don't encode the lines from their starts.
+BYTE_STEP = 4096
+ENCODING = "utf-8"
+# Lone surrogates are counted as 3 bytes instead of failing
+ENCODING_ERRORS = "surrogatepass"
+
+
+def _encoded_length(text):
+    return len(text.encode(ENCODING, ENCODING_ERRORS))
+
+
+def _line_breaks(text, base=0):
+    """Finds offsets of all line starts that follow a newline.
+    Args:
+        text (str): text to scan;
+        base (int): offset of the text in its buffer.
+    Returns:
+        (array): offsets right after every newline in the text.
+    """
+    breaks = array("q")
+    for start in range(0, len(text), SCAN_SIZE):
+        parts = text[start:start+SCAN_SIZE].split("\n")
+        parts.pop()
+        breaks.extend(accumulate(map((1).__add__, map(len, parts)),
+                                 initial=base + start))
+        # accumulate starts with the initial value which is not a break
+        del breaks[len(breaks) - len(parts) - 1]
+    return breaks
+
+
+def _byte_breaks(text, base=0):
+    """Finds byte offsets of the line breaks found by _line_breaks.
+    Args:
+        text (str): text to scan;
+        base (int): byte offset of the text in its buffer.
+    Returns:
+        (array): byte offsets of the line breaks.
+    """
+    lines = text.split("\n")
+    lines.pop()
+    byte_breaks = array("q", accumulate(
+        map((1).__add__, map(_encoded_length, lines)), initial=base))
+    del byte_breaks[0]
+    return byte_breaks
+
+
+def _byte_steps(text, base, byte_base):
+    """Finds byte offsets of the characters at the multiples of
+    BYTE_STEP in a text appended to a buffer.
+    Args:
+        text (str): text to scan;
+        base (int): offset of the text in its buffer;
+        byte_base (int): byte offset of the text in its buffer.
+    Returns:
+        (array): byte offsets of the characters at the multiples of
+            BYTE_STEP in (base, base + len(text)].
+    """
+    steps = array("q")
+    previous = 0
+    byte = byte_base
+    first = (base // BYTE_STEP + 1) * BYTE_STEP - base
+    for position in range(first, len(text) + 1, BYTE_STEP):
+        byte += _encoded_length(text[previous:position])
+        steps.append(byte)
+        previous = position
+    return steps
+
+
+class _Buffer:
+    """Append-only storage of text with offsets of its line breaks.
+
+    Buffers with only ASCII characters have the same character and
+    byte offsets, the others also keep byte offsets of the breaks and
+    of the characters at the multiples of BYTE_STEP.
+    """
+    __slots__ = ("text", "breaks", "byte_breaks", "byte_steps",
+                 "byte_size")
+
+    def __init__(self, text=""):
+        self.text = ""
+        self.breaks = array("q")
+        self.byte_breaks = None
+        self.byte_steps = None
+        self.byte_size = 0
+        self.append(text)
+
+    def append(self, text):
+        breaks = _line_breaks(text, len(self.text))
+        if self.byte_breaks is None and not text.isascii():
+            # Byte offsets are needed from now on, existing text is
+            # ASCII, so its byte offsets are its character offsets
+            self.byte_breaks = array("q", self.breaks)
+            self.byte_steps = array(
+                "q", range(0, len(self.text) + 1, BYTE_STEP))
+        if self.byte_breaks is not None:
+            self.byte_breaks.extend(_byte_breaks(text, self.byte_size))
+            self.byte_steps.extend(
+                _byte_steps(text, len(self.text), self.byte_size))
+        self.breaks.extend(breaks)
+        self.text += text
+        if self.byte_breaks is None:
+            self.byte_size += len(text)
+        else:
+            self.byte_size += _encoded_length(text)
+
+    def count_newlines(self, start, end):
+        """Number of newlines in the slice [start, end) of the buffer."""
+        return (bisect_right(self.breaks, end)
+                - bisect_right(self.breaks, start))
+
+    def line_break(self, start, n):
+        """Offset right after the n-th (from 1) newline that follows
+        start."""
+        return self.breaks[bisect_right(self.breaks, start) + n - 1]
+
+    def byte_offset(self, position):
+        """Converts offset in the buffer to offset in its encoded
+        text."""
+        if self.byte_breaks is None:
+            return position
+        # Encoding starts from the nearest known offset, the line start
+        # or the step before the position
+        start = position // BYTE_STEP * BYTE_STEP
+        byte = self.byte_steps[position // BYTE_STEP]
+        i = bisect_right(self.breaks, position)
+        if i and self.breaks[i-1] > start:
+            start = self.breaks[i-1]
+            byte = self.byte_breaks[i-1]
+        return byte + _encoded_length(self.text[start:position])
+
+    def position_of_byte(self, byte):
+        """Converts offset in the encoded text of the buffer to offset
+        in the buffer. Offsets inside of a multi-byte character are
+        moved to its start."""
+        if self.byte_breaks is None:
+            return byte
+        # Only the text between the nearest known offsets around the
+        # byte is encoded
+        step = bisect_right(self.byte_steps, byte) - 1
+        start = step * BYTE_STEP
+        byte_start = self.byte_steps[step]
+        end = min(start + BYTE_STEP, len(self.text))
+        i = bisect_right(self.byte_breaks, byte)
+        if i and self.breaks[i-1] > start:
+            start = self.breaks[i-1]
+            byte_start = self.byte_breaks[i-1]
+        if i < len(self.breaks):
+            end = min(end, self.breaks[i])
+        encoded = self.text[start:end].encode(ENCODING, ENCODING_ERRORS)
+        # An incomplete character at the end is left undecoded, lone
+        # surrogates are decoded like any other character
+        prefix = codecs.getincrementaldecoder(ENCODING)(
+            ENCODING_ERRORS).decode(encoded[:byte - byte_start])
+        return start + len(prefix)
+
+
+class _Piece:
+    """Node of the treap. Describes a slice of a buffer."""
+    __slots__ = ("buffer", "start", "length", "newlines", "bytes",
+                 "priority", "left", "right", "size", "lines",
+                 "byte_size")
+
+    def __init__(self, buffer, start, length):
+        self.buffer = buffer
+        self.start = start
+        self.length = length
+        self.newlines = buffer.count_newlines(start, start + length)
+        self.bytes = (buffer.byte_offset(start + length)
+                      - buffer.byte_offset(start))
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.size = length
+        self.lines = self.newlines
+        self.byte_size = self.bytes
+
+    def update(self):
+        """Recomputes size, number of lines and number of bytes of the
+        subtree."""
+        size = self.length
+        lines = self.newlines
+        byte_size = self.bytes
+        if self.left is not None:
+            size += self.left.size
+            lines += self.left.lines
+            byte_size += self.left.byte_size
+        if self.right is not None:
+            size += self.right.size
+            lines += self.right.lines
+            byte_size += self.right.byte_size
+        self.size = size
+        self.lines = lines
+        self.byte_size = byte_size
+
+
+class Document:
+    """Text of a document stored as a piece table.
+
+    Offsets count characters from 0. Lines are counted from 0 as well,
+    a document always has at least one (maybe empty) line, the number
+    of lines is the number of newlines plus one.
+    """
+    def __init__(self, text=""):
+        self._buffers = []
+        self._root = None
+        if text:
+            self._root = self._make_piece(_Buffer(text), 0, len(text))
+
+    @classmethod
+    def from_file(cls, file, encoding=None):
+        """Creates a document with the contents of the file."""
+        with open(file, 'r', encoding=encoding) as work_file:
+            return cls(work_file.read())
+
+    def __len__(self):
+        return self._root.size if self._root is not None else 0
+
+    @property
+    def line_count(self):
+        return (self._root.lines if self._root is not None else 0) + 1
+
+    @property
+    def byte_size(self):
+        """Size of the text encoded in UTF-8."""
+        return self._root.byte_size if self._root is not None else 0
+
+    # Edits
+
+    def insert(self, offset, text):
+        """Inserts text before the character at offset."""
+        if not text:
+            return
+        self._check_offset(offset)
+        piece = self._add(text)
+        left, right = self._split(self._root, offset)
+        self._root = self._merge(self._merge(left, piece), right)
+
+    def delete(self, offset, length):
+        """Deletes length characters starting at offset."""
+        if length <= 0:
+            return
+        self._check_offset(offset + length)
+        left, right = self._split(self._root, offset)
+        _, right = self._split(right, length)
+        self._root = self._merge(left, right)
+
+    def replace(self, offset, length, text):
+        self.delete(offset, length)
+        self.insert(offset, text)
+
+    def clear(self):
+        self._buffers = []
+        self._root = None
+
+    # Queries
+
+    def get_text(self, start=0, end=None):
+        """Returns text in range [start, end)."""
+        return "".join(self.iter_chunks(start, end))
+
+    def iter_chunks(self, start=0, end=None):
+        """Yields the text in range [start, end) piece by piece, so it
+        can be processed without joining it into one string."""
+        for text, first, last in self.snapshot(start, end):
+            yield text[first:last]
+
+    def snapshot(self, start=0, end=None):
+        """Describes the text in range [start, end) as a list of
+        (str, start, end) slices. Buffers are never modified in place,
+        so the snapshot stays valid after further edits and can be
+        read from another thread.
+        """
+        if end is None or end > len(self):
+            end = len(self)
+        slices = []
+        if start < end:
+            self._collect(self._root, 0, start, end, slices)
+        return slices
+
+    def get_line(self, line):
+        """Returns text of the line without its newline."""
+        start = self.line_start(line)
+        if line + 1 < self.line_count:
+            end = self.line_start(line + 1) - 1
+        else:
+            end = len(self)
+        return self.get_text(start, end)
+
+    def line_start(self, line):
+        """Returns offset of the first character of the line."""
+        if line <= 0:
+            return 0
+        if line >= self.line_count:
+            raise IndexError("line {} out of range".format(line))
+        offset = 0
+        node = self._root
+        # Looking for the offset right after the line-th newline
+        while True:
+            left_lines = node.left.lines if node.left is not None else 0
+            left_size = node.left.size if node.left is not None else 0
+            if line <= left_lines:
+                node = node.left
+            elif line <= left_lines + node.newlines:
+                line -= left_lines
+                return (offset + left_size - node.start
+                        + node.buffer.line_break(node.start, line))
+            else:
+                line -= left_lines + node.newlines
+                offset += left_size + node.length
+                node = node.right
+
+    def line_of_offset(self, offset):
+        """Returns number of the line the character at offset is on."""
+        self._check_offset(offset)
+        line = 0
+        node = self._root
+        while node is not None:
+            left_lines = node.left.lines if node.left is not None else 0
+            left_size = node.left.size if node.left is not None else 0
+            if offset < left_size:
+                node = node.left
+            elif offset < left_size + node.length:
+                offset -= left_size
+                return line + left_lines + node.buffer.count_newlines(
+                    node.start, node.start + offset)
+            else:
+                line += left_lines + node.newlines
+                offset -= left_size + node.length
+                node = node.right
+        return line
+
+    def offset_to_position(self, offset):
+        """Converts offset to (line, column) pair."""
+        line = self.line_of_offset(offset)
+        return line, offset - self.line_start(line)
+
+    def position_to_offset(self, line, column):
+        """Converts (line, column) pair to offset."""
+        return self.line_start(line) + column
+
+    def offset_to_byte(self, offset):
+        """Converts offset to offset in the text encoded in UTF-8."""
+        self._check_offset(offset)
+        byte = 0
+        node = self._root
+        while node is not None:
+            left_size = node.left.size if node.left is not None else 0
+            left_bytes = node.left.byte_size if node.left is not None else 0
+            if offset < left_size:
+                node = node.left
+            elif offset < left_size + node.length:
+                buffer = node.buffer
+                return (byte + left_bytes
+                        + buffer.byte_offset(node.start + offset - left_size)
+                        - buffer.byte_offset(node.start))
+            else:
+                byte += left_bytes + node.bytes
+                offset -= left_size + node.length
+                node = node.right
+        return byte
+
+    def byte_to_offset(self, byte):
+        """Converts offset in the text encoded in UTF-8 to offset.
+        Offsets inside of a multi-byte character are moved to its
+        start."""
+        byte = max(0, min(byte, self.byte_size))
+        offset = 0
+        node = self._root
+        while node is not None:
+            left_size = node.left.size if node.left is not None else 0
+            left_bytes = node.left.byte_size if node.left is not None else 0
+            if byte < left_bytes:
+                node = node.left
+            elif byte < left_bytes + node.bytes:
+                buffer = node.buffer
+                position = buffer.position_of_byte(
+                    buffer.byte_offset(node.start) + byte - left_bytes)
+                return offset + left_size + position - node.start
+            else:
+                offset += left_size + node.length
+                byte -= left_bytes + node.bytes
+                node = node.right
+        return offset
+
+    # Service methods
+
+    def _check_offset(self, offset):
+        if not 0 <= offset <= len(self):
+            raise IndexError("offset {} out of range".format(offset))
+
+    def _make_piece(self, buffer, start, length):
+        if not self._buffers or self._buffers[-1] is not buffer:
+            self._buffers.append(buffer)
+        return _Piece(buffer, start, length)
+
+    def _add(self, text):
+        """Appends text to a buffer and returns a piece for it."""
+        buffer = self._buffers[-1] if self._buffers else None
+        if (buffer is None or len(text) > ADD_BUFFER_SIZE
+                or len(buffer.text) + len(text) > ADD_BUFFER_SIZE):
+            buffer = _Buffer()
+        start = len(buffer.text)
+        buffer.append(text)
+        return self._make_piece(buffer, start, len(text))
+
+    def _split(self, node, offset):
+        """Splits the subtree into two: with the first offset
+        characters and with the rest of them."""
+        if node is None:
+            return None, None
+        left_size = node.left.size if node.left is not None else 0
+        if offset <= left_size:
+            left, node.left = self._split(node.left, offset)
+            node.update()
+            return left, node
+        if offset >= left_size + node.length:
+            node.right, right = self._split(
+                node.right, offset - left_size - node.length)
+            node.update()
+            return node, right
+        # The split goes through the piece itself
+        cut = offset - left_size
+        tail = _Piece(node.buffer, node.start + cut, node.length - cut)
+        node.length = cut
+        node.newlines -= tail.newlines
+        node.bytes -= tail.bytes
+        right = self._merge(tail, node.right)
+        node.right = None
+        node.update()
+        return node, right
+
+    def _merge(self, left, right):
+        """Merges two subtrees, all pieces of left go before pieces of
+        right."""
+        if left is None:
+            return right
+        if right is None:
+            return left
+        if left.priority > right.priority:
+            left.right = self._merge(left.right, right)
+            left.update()
+            return left
+        right.left = self._merge(left, right.left)
+        right.update()
+        return right
+
+    def _collect(self, node, offset, start, end, slices):
+        """Appends slices of pieces of the subtree, which starts at
+        offset, that overlap [start, end)."""
+        while node is not None:
+            left_size = node.left.size if node.left is not None else 0
+            piece_start = offset + left_size
+            if start < piece_start:
+                self._collect(node.left, offset, start, end, slices)
+            piece_end = piece_start + node.length
+            if start < piece_end and piece_start < end:
+                first = node.start + max(start - piece_start, 0)
+                last = node.start + min(end - piece_start, node.length)
+                slices.append((node.buffer.text, first, last))
+            if end <= piece_end:
+                return
+            offset = piece_end
+            node = node.right
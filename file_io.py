@@ -0,0 +1,618 @@
+# -*- coding: utf-8 -*-
+"""This module moves file contents between the disk and a tk.Text
+    widget without blocking the Tk event loop.
+
+A worker thread does the disk work and hands blocks of text over a
+bounded queue. The Tk side picks them up from after() callbacks, so
+the window keeps redrawing and scrolling while a big file streams in.
+
+Files are read as bytes. Their encoding, byte order mark and newlines
+are detected from the first bytes and kept in a FileFormat, which the
+saver uses to write the text back the way it was read. The text has
+"\n" newlines only, so a file with more kinds of newlines is marked
+as mixed once it is read, it is saved with the newline of its first
+line.
+"""
+
+import codecs
+import io
+import os
+import queue
+import stat
+import threading
+import time
+from collections import namedtuple
+from tkinter.constants import * # pylint: disable=unused-wildcard-import
+
+# Number of bytes the reader thread reads and decodes at once.
+BLOCK_SIZE = 256 * 1024
+# Number of bytes the format of a file is detected from.
+SAMPLE_SIZE = 64 * 1024
+# Number of characters the saver takes from the widget at once.
+SLICE_SIZE = 1024 * 1024
+# Size of the buffer of the file being written, in bytes.
+WRITE_BUFFER = 4 * 1024 * 1024
+# Number of decoded blocks allowed to wait for the Tk loop. Keeps
+# memory bounded when the disk is faster than the widget.
+QUEUE_SIZE = 8
+# Delay between two polls of the queue, in milliseconds.
+POLL_INTERVAL = 1
+# Time the Tk loop may spend inserting blocks during one poll, in
+# seconds. Bigger values load faster but make the window less
+# responsive while loading.
+TIME_BUDGET = 0.03
+# Byte order marks and their encodings. UTF-32 goes first, its little
+# endian BOM starts with the one of UTF-16.
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+# Single byte encodings tried when a file is not valid UTF-8. Latin-1
+# decodes any bytes, so it is the last one.
+LEGACY_ENCODINGS = ("cp1252", "latin-1")
+# Bytes that can't be decoded are kept as lone surrogates and are
+# written back unchanged.
+ENCODING_ERRORS = "surrogateescape"
+
+
+class FileFormat(namedtuple("FileFormat", "encoding bom newline mixed",
+                            defaults=(False,))):
+    """Encoding, byte order mark and newline of a file.
+
+    encoding is a name of a python codec, bom is the bytes the file
+    starts with (empty if none) and newline is "\n", "\r\n" or "\r".
+    mixed is True if the file has other newlines as well, they are
+    all written as newline.
+    """
+    __slots__ = ()
+
+    @property
+    def char_size(self):
+        """Number of bytes a character takes in the file, None for
+        UTF-8 where it depends on the character."""
+        name = codecs.lookup(self.encoding).name
+        if name.startswith("utf-8"):
+            return None
+        if name.startswith("utf-16"):
+            return 2
+        if name.startswith("utf-32"):
+            return 4
+        return 1
+
+    def describe(self):
+        """Short description for the user, like "UTF-8 BOM CRLF"."""
+        newlines = {"\n": "LF", "\r\n": "CRLF", "\r": "CR"}
+        parts = [self.encoding.upper()]
+        if self.bom:
+            parts.append("BOM")
+        parts.append(newlines[self.newline])
+        if self.mixed:
+            parts.append("mixed")
+        return " ".join(parts)
+
+
+# Format of new files
+DEFAULT_FORMAT = FileFormat("utf-8", b"", os.linesep)
+
+
+def detect_format(sample):
+    """Detects the format of a file from its first bytes.
+    Args:
+        sample (bytes): first SAMPLE_SIZE bytes of the file, or the
+            whole file if it is smaller.
+    Returns:
+        (FileFormat): detected format.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            break
+    else:
+        bom = b""
+        encoding = _detect_encoding(sample)
+    text = codecs.getincrementaldecoder(encoding)("replace").decode(
+        sample[len(bom):])
+    return FileFormat(encoding, bom, _detect_newline(text))
+
+
+def make_decoder(file_format):
+    """Returns an incremental decoder of the bytes of a file in the
+    format, without its BOM, into text with "\n" newlines."""
+    return io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(file_format.encoding)(ENCODING_ERRORS),
+        translate=True)
+
+
+def read_text(file, file_format=None):
+    """Reads the whole file into a string the same way FileLoader
+    does, for the threads that need the text of a file at once.
+    Args:
+        file (str): path to the file;
+        file_format (FileFormat): format of the file, detected if
+            None.
+    Returns:
+        tuple: (text, file_format, size) where size is the number of
+            bytes read.
+    Raises:
+        OSError: if the file can't be read.
+    """
+    with open(file, 'rb') as work_file:
+        data = work_file.read()
+    if file_format is None:
+        file_format = detect_format(data[:SAMPLE_SIZE])
+    decoder = make_decoder(file_format)
+    text = decoder.decode(data[len(file_format.bom):], final=True)
+    if has_mixed_newlines(decoder):
+        file_format = file_format._replace(mixed=True)
+    return text, file_format, len(data)
+
+
+def has_mixed_newlines(decoder):
+    """Checks if the decoder of make_decoder has seen more than one
+    kind of newlines."""
+    # newlines is None, a string or a tuple of the kinds seen
+    return isinstance(decoder.newlines, tuple)
+
+
+def write_text(file, blocks, file_format=None, mode=None):
+    """Writes the text into a temporary file next to the target,
+    fsyncs it and renames it over the target, so a failed write never
+    leaves a half-written file behind.
+    Args:
+        file (str): path to the file;
+        blocks (iterable): strings the text consists of;
+        file_format (FileFormat): encoding, byte order mark and
+            newline the file is written with, DEFAULT_FORMAT if None;
+        mode (int): permissions of the file, the ones of the file
+            being replaced if None.
+    Returns:
+        int: number of written bytes.
+    Raises:
+        OSError: if the file can't be written;
+        ValueError: if the text can't be encoded.
+    """
+    # tempfile is imported by the first save, it is not needed to
+    # start the editor
+    import tempfile # pylint: disable=import-outside-toplevel
+    file_format = file_format or DEFAULT_FORMAT
+    file = os.path.abspath(file)
+    if mode is None:
+        mode = file_mode(file)
+    directory, name = os.path.split(file)
+    descriptor, temp_file = tempfile.mkstemp(
+        prefix="." + name + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(descriptor, 'w', buffering=WRITE_BUFFER,
+                       encoding=file_format.encoding,
+                       errors=ENCODING_ERRORS,
+                       newline=file_format.newline) as work_file:
+            work_file.buffer.write(file_format.bom)
+            for block in blocks:
+                work_file.write(block)
+            work_file.flush()
+            written = os.fstat(work_file.fileno()).st_size
+            os.fsync(work_file.fileno())
+        os.chmod(temp_file, mode)
+        os.replace(temp_file, file)
+    except (OSError, ValueError):
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+        raise
+    return written
+
+
+def file_mode(file):
+    """Permissions for the new file: the ones of the file being
+    replaced, or the default ones for a new file."""
+    try:
+        return stat.S_IMODE(os.stat(file).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def longest_line(block, run=0):
+    """Finds the longest line of a text that comes in blocks.
+    Args:
+        block (str): next block of the text;
+        run (int): length of the last line of the previous blocks.
+    Returns:
+        tuple: (longest, run) where longest is the length of the
+            longest line that ends in the block or runs through it,
+            counting its part in the previous blocks, and run is the
+            length of the line the block ends with.
+    """
+    first = block.find("\n")
+    if first == -1:
+        run += len(block)
+        return run, run
+    longest = run + first
+    last = block.rfind("\n")
+    if last > first:
+        longest = max(longest, max(map(len, block[first + 1:last].split(
+            "\n"))))
+    run = len(block) - last - 1
+    return max(longest, run), run
+
+
+def _detect_encoding(sample):
+    try:
+        # Incremental decoder doesn't fail on a character cut by the
+        # end of the sample
+        codecs.getincrementaldecoder("utf-8")().decode(sample)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    for encoding in LEGACY_ENCODINGS:
+        try:
+            sample.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return LEGACY_ENCODINGS[-1]
+
+
+def _detect_newline(text):
+    """Newline of the first line of the text."""
+    line_feed = text.find("\n")
+    carriage_return = text.find("\r")
+    if carriage_return == -1:
+        return "\n" if line_feed != -1 else DEFAULT_FORMAT.newline
+    if line_feed != -1 and line_feed < carriage_return:
+        return "\n"
+    if line_feed == carriage_return + 1:
+        return "\r\n"
+    return "\r"
+
+
+class FileLoader:
+    """Streams a file into a tk.Text widget chunk by chunk.
+
+    The reader thread only touches the file and the queue, every Tk
+    call happens on the main thread inside _poll. Blocks are decoded
+    and their newlines are translated to "\n" by C codecs, there is
+    no python work per line.
+
+    Lines too long for the widget can be reported by on_long_line
+    before the block with the first of them is inserted. The blocks
+    from then on go to the callable it returns instead of the widget.
+    """
+    def __init__(self, text, file, on_progress=None, on_done=None,
+                 on_error=None, block_size=BLOCK_SIZE, file_format=None,
+                 long_line=None, on_long_line=None):
+        """
+        Args:
+            text (tk.Text): widget the file is loaded into;
+            file (str): path to the file;
+            on_progress (callable): called with a float in range
+                between 0 and 1 after every poll that inserted text;
+            on_done (callable): called with True once the last chunk
+                is inserted, or with False if the load was cancelled
+                or failed;
+            on_error (callable): called with the exception raised by
+                the reader thread before on_done is called;
+            block_size (int): number of bytes read at once;
+            file_format (FileFormat): format of the file, detected
+                from its first bytes if None;
+            long_line (int): length of a line in characters that is
+                too long for the widget, lines are not measured if
+                None;
+            on_long_line (callable): called without arguments when
+                the first line longer than long_line is found,
+                returns a callable that takes the rest of the blocks
+                or None if they should still be inserted.
+        """
+        self.text = text
+        self.file = file
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.block_size = block_size
+        # Set by the reader thread before the first block is queued
+        self.format = file_format
+        self.long_line = long_line
+        self.on_long_line = on_long_line
+        # Takes the blocks instead of the widget once a long line is
+        # found
+        self.sink = None
+
+        self.size = os.path.getsize(file)
+        self.loaded = 0
+        self.done = False
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+
+    def start(self):
+        """Starts the reader thread and the polling of the queue. The
+        text widget is read-only until the load is over, but it can
+        still be scrolled."""
+        self.text.config(state=DISABLED)
+        self._thread.start()
+        self.text.after(POLL_INTERVAL, self._poll)
+
+    def cancel(self):
+        """Stops the load. Text that is already inserted stays in the
+        widget."""
+        if self.done:
+            return
+        self._cancelled.set()
+        self._finish(False)
+
+    def _read(self):
+        """Reader thread. Puts decoded blocks into the queue followed
+        by None, or by the exception that stopped the reading."""
+        try:
+            with open(self.file, 'rb') as work_file:
+                data = work_file.read(SAMPLE_SIZE)
+                if self.format is None:
+                    self.format = detect_format(data)
+                data = data[len(self.format.bom):]
+                decoder = make_decoder(self.format)
+                run = 0
+                found = self.long_line is None
+                while not self._cancelled.is_set():
+                    block = decoder.decode(data, final=not data)
+                    long_line = False
+                    if block and not found:
+                        longest, run = longest_line(block, run)
+                        long_line = found = longest > self.long_line
+                    if block:
+                        self._put((block, work_file.tell(), long_line))
+                    if not data:
+                        if has_mixed_newlines(decoder):
+                            self.format = self.format._replace(mixed=True)
+                        break
+                    data = work_file.read(self.block_size)
+            self._put(None)
+        except (OSError, ValueError) as error:
+            self._put(error)
+
+    def _put(self, item):
+        """Waits for a free slot in the queue, gives up if the load
+        gets cancelled meanwhile."""
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return
+
+    def _poll(self):
+        """Inserts waiting blocks until the time budget runs out and
+        schedules the next poll."""
+        if self.done:
+            return
+        deadline = time.perf_counter() + TIME_BUDGET
+        inserted = False
+        while time.perf_counter() < deadline:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None or isinstance(item, Exception):
+                if item is not None and self.on_error:
+                    self.on_error(item)
+                self._finish(item is None)
+                return
+            block, self.loaded, long_line = item
+            if long_line and self.on_long_line:
+                self.sink = self.on_long_line()
+            if self.sink is not None:
+                self.sink(block)
+            else:
+                self.text.config(state=NORMAL)
+                self.text.insert(END, block)
+                self.text.config(state=DISABLED)
+            inserted = True
+
+        if inserted and self.on_progress and self.size:
+            self.on_progress(min(self.loaded / self.size, 1.0))
+        self.text.after(POLL_INTERVAL, self._poll)
+
+    def _finish(self, completed):
+        self.done = True
+        self.text.config(state=NORMAL)
+        if self.on_done:
+            self.on_done(completed)
+
+
+class FileSaver:
+    """Writes contents of a tk.Text widget to a file.
+
+    The Tk loop takes the text out of the widget in slices of bounded
+    size and the writer thread writes them into a temporary file next
+    to the target. The temporary file is fsynced and renamed over the
+    target only when everything is written, so a failed save never
+    leaves a half-written file behind. No more than QUEUE_SIZE slices
+    exist at once, whatever the size of the text.
+
+    When the widget shows only a part of the text, like the
+    LongLineView does, the slices are taken from a snapshot of the
+    Document that holds the whole text instead.
+    """
+    def __init__(self, text, file, on_progress=None, on_done=None,
+                 on_error=None, slice_size=SLICE_SIZE, file_format=None,
+                 document=None):
+        """
+        Args:
+            text (tk.Text): widget which contents are saved;
+            file (str): path to the file;
+            on_progress (callable): called with a float in range
+                between 0 and 1 after every poll that took text out of
+                the widget;
+            on_done (callable): called with True, number of written
+                bytes and number of seconds the save took once the
+                file is replaced, or with False, 0 and 0 if the save
+                failed;
+            on_error (callable): called with the exception raised by
+                the writer thread before on_done is called;
+            slice_size (int): number of characters taken from the
+                widget at once;
+            file_format (FileFormat): encoding, byte order mark and
+                newline the file is written with, DEFAULT_FORMAT if
+                None;
+            document (Document): text that is saved instead of the
+                contents of the widget, if not None.
+        """
+        self.text = text
+        self.file = os.path.abspath(file)
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.slice_size = slice_size
+        self.format = file_format or DEFAULT_FORMAT
+        self.document = document
+
+        self.done = False
+        self.written = 0
+        self._index = "1.0"
+        self._last_line = 1
+        self._all_taken = False
+        self._error = None
+        self._started = 0
+        self._mode = None
+        # State of the widget before the save, put back after it
+        self._state = NORMAL
+        # Slices of a snapshot of the saved Document, the slice taken
+        # from as [str, start, end], and the number of characters taken
+        self._chunks = None
+        self._slice = None
+        self._taken = 0
+        self._length = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._write, daemon=True)
+
+    def start(self):
+        """Starts the save in the background. The text widget is
+        read-only until the save is over."""
+        self._begin()
+        self.text.after(POLL_INTERVAL, self._poll)
+
+    def run(self):
+        """Saves the file and returns when it is done. Used when the
+        caller can't continue before the file is saved."""
+        self._begin()
+        self.wait()
+
+    def wait(self):
+        """Blocks until the save that is already started is done."""
+        while not self.done:
+            self._step(block=True)
+
+    def _begin(self):
+        self._started = time.perf_counter()
+        self._last_line = int(self.text.index(END+"-1c").split('.')[0])
+        if self.document is not None:
+            self._chunks = iter(self.document.snapshot())
+            self._length = len(self.document)
+        self._mode = file_mode(self.file)
+        self._state = self.text.cget("state")
+        self.text.config(state=DISABLED)
+        self._thread.start()
+
+    def _write(self):
+        """Writer thread. Writes slices from the queue until None and
+        replaces the target with the written file."""
+        try:
+            self.written = write_text(self.file, iter(self._queue.get, None),
+                                      self.format, self._mode)
+        except (OSError, ValueError) as error:
+            self._error = error
+
+    def _poll(self):
+        if self.done:
+            return
+        self._step(block=False)
+        if not self.done:
+            self.text.after(POLL_INTERVAL, self._poll)
+
+    def _step(self, block):
+        """Moves slices from the widget to the queue until the time
+        budget runs out, then checks if the writer has finished.
+        Args:
+            block (bool): wait for the writer instead of returning
+                when the queue is full.
+        """
+        deadline = time.perf_counter() + TIME_BUDGET
+        while not self._all_taken and self._error is None:
+            if not block and (self._queue.full()
+                              or time.perf_counter() > deadline):
+                break
+            self._put(self._take_slice())
+
+        if self.on_progress:
+            if self._chunks is not None:
+                fraction = self._taken / self._length if self._length else 1
+            else:
+                fraction = int(self._index.split('.')[0]) / self._last_line
+            self.on_progress(min(fraction, 1.0))
+
+        if self._error is not None or not self._thread.is_alive():
+            if self._all_taken or self._error is not None:
+                self._thread.join(timeout=0 if self._error else None)
+                self._finish()
+        elif block:
+            self._thread.join(timeout=0.05)
+
+    def _put(self, item):
+        """Puts item into the queue, while checking that the writer
+        is still alive to take it."""
+        while self._error is None:
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return
+
+    def _take_slice(self):
+        """Takes the next slice of text out of the widget. Returns
+        None after the last one."""
+        if self._chunks is not None:
+            return self._take_chunk()
+        # END+"-1c" used to avoid automatically adding a newline at
+        # the end of the file when saving
+        end = self.text.index(
+            "{} + {} chars".format(self._index, self.slice_size))
+        if self.text.compare(end, ">", END+"-1c"):
+            end = self.text.index(END+"-1c")
+        block = self.text.get(self._index, end)
+        self._index = end
+        if not block:
+            self._all_taken = True
+            return None
+        return block
+
+    def _take_chunk(self):
+        """Takes the next slice of text out of the Document, pieces
+        longer than slice_size are split. Returns None after the last
+        one."""
+        while self._slice is None or self._slice[1] >= self._slice[2]:
+            self._slice = next(self._chunks, None)
+            if self._slice is None:
+                self._all_taken = True
+                return None
+            self._slice = list(self._slice)
+        text, start, end = self._slice
+        end = min(end, start + self.slice_size)
+        self._slice[1] = end
+        self._taken += end - start
+        return text[start:end]
+
+    def _finish(self):
+        self.done = True
+        self.text.config(state=self._state)
+        if self._error is not None:
+            if self.on_error:
+                self.on_error(self._error)
+            if self.on_done:
+                self.on_done(False, 0, 0)
+            return
+        if self.on_done:
+            self.on_done(True, self.written,
+                         time.perf_counter() - self._started)
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""This module highlights syntax of the text in a tk.Text widget.
+
+A lexer turns one line into tokens given the state the line starts
+in, e.g. inside of a triple-quoted string. The Highlighter keeps the
+state at the start of every line, so an edit only makes the lines
+from the edited one onwards to be lexed again, and only until the
+states are the same as before the edit. Tags are put on the lines in
+the viewport and around it, the rest of the file is lexed in the
+background in small time slices, so the cost of a keystroke doesn't
+depend on the size of the file.
+"""
+
+import builtins
+import keyword
+import os
+import re
+import time
+from array import array
+from tkinter.constants import * # pylint: disable=unused-wildcard-import
+
+# Time the Tk loop may spend lexing during one step, in seconds.
+TIME_BUDGET = 0.01
+# Delay between two steps of the background lexing, in milliseconds.
+STEP_INTERVAL = 1
+# Lines longer than this number of characters are not highlighted and
+# don't change the state of the lexer.
+MAX_LINE_LENGTH = 10000
+# Prefix of the names of the tags of the tokens.
+TAG_PREFIX = "syntax."
+# Options of the tags of the token types.
+STYLES = {
+    "keyword": {"foreground": "#0000c0"},
+    "builtin": {"foreground": "#900090"},
+    "definition": {"foreground": "#006080"},
+    "decorator": {"foreground": "#805000"},
+    "string": {"foreground": "#008000"},
+    "number": {"foreground": "#b05000"},
+    "comment": {"foreground": "#808080"},
+}
+
+
+class Lexer:
+    """Base class of the lexers.
+
+    States are small integers, so they can be stored in an array of
+    bytes, one per line. A lexer must not keep anything between the
+    calls of lex_line.
+    """
+    initial_state = 0
+
+    def lex_line(self, line, state):
+        """Splits the line into tokens.
+        Args:
+            line (str): text of the line without its newline;
+            state (int): state of the lexer at the start of the line.
+        Returns:
+            tuple: (tokens, state) where tokens is a list of
+                (type, start, end) tuples, type being a key of STYLES
+                and start and end being columns of the line, and state
+                is the state at the start of the next line.
+        """
+        raise NotImplementedError
+
+
+class PythonLexer(Lexer):
+    """Lexer of python source code."""
+    # Lines start either outside of strings or inside of a string that
+    # were opened on one of the previous lines.
+    NORMAL = 0
+    STRING_STATES = {"'''": 1, '"""': 2, "'": 3, '"': 4}
+    STATE_STRINGS = {state: quote for quote, state in STRING_STATES.items()}
+
+    TOKEN = re.compile(r"""
+        (?P<comment>\#.*)
+        | (?P<string>(?:[rRbBuUfF]{1,2})?(?:'''|\"\"\"|'|"))
+        | (?P<decorator>^\s*@[\w.]+)
+        | (?P<number>\b(?:0[xXoObB][\da-fA-F_]+|(?:\d[\d_]*\.?[\d_]*
+              |\.\d[\d_]*)(?:[eE][+-]?\d+)?[jJ]?)\b)
+        | (?P<name>[^\W\d]\w*)
+        """, re.VERBOSE)
+    # Ends of the strings, escaped quotes don't end them.
+    STRING_END = {
+        quote: re.compile(r"(?:\\.|[^\\])*?" + quote, re.DOTALL)
+        for quote in ("'''", '"""')
+    }
+    STRING_END.update({
+        quote: re.compile(r"(?:\\.|[^\\{}])*{}".format(quote, quote))
+        for quote in ("'", '"')
+    })
+    KEYWORDS = frozenset(keyword.kwlist)
+    BUILTINS = frozenset(name for name in dir(builtins)
+                         if not name.startswith("_"))
+
+    def lex_line(self, line, state):
+        tokens = []
+        position = 0
+        if state != self.NORMAL:
+            position, state = self._lex_string(
+                line, 0, self.STATE_STRINGS[state], tokens)
+        definition = False
+        while state == self.NORMAL:
+            match = self.TOKEN.search(line, position)
+            if match is None:
+                break
+            kind = match.lastgroup
+            position = match.end()
+            if kind == "string":
+                quote = match.group().lstrip("rRbBuUfF")
+                position, state = self._lex_string(
+                    line, match.start(), quote, tokens, match.end())
+                continue
+            if kind == "name":
+                name = match.group()
+                if definition:
+                    kind = "definition"
+                elif name in self.KEYWORDS:
+                    kind = "keyword"
+                elif name in self.BUILTINS:
+                    kind = "builtin"
+                else:
+                    definition = False
+                    continue
+                definition = name in ("def", "class")
+            tokens.append((kind, match.start(), position))
+        return tokens, state
+
+    def _lex_string(self, line, start, quote, tokens, body=None):
+        """Adds the string that starts at start to the tokens.
+        Returns:
+            tuple: (position, state) after the string.
+        """
+        match = self.STRING_END[quote].match(
+            line, start if body is None else body)
+        if match is not None:
+            tokens.append(("string", start, match.end()))
+            return match.end(), self.NORMAL
+        tokens.append(("string", start, len(line)))
+        # Single-quoted strings go on only after a backslash
+        if len(quote) == 3 or line.endswith("\\"):
+            return len(line), self.STRING_STATES[quote]
+        return len(line), self.NORMAL
+
+
+# Lexer classes by extensions of the files
+LEXERS = {}
+
+
+def register_lexer(lexer, *extensions):
+    """Makes the lexer class to be used for files with the extensions.
+    Args:
+        lexer (type): subclass of Lexer;
+        *extensions (str): extensions with the dot, like ".py".
+    """
+    for extension in extensions:
+        LEXERS[extension.lower()] = lexer
+
+
+def lexer_for_file(file):
+    """Returns a new lexer for the file, or None if its type is not
+    known."""
+    if not file:
+        return None
+    lexer = LEXERS.get(os.path.splitext(file)[1].lower())
+    return lexer() if lexer is not None else None
+
+
+register_lexer(PythonLexer, ".py", ".pyw")
+
+
+class Highlighter:
+    """Puts the tags of the tokens on the text of a tk.Text widget.
+
+    States at the starts of the lines are kept in an array, lines
+    before the line to lex next have correct states. Edits move the
+    line to lex next back to the edited line, and the lexing stops
+    once a line after the edited ones starts in the same state as
+    before. Lines which tags may be wrong are flagged and are tagged
+    again when they get near the viewport.
+    """
+    def __init__(self, text, document, lexer=None):
+        """
+        Args:
+            text (tk.Text): widget with the text;
+            document (Document): document mirroring the widget, used
+                to read the lines;
+            lexer (Lexer or None): lexer of the text, no highlighting
+                if None.
+        """
+        self.text = text
+        self.document = document
+        self.lexer = None
+        # State at the start of every line and whether the tags of
+        # every line are up to date
+        self.states = array('B')
+        self.tagged = bytearray()
+        # Line to lex next, None if all the states are correct
+        self.next_line = None
+        # Last line changed by the edits that are not lexed yet
+        self.dirty_end = 0
+        self._job = None
+
+        for kind, options in STYLES.items():
+            self.text.tag_config(TAG_PREFIX + kind, **options)
+            self.text.tag_lower(TAG_PREFIX + kind, SEL)
+        self.set_lexer(lexer)
+
+    def set_lexer(self, lexer):
+        """Highlights the whole text again with the lexer, or removes
+        the highlighting if the lexer is None. Does nothing if the
+        lexer is of the same type as the current one."""
+        if type(lexer) is type(self.lexer): # pylint: disable=unidiomatic-typecheck
+            return
+        self.lexer = lexer
+        self._cancel()
+        for kind in STYLES:
+            self.text.tag_remove(TAG_PREFIX + kind, "1.0", END)
+        if lexer is None:
+            self.states = array('B')
+            self.tagged = bytearray()
+            self.next_line = None
+            return
+        line_count = self.document.line_count
+        self.states = array('B', [lexer.initial_state]) * line_count
+        self.tagged = bytearray(line_count)
+        self.next_line = 0
+        self.dirty_end = line_count - 1
+        self.schedule()
+
+    def on_edit(self, operation, offset, text):
+        """Listener of the DocumentSync, called after the edit."""
+        if self.lexer is None:
+            return
+        line = self.document.line_of_offset(offset)
+        newlines = text.count("\n")
+        dirty_end = self.dirty_end
+        if operation == "insert":
+            self.states[line + 1:line + 1] = array(
+                'B', [self.lexer.initial_state]) * newlines
+            self.tagged[line + 1:line + 1] = bytes(newlines)
+            if dirty_end > line:
+                dirty_end += newlines
+            dirty_end = max(dirty_end, line + newlines)
+        else:
+            del self.states[line + 1:line + 1 + newlines]
+            del self.tagged[line + 1:line + 1 + newlines]
+            if dirty_end > line:
+                dirty_end = max(dirty_end - newlines, line)
+        self.tagged[line] = 0
+        if self.next_line is None:
+            self.next_line = line
+            self.dirty_end = line + (newlines if operation == "insert" else 0)
+        else:
+            self.next_line = min(self.next_line, line)
+            self.dirty_end = max(dirty_end, line)
+        self.schedule()
+
+    def on_view(self):
+        """Listener of the view of the text."""
+        if self.lexer is not None:
+            self.schedule()
+
+    def schedule(self):
+        if self._job is None:
+            self._job = self.text.after_idle(self._step)
+
+    def close(self):
+        """Stops the background lexing."""
+        self.lexer = None
+        self._cancel()
+
+    def _cancel(self):
+        if self._job is not None:
+            self.text.after_cancel(self._job)
+            self._job = None
+
+    def _step(self):
+        """Lexes lines until the time budget runs out, tags the lines
+        around the viewport and schedules the next step if the states
+        are not all correct yet."""
+        self._job = None
+        if self.lexer is None:
+            return
+        deadline = time.perf_counter() + TIME_BUDGET
+        while self.next_line is not None:
+            self._lex_next()
+            if time.perf_counter() > deadline:
+                break
+        self.tag_view()
+        if self.next_line is not None:
+            self._job = self.text.after(STEP_INTERVAL, self._step)
+
+    def _lex_next(self):
+        """Lexes the next line and stores the state of the line after
+        it."""
+        line = self.next_line
+        state = self._lex(line)[1]
+        line += 1
+        if line >= len(self.states):
+            self.next_line = None
+        elif line > self.dirty_end and self.states[line] == state:
+            # The rest of the lines start as they did before the edit
+            self.next_line = None
+        else:
+            if self.states[line] != state:
+                self.states[line] = state
+                self.tagged[line] = 0
+            self.next_line = line
+
+    def _lex(self, line):
+        """Returns tokens of the line and state of the next one."""
+        state = self.states[line]
+        start = self.document.line_start(line)
+        if line + 1 < self.document.line_count:
+            end = self.document.line_start(line + 1) - 1
+        else:
+            end = len(self.document)
+        if end - start > MAX_LINE_LENGTH:
+            return [], state
+        return self.lexer.lex_line(self.document.get_text(start, end), state)
+
+    def tag_view(self):
+        """Tags the lines in the viewport and one screen above and
+        below it which tags are not up to date and which states are
+        correct."""
+        first = int(self.text.index("@0,0").split('.')[0]) - 1
+        last = int(self.text.index("@0,{}".format(
+            self.text.winfo_height())).split('.')[0]) - 1
+        margin = last - first + 1
+        first = max(first - margin, 0)
+        last = min(last + margin, len(self.states) - 1)
+        if self.next_line is not None:
+            last = min(last, self.next_line - 1)
+
+        ranges = {kind: [] for kind in STYLES}
+        run_start = None
+        for line in range(first, last + 2):
+            if line <= last and not self.tagged[line]:
+                if run_start is None:
+                    run_start = line
+                for kind, start, end in self._lex(line)[0]:
+                    ranges[kind].append("{}.{}".format(line + 1, start))
+                    ranges[kind].append("{}.{}".format(line + 1, end))
+                self.tagged[line] = 1
+            elif run_start is not None:
+                # Old tags are removed from the whole run of lines
+                # at once
+                for kind in STYLES:
+                    self.text.tag_remove(TAG_PREFIX + kind,
+                                         "{}.0".format(run_start + 1),
+                                         "{}.0".format(line + 1))
+                run_start = None
+        for kind, indices in ranges.items():
+            if indices:
+                self.text.tag_add(TAG_PREFIX + kind, *indices)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""This module keeps journals of the edits of the open files.
+
+Every edit of a file is appended to its journal, a text file with a
+header line that describes the file on the disk the edits apply to
+and one JSON line per edit. Edits are collected on the Tk side and
+written by a background thread every FLUSH_INTERVAL or every
+FLUSH_EDITS edits, so autosaving costs only the size of the change
+whatever the size of the file. The journal is started over every time
+the file is saved, and is removed when the file is closed. Journals
+left by an editor that didn't close its files can be replayed on the
+file the next time.
+"""
+
+import json
+import os
+import queue
+import threading
+
+# Directory the journals are kept in.
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".text_editor_journals")
+# Pending edits are written after this number of milliseconds...
+FLUSH_INTERVAL = 2000
+# ...or once there are this many of them.
+FLUSH_EDITS = 256
+SUFFIX = ".journal"
+ENCODING = "utf-8"
+
+# Operations of the records
+INSERT = "i"
+DELETE = "d"
+
+
+def journal_path(file, directory=JOURNAL_DIR, pid=None):
+    """Returns path to the journal of the file kept by the process.
+    Args:
+        file (str): path to the edited file;
+        directory (str): directory of the journals;
+        pid (int): id of the process, the current one if None.
+    """
+    import hashlib # pylint: disable=import-outside-toplevel
+    name = hashlib.sha1(os.path.abspath(file).encode(
+        ENCODING, "surrogateescape")).hexdigest()
+    return os.path.join(directory, "{}.{}{}".format(
+        name, os.getpid() if pid is None else pid, SUFFIX))
+
+
+def file_state(file):
+    """Returns (size, mtime) of the file, which tell if the file were
+    changed since the journal were started."""
+    status = os.stat(file)
+    return status.st_size, status.st_mtime_ns
+
+
+class Journal:
+    """Append-only journal of the edits of one file.
+
+    record is a listener of DocumentSync. Records are lists of
+    [INSERT, offset, text] or [DELETE, offset, length], offsets are
+    counted in characters of the text before the edit, like the ones
+    of the Document.
+    """
+    def __init__(self, widget, file, directory=JOURNAL_DIR):
+        """
+        Args:
+            widget (tk.Widget): widget the flush timer runs on;
+            file (str): path to the edited file, it must exist;
+            directory (str): directory of the journals.
+        """
+        self.widget = widget
+        self.directory = directory
+        self.file = None
+        self.path = None
+        self.pending = []
+        self._job = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+        self.reset(file)
+
+    def record(self, operation, offset, text):
+        """Adds the edit to the journal, listener of DocumentSync."""
+        if operation == "insert":
+            self.pending.append([INSERT, offset, text])
+        else:
+            self.pending.append([DELETE, offset, len(text)])
+        if len(self.pending) >= FLUSH_EDITS:
+            self.flush()
+        elif self._job is None:
+            self._job = self.widget.after(FLUSH_INTERVAL, self.flush)
+
+    def flush(self):
+        """Hands the pending edits over to the writer thread."""
+        self._cancel()
+        if self.pending:
+            self._queue.put(("append", self.path, self.pending))
+            self.pending = []
+
+    def reset(self, file):
+        """Starts the journal over for the file as it is on the disk
+        now, e.g. after the file were saved. The old journal is
+        removed.
+        Raises:
+            OSError: if the file can't be read.
+        """
+        size, mtime = file_state(file)
+        self._cancel()
+        self.pending = []
+        if self.path is not None:
+            self._queue.put(("remove", self.path, None))
+        self.file = os.path.abspath(file)
+        self.path = journal_path(self.file, self.directory)
+        header = {"file": self.file, "size": size, "mtime": mtime}
+        self._queue.put(("create", self.path, header))
+
+    def close(self):
+        """Removes the journal and stops the writer thread. Pending
+        edits are dropped, the file is either saved or discarded."""
+        self._cancel()
+        self.pending = []
+        self._queue.put(("remove", self.path, None))
+        self._queue.put(None)
+        self._thread.join()
+
+    def _cancel(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+
+    def _write(self):
+        """Writer thread. The journal of a file is written only by
+        this thread, every batch is synced to the disk."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            action, path, data = item
+            try:
+                if action == "remove":
+                    os.remove(path)
+                    continue
+                if action == "create":
+                    os.makedirs(self.directory, exist_ok=True)
+                    lines = [data]
+                    mode = 'w'
+                else:
+                    lines = data
+                    mode = 'a'
+                with open(path, mode, encoding=ENCODING) as work_file:
+                    # ensure_ascii keeps lone surrogates of the text
+                    work_file.write("".join(
+                        json.dumps(line) + "\n" for line in lines))
+                    work_file.flush()
+                    os.fsync(work_file.fileno())
+            except OSError:
+                # The journal is a safety net, the editor goes on
+                # without it
+                pass
+
+
+def read_journal(path):
+    """Reads the journal.
+    Returns:
+        tuple: (header, records), records are cut at the first broken
+            line, e.g. the one that were written when the editor
+            crashed.
+    Raises:
+        OSError: if the journal can't be read;
+        ValueError: if its header is broken.
+    """
+    with open(path, 'r', encoding=ENCODING) as work_file:
+        header = json.loads(work_file.readline())
+        if not isinstance(header, dict) or "file" not in header:
+            raise ValueError("Not a journal: {}".format(path))
+        records = []
+        for line in work_file:
+            try:
+                operation, offset, value = json.loads(line)
+            except ValueError:
+                break
+            records.append((operation, offset, value))
+    return header, records
+
+
+def find_journals(directory=JOURNAL_DIR):
+    """Finds journals left by editors that are not running anymore.
+    Returns:
+        list: paths to the journals.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    journals = []
+    for name in names:
+        parts = name.split(".")
+        if len(parts) != 3 or "." + parts[2] != SUFFIX:
+            continue
+        try:
+            pid = int(parts[1])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _is_running(pid):
+            journals.append(os.path.join(directory, name))
+    return journals
+
+
+def remove_journal(path):
+    """Removes the journal, if it still exists."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _is_running(pid):
+    if os.name != "posix":
+        # Signal 0 would terminate the process on Windows, journals of
+        # the other running editors can't be told from the left ones
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
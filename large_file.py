@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""This module shows files too big for the tk.Text widget.
+
+The file is memory-mapped and only the lines around the viewport are
+put into the widget. A sparse LineIndex built in one pass over the
+file maps line numbers to offsets, and the vertical scrollbar is
+mapped to offsets in the file instead of lines of the widget.
+"""
+
+import mmap
+from array import array
+from bisect import bisect_right
+from tkinter.constants import * # pylint: disable=unused-wildcard-import
+
+# Files bigger than this number of bytes are opened in the large file
+# view instead of being loaded into the text widget.
+LARGE_FILE_THRESHOLD = 64 * 1024 * 1024
+# Distance between two checkpoints of the LineIndex, in bytes.
+INDEX_STEP = 64 * 1024
+# Lines rendered below the last visible one, so a partly visible line
+# at the bottom is not left empty.
+EXTRA_LINES = 2
+# Lines scrolled by one step of the mouse wheel.
+WHEEL_LINES = 3
+ENCODING = "utf-8"
+
+
+class LineIndex:
+    """Sparse index of lines of a bytes-like object.
+
+    Keeps the number and the offset of the first line that starts
+    after every INDEX_STEP bytes, so the index of a multi-GB file
+    takes a few megabytes. Lines between two checkpoints are found
+    by scanning at most INDEX_STEP bytes.
+    """
+    def __init__(self, data, step=INDEX_STEP):
+        """
+        Args:
+            data (mmap or bytes): contents of the file;
+            step (int): distance between checkpoints in bytes.
+        """
+        self.data = data
+        self.size = len(data)
+        self.offsets = array("q", [0])
+        self.lines = array("q", [0])
+
+        # Newlines are counted a block at a time, the only per-block
+        # python work is storing the checkpoint.
+        newlines = 0
+        previous = 0
+        for start in range(step, self.size, step):
+            newlines += data[previous:start].count(b"\n")
+            previous = start
+            newline = data.find(b"\n", start - 1, start - 1 + step)
+            if newline == -1:
+                continue
+            line = newlines + (1 if newline >= start else 0)
+            if newline + 1 > self.offsets[-1]:
+                self.offsets.append(newline + 1)
+                self.lines.append(line)
+        newlines += data[previous:self.size].count(b"\n")
+        self.line_count = newlines + 1
+
+    def line_offset(self, line):
+        """Returns offset of the first byte of the line."""
+        line = max(0, min(line, self.line_count - 1))
+        checkpoint = bisect_right(self.lines, line) - 1
+        offset = self.offsets[checkpoint]
+        for _ in range(line - self.lines[checkpoint]):
+            offset = self.data.find(b"\n", offset) + 1
+        return offset
+
+    def line_of_offset(self, offset):
+        """Returns number of the line the byte at offset is on."""
+        checkpoint = bisect_right(self.offsets, offset) - 1
+        start = self.offsets[checkpoint]
+        return self.lines[checkpoint] + self.data[start:offset].count(b"\n")
+
+    def line_start(self, offset):
+        """Returns offset of the start of the line the byte at offset
+        is on."""
+        checkpoint = bisect_right(self.offsets, offset) - 1
+        return self.data.rfind(b"\n", self.offsets[checkpoint], offset) + 1 \
+            or self.offsets[checkpoint]
+
+    def next_line(self, offset):
+        """Returns offset of the line after the one at offset, or None
+        if it is the last line."""
+        newline = self.data.find(b"\n", offset)
+        return None if newline == -1 else newline + 1
+
+    def previous_line(self, offset):
+        """Returns offset of the line before the one that starts at
+        offset, or None if it is the first line."""
+        if offset == 0:
+            return None
+        return self.line_start(offset - 1)
+
+
+class LargeFileView:
+    """Read-only view of a file that keeps only visible lines in a
+    tk.Text widget.
+
+    The view takes over scrolling of the widget: the scrollbar, the
+    mouse wheel and navigation keys move the window of the file that
+    is rendered, the widget itself is never scrolled vertically.
+    """
+    def __init__(self, text, y_scrollbar, file, on_render=None):
+        """
+        Args:
+            text (tk.Text): widget the file is shown in;
+            y_scrollbar (tk.Scrollbar): vertical scrollbar of the text;
+            file (str): path to the file;
+            on_render (callable): called without arguments every time
+                the lines in the widget are replaced.
+        """
+        self.text = text
+        self.y_scrollbar = y_scrollbar
+        self.file = file
+        self.on_render = on_render
+
+        with open(file, 'rb') as work_file:
+            self.data = mmap.mmap(work_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        self.index = LineIndex(self.data)
+        self.size = len(self.data)
+        self.top_offset = 0
+        self.top_line = 0
+        self.end_offset = 0
+        self._redraw_job = None
+
+        self.bindtag = "LargeFileView{}".format(id(self))
+        self.bind_keys()
+        self.text.bindtags((self.bindtag,) + self.text.bindtags())
+        self.y_scrollbar.config(command=self.yview)
+        self.text.config(yscrollcommand="")
+        self.render()
+
+    def bind_keys(self):
+        bindings = {
+            "<MouseWheel>": lambda event: self.scroll(
+                -WHEEL_LINES if event.delta > 0 else WHEEL_LINES, UNITS),
+            "<Button-4>": lambda event: self.scroll(-WHEEL_LINES, UNITS),
+            "<Button-5>": lambda event: self.scroll(WHEEL_LINES, UNITS),
+            "<Up>": lambda event: self.scroll(-1, UNITS),
+            "<Down>": lambda event: self.scroll(1, UNITS),
+            "<Prior>": lambda event: self.scroll(-1, PAGES),
+            "<Next>": lambda event: self.scroll(1, PAGES),
+            "<Control-Home>": lambda event: self.yview(MOVETO, 0),
+            "<Control-End>": lambda event: self.yview(MOVETO, 1),
+        }
+        for sequence, handler in bindings.items():
+            self.text.bind_class(
+                self.bindtag, sequence,
+                lambda event, handler=handler: handler(event) or "break")
+        # Configure is not a navigation event and is not stopped
+        self.text.bind_class(self.bindtag, "<Configure>",
+                             lambda event: self.schedule_render())
+
+    def close(self):
+        """Removes the view from the widget and unmaps the file. The
+        scrollbar has to be connected back to the widget by the
+        caller."""
+        if self._redraw_job is not None:
+            self.text.after_cancel(self._redraw_job)
+        self.text.bindtags(tuple(tag for tag in self.text.bindtags()
+                                 if tag != self.bindtag))
+        for sequence in self.text.bind_class(self.bindtag):
+            self.text.unbind_class(self.bindtag, sequence)
+        self.text.config(state=NORMAL)
+        self.text.delete("1.0", END)
+        self.data.close()
+
+    def visible_lines(self):
+        """Number of lines that fit in the widget."""
+        linespace = int(self.text.tk.call(
+            "font", "metrics", self.text.cget("font"), "-linespace")) or 1
+        return max(self.text.winfo_height() // linespace, 1)
+
+    def yview(self, *args):
+        """Command of the vertical scrollbar, takes the same arguments
+        as tk.Text.yview."""
+        if args[0] == MOVETO:
+            fraction = min(max(float(args[1]), 0.0), 1.0)
+            offset = min(int(fraction * self.size), self.size)
+            self.top_offset = self.index.line_start(offset)
+            self.top_line = self.index.line_of_offset(self.top_offset)
+            self._clamp_bottom()
+            self.render()
+        elif args[0] == SCROLL:
+            self.scroll(int(args[1]), args[2])
+
+    def scroll(self, number, what):
+        """Scrolls the view by number of lines or pages."""
+        if what.startswith(PAGES):
+            number *= self.visible_lines()
+        step = self.index.next_line if number > 0 else self.index.previous_line
+        for _ in range(abs(number)):
+            offset = step(self.top_offset)
+            if offset is None:
+                break
+            self.top_offset = offset
+            self.top_line += 1 if number > 0 else -1
+        self._clamp_bottom()
+        self.render()
+
+    def show_line(self, line):
+        """Scrolls the view so the line counted from 0 is near its
+        top."""
+        self.top_line = max(0, min(line, self.index.line_count - 1))
+        self.top_offset = self.index.line_offset(self.top_line)
+        self._clamp_bottom()
+        self.render()
+
+    def show_offset(self, offset):
+        """Scrolls the view so the line with the byte at offset is
+        near its top."""
+        offset = max(0, min(offset, self.size))
+        self.top_offset = self.index.line_start(offset)
+        self.top_line = self.index.line_of_offset(self.top_offset)
+        self._clamp_bottom()
+        self.render()
+
+    def _clamp_bottom(self):
+        """Doesn't let the last line go above the bottom of the view."""
+        last_top = self.index.line_count - self.visible_lines()
+        if self.top_line > last_top > 0:
+            self.top_line = last_top
+            self.top_offset = self.index.line_offset(last_top)
+
+    def schedule_render(self):
+        if self._redraw_job is None:
+            self._redraw_job = self.text.after_idle(self.render)
+
+    def render(self):
+        """Puts the lines of the viewport into the widget and updates
+        the scrollbar."""
+        self._redraw_job = None
+        end = self.top_offset
+        for _ in range(self.visible_lines() + EXTRA_LINES):
+            offset = self.index.next_line(end)
+            if offset is None:
+                end = self.size
+                break
+            end = offset
+        self.end_offset = end
+        chunk = self.data[self.top_offset:end].decode(ENCODING, "replace")
+
+        self.text.config(state=NORMAL)
+        self.text.delete("1.0", END)
+        self.text.insert("1.0", chunk)
+        self.text.config(state=DISABLED)
+        # The view is not an edit, nothing to undo or to save
+        self.text.edit_reset()
+        self.text.edit_modified(False)
+        if self.size:
+            self.y_scrollbar.set(self.top_offset / self.size,
+                                 end / self.size)
+        else:
+            self.y_scrollbar.set(0, 1)
+        if self.on_render:
+            self.on_render()
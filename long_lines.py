@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""This module shows texts with very long lines, like minified
+JavaScript or one-line logs, without making the tk.Text widget slow.
+
+The widget lays out whole lines, so a line of a few hundred kilobytes
+makes every redraw, scroll and change of the wrapping slow. The
+LongLineView keeps the text in the Document and puts into the widget
+only the rows in the viewport. Wrapped lines are cut into rows as wide
+as the widget, and of lines that are not wrapped only the visible
+columns are put in, so the widget never holds more than a screen of
+text and its own wrapping is never used.
+"""
+
+from bisect import bisect_right
+from tkinter.constants import * # pylint: disable=unused-wildcard-import
+
+# Lines longer than this number of characters make the text to be
+# shown in the LongLineView.
+LONG_LINE_LENGTH = 20000
+# Rows rendered below the last visible one, so a partly visible row at
+# the bottom is not left empty.
+EXTRA_ROWS = 2
+# Columns rendered to the right of the last visible one.
+EXTRA_COLUMNS = 8
+# Rows scrolled by one step of the mouse wheel.
+WHEEL_ROWS = 3
+# Columns scrolled by one step of the horizontal scrollbar or of the
+# mouse wheel with Shift.
+COLUMN_STEP = 8
+# Width of the rows in characters while the widget has no size yet.
+DEFAULT_COLUMNS = 80
+
+
+class LongLineView:
+    """Read-only view of a Document that keeps only the visible rows
+    in a tk.Text widget.
+
+    A row is a part of a line that fits the width of the widget. The
+    view takes over both scrollbars, the mouse wheel and the
+    navigation keys, the widget itself is never scrolled. Indices of
+    the widget are converted to offsets of the Document by
+    index_to_offset and back by offset_to_index.
+    """
+    def __init__(self, text, x_scrollbar, y_scrollbar, document, command,
+                 wrap=False, on_render=None):
+        """
+        Args:
+            text (tk.Text): widget the text is shown in;
+            x_scrollbar (tk.Scrollbar): horizontal scrollbar of the
+                text;
+            y_scrollbar (tk.Scrollbar): vertical scrollbar of the text;
+            document (Document): the text;
+            command (callable): calls the widget's own Tcl command,
+                so the rendered rows are not taken for edits of the
+                Document;
+            wrap (bool): whether long lines are wrapped;
+            on_render (callable): called without arguments every time
+                the rows in the widget are replaced.
+        """
+        self.text = text
+        self.x_scrollbar = x_scrollbar
+        self.y_scrollbar = y_scrollbar
+        self.document = document
+        self.command = command
+        self.wrap = wrap
+        self.on_render = on_render
+        # Offset of the start of the top row and the first visible
+        # column of the lines that are not wrapped
+        self.top = 0
+        self.left = 0
+        # (start, end) offsets of the rendered rows, their starts and
+        # numbers of the lines they start, None for the rows that
+        # continue a wrapped line
+        self.rows = []
+        self._starts = []
+        self._lines = []
+        # Length of the longest of the rendered lines and whether the
+        # last row of the text is rendered
+        self.longest = 0
+        self.at_end = True
+        self._redraw_job = None
+
+        self.bindtag = "LongLineView{}".format(id(self))
+        self.bind_keys()
+        self.text.bindtags((self.bindtag,) + self.text.bindtags())
+        self.y_scrollbar.config(command=self.yview)
+        self.x_scrollbar.config(command=self.xview)
+        self.text.config(yscrollcommand="", xscrollcommand="")
+        self.render()
+
+    def bind_keys(self):
+        bindings = {
+            "<MouseWheel>": lambda event: self.scroll(
+                -WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS, UNITS),
+            "<Button-4>": lambda event: self.scroll(-WHEEL_ROWS, UNITS),
+            "<Button-5>": lambda event: self.scroll(WHEEL_ROWS, UNITS),
+            "<Shift-MouseWheel>": lambda event: self.scroll_columns(
+                -COLUMN_STEP if event.delta > 0 else COLUMN_STEP),
+            "<Shift-Button-4>": lambda event: self.scroll_columns(
+                -COLUMN_STEP),
+            "<Shift-Button-5>": lambda event: self.scroll_columns(
+                COLUMN_STEP),
+            "<Up>": lambda event: self.scroll(-1, UNITS),
+            "<Down>": lambda event: self.scroll(1, UNITS),
+            "<Prior>": lambda event: self.scroll(-1, PAGES),
+            "<Next>": lambda event: self.scroll(1, PAGES),
+            "<Control-Home>": lambda event: self.yview(MOVETO, 0),
+            "<Control-End>": lambda event: self.yview(MOVETO, 1),
+        }
+        for sequence, handler in bindings.items():
+            self.text.bind_class(
+                self.bindtag, sequence,
+                lambda event, handler=handler: handler(event) or "break")
+        # Configure is not a navigation event and is not stopped
+        self.text.bind_class(self.bindtag, "<Configure>",
+                             lambda event: self.schedule_render())
+
+    def close(self):
+        """Removes the view and its rows from the widget. The
+        scrollbars have to be connected back to the widget by the
+        caller."""
+        if self._redraw_job is not None:
+            self.text.after_cancel(self._redraw_job)
+            self._redraw_job = None
+        self.text.bindtags(tuple(tag for tag in self.text.bindtags()
+                                 if tag != self.bindtag))
+        for sequence in self.text.bind_class(self.bindtag):
+            self.text.unbind_class(self.bindtag, sequence)
+        self.text.config(state=NORMAL)
+        self.command("delete", "1.0", END)
+
+    @property
+    def top_line(self):
+        """Number of the line the top row is in, counted from 0."""
+        return self.document.line_of_offset(self.top)
+
+    def visible_rows(self):
+        """Number of rows that fit in the widget."""
+        linespace = int(self.text.tk.call(
+            "font", "metrics", self.text.cget("font"), "-linespace")) or 1
+        return max(self.text.winfo_height() // linespace, 1)
+
+    def visible_columns(self):
+        """Number of characters of the font that fit in a row."""
+        width = self.text.winfo_width()
+        if width <= 1:
+            return DEFAULT_COLUMNS
+        char_width = int(self.text.tk.call(
+            "font", "measure", self.text.cget("font"), "0")) or 1
+        return max(width // char_width, 1)
+
+    def set_wrap(self, wrap):
+        """Wraps the long lines or stops wrapping them. Only the rows
+        in the viewport are rendered again, so it takes the same time
+        for any length of the lines."""
+        self.wrap = wrap
+        self.left = 0
+        self.top = self._row_start(self.top)
+        self.render()
+
+    # Conversions of indices
+
+    def index_to_offset(self, index):
+        """Converts "line.column" index of the widget to offset in the
+        Document."""
+        if not self.rows:
+            return 0
+        line, column = map(int, self.text.index(index).split('.'))
+        if line > len(self.rows):
+            return self.rows[-1][1]
+        start, end = self.rows[line - 1]
+        return start + min(column, end - start)
+
+    def offset_to_index(self, offset):
+        """Converts offset in the Document to index of the widget.
+        Offsets before the rendered rows are moved to the first of
+        them, offsets after a row or after its visible columns are
+        moved to its end."""
+        row = bisect_right(self._starts, offset) - 1
+        if row < 0:
+            return "1.0"
+        start, end = self.rows[row]
+        return "{}.{}".format(row + 1, min(offset - start, end - start))
+
+    def line_number(self, row):
+        """Number of the line the row of the widget starts, counted
+        from 1, None if the row continues a wrapped line."""
+        if row >= len(self._lines):
+            return None
+        line = self._lines[row]
+        return None if line is None else line + 1
+
+    # Scrolling
+
+    def yview(self, *args):
+        """Command of the vertical scrollbar, takes the same arguments
+        as tk.Text.yview."""
+        if args[0] == MOVETO:
+            fraction = min(max(float(args[1]), 0.0), 1.0)
+            self.top = self._row_start(int(fraction * len(self.document)))
+            self._clamp_bottom()
+            self.render()
+        elif args[0] == SCROLL:
+            self.scroll(int(args[1]), args[2])
+
+    def xview(self, *args):
+        """Command of the horizontal scrollbar, takes the same
+        arguments as tk.Text.xview."""
+        if self.wrap:
+            return
+        if args[0] == MOVETO:
+            fraction = min(max(float(args[1]), 0.0), 1.0)
+            self.left = int(fraction * self.longest)
+            self._clamp_left()
+            self.render()
+        elif args[0] == SCROLL:
+            number = int(args[1])
+            if args[2].startswith(PAGES):
+                self.scroll_columns(number * self.visible_columns())
+            else:
+                self.scroll_columns(number * COLUMN_STEP)
+
+    def scroll(self, number, what):
+        """Scrolls the view by number of rows or pages."""
+        if what.startswith(PAGES):
+            number *= self.visible_rows()
+        step = self._next_row if number > 0 else self._previous_row
+        for _ in range(abs(number)):
+            offset = step(self.top)
+            if offset is None:
+                break
+            self.top = offset
+        self._clamp_bottom()
+        self.render()
+
+    def scroll_columns(self, number):
+        """Scrolls the lines that are not wrapped by number of
+        columns."""
+        if self.wrap:
+            return
+        self.left += number
+        self._clamp_left()
+        self.render()
+
+    def show_line(self, line):
+        """Scrolls the view so the line counted from 0 is near its
+        top."""
+        line = max(0, min(line, self.document.line_count - 1))
+        self.show_offset(self.document.line_start(line))
+
+    def show_offset(self, offset):
+        """Scrolls the view so the character at offset is in it, near
+        its top if it has to be scrolled vertically."""
+        offset = max(0, min(offset, len(self.document)))
+        rendered = (self.rows and self.rows[0][0] <= offset
+                    <= self.rows[min(self.visible_rows(), len(self.rows))
+                                 - 1][1])
+        if not self.wrap:
+            line_start = self.document.line_start(
+                self.document.line_of_offset(offset))
+            column = offset - line_start
+            columns = self.visible_columns()
+            if not self.left <= column < self.left + columns:
+                self.left = max(column - columns // 2, 0)
+                rendered = False
+        if rendered:
+            return
+        self.top = self._row_start(offset)
+        self._clamp_bottom()
+        self.render()
+
+    def _clamp_bottom(self):
+        """Doesn't let the last row go above the bottom of the view."""
+        last_top = self._row_start(len(self.document))
+        for _ in range(self.visible_rows() - 1):
+            previous = self._previous_row(last_top)
+            if previous is None:
+                break
+            last_top = previous
+        self.top = min(self.top, last_top)
+
+    def _clamp_left(self):
+        self.left = max(0, min(self.left,
+                               self.longest - self.visible_columns()))
+
+    # Rows
+
+    def _line_end(self, line):
+        """Offset of the newline that ends the line, or of the end of
+        the text."""
+        if line + 1 < self.document.line_count:
+            return self.document.line_start(line + 1) - 1
+        return len(self.document)
+
+    def _row_start(self, offset):
+        """Offset of the start of the row with the character at
+        offset."""
+        line_start = self.document.line_start(
+            self.document.line_of_offset(offset))
+        if not self.wrap:
+            return line_start
+        width = self.visible_columns()
+        return line_start + (offset - line_start) // width * width
+
+    def _next_row(self, start):
+        """Offset of the row after the one that starts at start, None
+        if it is the last row."""
+        line_end = self._line_end(self.document.line_of_offset(start))
+        if self.wrap and start + self.visible_columns() < line_end:
+            return start + self.visible_columns()
+        return line_end + 1 if line_end < len(self.document) else None
+
+    def _previous_row(self, start):
+        """Offset of the row before the one that starts at start, None
+        if it is the first row."""
+        if start == 0:
+            return None
+        line_start = self.document.line_start(
+            self.document.line_of_offset(start))
+        if self.wrap and start > line_start:
+            return start - self.visible_columns()
+        return self._row_start(start - 1)
+
+    def schedule_render(self):
+        if self._redraw_job is None:
+            self._redraw_job = self.text.after_idle(self.render)
+
+    def render(self):
+        """Puts the rows of the viewport into the widget and updates
+        the scrollbars. The cursor and the selection keep their
+        offsets if they are still in the viewport."""
+        self._redraw_job = None
+        document = self.document
+        cursor = self.index_to_offset(INSERT)
+        ranges = self.text.tag_ranges(SEL)
+        selection = (self.index_to_offset(ranges[0]),
+                     self.index_to_offset(ranges[-1])) if ranges else None
+
+        columns = self.visible_columns()
+        # The width of the rows changes with the width of the widget
+        self.top = self._row_start(min(self.top, len(document)))
+        rows, lines = [], []
+        longest = 0
+        start = self.top
+        for _ in range(self.visible_rows() + EXTRA_ROWS):
+            line = document.line_of_offset(start)
+            line_start = document.line_start(line)
+            line_end = self._line_end(line)
+            if self.wrap:
+                rows.append((start, min(start + columns, line_end)))
+            else:
+                first = min(line_start + self.left, line_end)
+                rows.append((first, min(first + columns + EXTRA_COLUMNS,
+                                        line_end)))
+            lines.append(line if start == line_start else None)
+            longest = max(longest, line_end - line_start)
+            start = self._next_row(start)
+            if start is None:
+                break
+        self.at_end = start is None
+        self.rows = rows
+        self._starts = [first for first, _ in rows]
+        self._lines = lines
+        self.longest = longest
+
+        self.text.config(state=NORMAL)
+        self.command("delete", "1.0", END)
+        self.command("insert", "1.0", "\n".join(
+            document.get_text(first, last) for first, last in rows))
+        self.text.config(state=DISABLED)
+        self.text.mark_set(INSERT, self.offset_to_index(cursor))
+        if selection is not None:
+            self.text.tag_add(SEL, self.offset_to_index(selection[0]),
+                              self.offset_to_index(selection[1]))
+        self._update_scrollbars(columns)
+        if self.on_render:
+            self.on_render()
+
+    def _update_scrollbars(self, columns):
+        size = len(self.document)
+        if size:
+            self.y_scrollbar.set(self.top / size, self.rows[-1][1] / size)
+        else:
+            self.y_scrollbar.set(0, 1)
+        longest = self.longest
+        if self.wrap or longest <= columns:
+            self.x_scrollbar.set(0, 1)
+        else:
+            self.x_scrollbar.set(self.left / longest,
+                                 min(self.left + columns, longest) / longest)
@@ -4,78 +4,152 @@
 
 """
 
+from collections import namedtuple
 import tkinter as tk
 from tkinter.constants import * # pylint: disable=unused-wildcard-import
 
+# Compiled menu content. entries is a tuple of MenuEntry, options is a
+# tuple of (name, value) pairs of the tk.Menu options.
+CompiledMenu = namedtuple("CompiledMenu", "entries options")
+# Compiled entry of a menu. options is a tuple of (name, value) pairs,
+# submenu is the CompiledMenu of a cascade and enabled is a callable
+# that tells if the entry should be enabled, both can be None.
+MenuEntry = namedtuple("MenuEntry", "entry_type options submenu enabled")
 
-def make_menu(parent, menu_content):
-    """Creates an instance of tkinter Menu class with given content.
+
+def compile_menu(menu_content, predicates=None):
+    """Turns menu content into an immutable structure that can be
+    used to make any number of menus. menu_content is left unchanged.
     Args:
-        parent (Class): parent class that menu widget attached to;
-        menu_content (list): list of dictionaries. Every dict is a
-            separate command that would be added to the menu. Type of
-            command determined by the "entry_type". Structure of the
-            list:
-                [dict(entry_type="command/cascade/checkbutton/
-                    radiobutton", other keywords arguments for the
-                    specific menu being created (for cascade keyword
-                    argument menu=menu_content for the submenu)),
-                    or SEPARATOR]
-        **options: keyword arguments for the tk.Menu widget. Listed in
-            documentation for tkinter.
+        menu_content (list or CompiledMenu): content described in the
+            docstring of the make_menu function, compiled content is
+            returned as it is;
+        predicates (dict): callables that take no arguments and
+            return True if the entry with the label should be enabled,
+            by labels of the entries. They are called only when the
+            menu is posted.
     Returns:
-        menu (tk.Menu): An instance of a Menu class filled with
-            menu_content.
-
+        (CompiledMenu): compiled content.
     """
+    if isinstance(menu_content, CompiledMenu):
+        return menu_content
+    predicates = predicates or {}
+    entries = []
     # Originally "tearoff" defaults to True.
     # Lines below set it to False by default.
     options = dict(tearoff=NO)
 
-    menu = tk.Menu(parent, **options)
-
-    commands = {"command": menu.add_command,
-                "separator": menu.add_separator,
-                "cascade": menu.add_cascade,
-                "checkbutton": menu.add_checkbutton,
-                "radiobutton": menu.add_radiobutton,
-                "options": menu.config}
-
-    # Special cases for "separator" and "cascade".
     for menu_entry in menu_content:
         if menu_entry == SEPARATOR:
-            commands[SEPARATOR]()
+            entries.append(MenuEntry(SEPARATOR, (), None, None))
             continue
 
-        entry = menu_entry
-        entry_type = entry["entry_type"].lower()
-        del entry["entry_type"]
-
-        if entry_type == "cascade":
-            entry["menu"] = make_menu(menu, entry["menu"])
+        entry = dict(menu_entry)
+        entry_type = entry.pop("entry_type").lower()
 
         if entry_type == "options":
-            # dummy_options - placeholder in caise the enty options
-            # passed two or more times for some reason
-            dummy_options = options
             # Clashing keys in options overwrited by respective
             # keys in entry
-            dummy_options.update(entry)
-            entry = options
+            options.update(entry)
+            continue
+
+        submenu = None
+        if entry_type == "cascade":
+            submenu = compile_menu(entry.pop("menu"), predicates)
+        entries.append(MenuEntry(entry_type, tuple(entry.items()), submenu,
+                                 predicates.get(entry.get("label"))))
+
+    return CompiledMenu(tuple(entries), tuple(options.items()))
 
-        commands[entry_type](**entry)
 
+def make_menu(parent, menu_content, lazy=False, **options):
+    """Creates an instance of tkinter Menu class with given content.
+    Args:
+        parent (Class): parent class that menu widget attached to;
+        menu_content (list or CompiledMenu): list of dictionaries.
+            Every dict is a separate command that would be added to
+            the menu. Type of command determined by the "entry_type".
+            Structure of the list:
+                [dict(entry_type="command/cascade/checkbutton/
+                    radiobutton/options", other keywords arguments for
+                    the specific menu being created (for cascade
+                    keyword argument menu=menu_content for the
+                    submenu)), or SEPARATOR]
+            or the same content compiled with compile_menu;
+        lazy (bool): if True the entries are added when the menu is
+            posted for the first time, so an application can show its
+            window without building all of its menus;
+        **options: keyword arguments for the tk.Menu widget. Listed in
+            documentation for tkinter.
+    Returns:
+        menu (tk.Menu): An instance of a Menu class filled with
+            menu_content.
+
+    """
+    menu = tk.Menu(parent)
+    setup_menu(menu, compile_menu(menu_content), lazy, **options)
     return menu
 
-def make_menu_button(parent, menu_button_content, **options):
+def setup_menu(menu, compiled_menu, lazy=False, **options):
+    """Configures existing tk.Menu and fills it with the compiled
+    content. Entries with predicates are enabled or disabled every
+    time the menu is posted, before the postcommand of the content is
+    called. Arguments are described in the docstring of the make_menu
+    function."""
+    menu_options = dict(compiled_menu.options)
+    menu_options.update(options)
+    postcommand = menu_options.pop("postcommand", None)
+    menu.config(**menu_options)
+
+    filled = []
+    def on_post():
+        if not filled:
+            fill_menu(menu, compiled_menu, lazy)
+            filled.append(True)
+        update_menu(menu, compiled_menu)
+        if postcommand:
+            postcommand()
+
+    if not lazy:
+        fill_menu(menu, compiled_menu)
+        filled.append(True)
+    menu.config(postcommand=on_post)
+
+def fill_menu(menu, compiled_menu, lazy=False):
+    """Adds entries of the compiled content to the menu."""
+    commands = {"command": menu.add_command,
+                "separator": menu.add_separator,
+                "cascade": menu.add_cascade,
+                "checkbutton": menu.add_checkbutton,
+                "radiobutton": menu.add_radiobutton}
+
+    for entry in compiled_menu.entries:
+        entry_options = dict(entry.options)
+        if entry.submenu is not None:
+            entry_options["menu"] = make_menu(menu, entry.submenu, lazy)
+        commands[entry.entry_type](**entry_options)
+
+def update_menu(menu, compiled_menu):
+    """Enables or disables entries of the menu according to their
+    predicates."""
+    # The tearoff entry comes before the entries of the content
+    first = 1 if menu.cget("tearoff") else 0
+    for index, entry in enumerate(compiled_menu.entries, first):
+        if entry.enabled is not None:
+            menu.entryconfig(index,
+                             state=NORMAL if entry.enabled() else DISABLED)
+
+def make_menu_button(parent, menu_button_content, lazy=False, **options):
     """Creates an instance of tkinter Menubutton class with given content.
     Args:
         parent (Class): parent class that menubutton widget attached to;
         menu_button_content (2-tuple): ("menu_button_label",
             [menu_content]). Description of a menu_content given in
-            a docstring of the make_menu function.
-        **options: keyword arguments for the tk.Menu widget. Listed in
-            documentation for tkinter.
+            a docstring of the make_menu function, it can be compiled.
+        lazy (bool): if True the menu is filled when it is posted for
+            the first time;
+        **options: keyword arguments for the tk.Menubutton widget.
+            Listed in documentation for tkinter.
     Returns:
         menubutton(tk.Menubutton): An instance of a Menu class filled
             with menu_button_content.
@@ -84,7 +158,7 @@ def make_menu_button(parent, menu_button_content, **options):
     menu_content = menu_button_content[1]
 
     menubutton = tk.Menubutton(parent, text=menu_button_label, **options)
-    menu = make_menu(menubutton, menu_content, **options)
+    menu = make_menu(menubutton, menu_content, lazy)
     menubutton.config(menu=menu)
 
     return menubutton
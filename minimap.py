@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""This module draws an overview of the whole text next to its
+vertical scrollbar.
+
+The Minimap is drawn from a LineSummary: compact arrays with the
+length and the indentation of every line, and a byte per line for
+every kind of marks. The summary is updated by the edits the
+DocumentSync reports, and an edit costs python work only for the lines
+it touches. The lines are downsampled into the rows of the canvas: the
+shape of a row is taken from at most SAMPLES of its lines, its marks
+are found by searching the bytes of the marks in C, and the search
+hits are found in the sorted offsets of the find bar by bisection. So
+a redraw takes python work proportional to the height of the canvas,
+only the rows that changed are drawn again, and the text widget is
+never asked for its lines.
+"""
+
+from array import array
+from bisect import bisect_left
+from itertools import repeat
+from operator import contains, sub
+import tkinter as tk
+from tkinter.constants import * # pylint: disable=unused-wildcard-import
+
+# Width of the canvas in pixels.
+WIDTH = 80
+# Height of the row of one line in pixels, the lines of a text taller
+# than the canvas share rows.
+ROW_HEIGHT = 2
+# Lines looked at for the shape of a row.
+SAMPLES = 16
+# Columns of a line that fill the width of the canvas.
+COLUMNS = 120
+# Width of a mark in pixels, marks of different kinds are side by side
+# at the right edge.
+MARK_WIDTH = 6
+# Lengths and indentations are stored up to this value.
+MAX_VALUE = 0xFFFF
+# Characters of an edited line read to find its indentation and errors.
+SCAN_LIMIT = 4096
+# Delay between an edit and the redraw of the rows, in milliseconds,
+# so a burst of edits results in one redraw.
+REDRAW_DELAY = 100
+# Character the decoders put in place of bytes that can't be decoded.
+ERROR_CHARACTER = "\ufffd"
+
+# Kinds of marks, in the order they are drawn from the right edge
+HIT = "hit"
+MODIFIED = "modified"
+ERROR = "error"
+MARK_COLORS = {HIT: "orange", MODIFIED: "royal blue", ERROR: "red"}
+SHAPE_COLOR = "gray60"
+VIEWPORT_COLOR = "gray40"
+
+
+def summarize(lines):
+    """Returns lengths and indentations of the lines as arrays, the
+    lines are measured by C functions."""
+    lengths = list(map(len, lines))
+    indents = map(sub, lengths, map(len, map(str.lstrip, lines)))
+    return (array("H", map(min, lengths, repeat(MAX_VALUE))),
+            array("H", map(min, indents, repeat(MAX_VALUE))))
+
+
+class LineSummary:
+    """Length, indentation and marks of every line of a Document.
+
+    Marks of the lines modified since the text were saved and of the
+    lines with characters that couldn't be decoded are kept as a
+    bytearray per kind, 1 for a marked line.
+    """
+    def __init__(self, document):
+        """
+        Args:
+            document (Document): the text.
+        """
+        self.document = document
+        self.lengths = array("H")
+        self.indents = array("H")
+        self.marks = {}
+        self.rebuild()
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def rebuild(self):
+        """Summarizes the whole text again, the modified marks are
+        lost."""
+        lines = self.document.get_text().split("\n")
+        self.lengths, self.indents = summarize(lines)
+        self.marks = {MODIFIED: bytearray(len(lines)),
+                      ERROR: self._errors(lines)}
+
+    def clear_marks(self, kind):
+        self.marks[kind] = bytearray(len(self))
+
+    def on_edit(self, operation, offset, text):
+        """Listener of the DocumentSync, updates the summaries of the
+        lines the edit touched. The Document is already edited.
+        Returns:
+            tuple: (line, removed, added) meaning that the summaries
+                of removed lines from the line were replaced by added
+                ones.
+        """
+        line = self.document.line_of_offset(offset)
+        newlines = text.count("\n")
+        if operation == "insert":
+            # The line is split into newlines + 1 lines, the ones
+            # between the first and the last are in the text
+            removed, added = 1, newlines + 1
+            lines = [self._read_line(line)]
+            if newlines:
+                lines += text.split("\n")[1:-1]
+                lines.append(self._read_line(line + newlines))
+        else:
+            # The lines the deleted text spanned are joined into one
+            removed, added = newlines + 1, 1
+            lines = [self._read_line(line)]
+        end = line + removed
+        self.lengths[line:end], self.indents[line:end] = summarize(lines)
+        self.marks[MODIFIED][line:end] = b"\1" * added
+        self.marks[ERROR][line:end] = self._errors(lines)
+        return line, removed, added
+
+    def _read_line(self, line):
+        """Returns the line, or its first SCAN_LIMIT characters with
+        spaces standing for the rest, so its length stays right."""
+        document = self.document
+        start = document.line_start(line)
+        if line + 1 < document.line_count:
+            end = document.line_start(line + 1) - 1
+        else:
+            end = len(document)
+        if end - start <= SCAN_LIMIT:
+            return document.get_text(start, end)
+        return document.get_text(start, start + SCAN_LIMIT).ljust(
+            end - start)
+
+    def _errors(self, lines):
+        marks = bytearray(len(lines))
+        if any(map(contains, lines, repeat(ERROR_CHARACTER))):
+            for index, line in enumerate(lines):
+                if ERROR_CHARACTER in line:
+                    marks[index] = 1
+        return marks
+
+
+class Minimap(tk.Canvas):
+    """Overview of the whole text, drawn from a LineSummary.
+
+    Every row of the canvas shows a bin of lines: a bar from their
+    indentation to the end of the longest of them and a mark at the
+    right edge for every kind of marks found in them. The viewport of
+    the text is a rectangle over the rows, a click or a drag calls
+    on_jump with the line under the pointer.
+    """
+    def __init__(self, parent=None, document=None, on_jump=None):
+        """
+        Args:
+            parent (tk.Widget): parent of the canvas;
+            document (Document): the text;
+            on_jump (callable): called with the number of the line,
+                counted from 0, the text should be scrolled to.
+        """
+        tk.Canvas.__init__(self, parent, width=WIDTH, highlightthickness=0,
+                           background="white")
+        self.document = document
+        self.summary = LineSummary(document)
+        self.on_jump = on_jump
+        # Sorted offsets of the starts of the search hits
+        self.hits = array("q")
+        # Fractions of the text in the viewport
+        self.view = (0.0, 1.0)
+        # (length, indent, marks) drawn in every row and the canvas
+        # items of the rows, bars and marks by (row, kind)
+        self.rows = []
+        self.bars = []
+        self.mark_items = {}
+        # Number of lines and width the rows were drawn for, and the
+        # range of lines whose rows must be drawn again, None if all
+        # of them, empty if none
+        self._line_count = 0
+        self._width = 0
+        self._dirty = None
+        self._redraw_job = None
+        self.viewport = self.create_rectangle(0, 0, 0, 0,
+                                              outline=VIEWPORT_COLOR)
+
+        self.bind('<Configure>', lambda event: self.schedule_redraw())
+        self.bind('<Button-1>', self._on_click)
+        self.bind('<B1-Motion>', self._on_click)
+
+    # Changes of the text
+
+    def on_edit(self, operation, offset, text):
+        """Listener of the DocumentSync."""
+        line, removed, added = self.summary.on_edit(operation, offset, text)
+        if removed != added:
+            # The lines below moved to other rows
+            self._dirty = None
+        elif self._dirty is not None:
+            first, last = self._dirty or (line, line + added)
+            self._dirty = (min(first, line), max(last, line + added))
+        self.schedule_redraw(REDRAW_DELAY)
+
+    def reset(self):
+        """Summarizes the text again after the Document were changed
+        without the DocumentSync."""
+        self.summary.rebuild()
+        self._dirty = None
+        self.schedule_redraw()
+
+    def on_modified(self, modified):
+        """Drops the modified marks once the text is saved."""
+        if not modified:
+            self.summary.clear_marks(MODIFIED)
+            self._dirty = None
+            self.schedule_redraw()
+
+    def set_hits(self, starts):
+        """Marks the lines with the search hits.
+        Args:
+            starts (array): sorted offsets of the starts of the hits.
+        """
+        self.hits = starts
+        self._dirty = None
+        self.schedule_redraw(REDRAW_DELAY)
+
+    def set_view(self, first, last):
+        """Moves the viewport rectangle to the fractions of the text
+        shown by the widget."""
+        self.view = (float(first), float(last))
+        height = len(self.rows) * ROW_HEIGHT
+        self.coords(self.viewport, 0, self.view[0] * height,
+                    self.winfo_width() - 1,
+                    max(self.view[1] * height, self.view[0] * height + 2))
+
+    # Drawing
+
+    def schedule_redraw(self, delay=None):
+        """Redraws the rows after the delay in milliseconds, once the
+        Tk loop gets idle if None. Requests made before the redraw
+        result in one redraw."""
+        if self._redraw_job is None:
+            if delay is None:
+                self._redraw_job = self.after_idle(self.redraw)
+            else:
+                self._redraw_job = self.after(delay, self.redraw)
+
+    def cancel_redraw(self):
+        if self._redraw_job is not None:
+            self.after_cancel(self._redraw_job)
+            self._redraw_job = None
+
+    def row_count(self):
+        """Number of rows the lines are shown in."""
+        return min(len(self.summary),
+                   max(self.winfo_height() // ROW_HEIGHT, 1))
+
+    def line_range(self, row, rows):
+        """Returns (first, last) range of the lines shown in the row
+        of rows."""
+        count = len(self.summary)
+        return row * count // rows, (row + 1) * count // rows
+
+    def redraw(self):
+        self._redraw_job = None
+        summary = self.summary
+        if len(summary) != self.document.line_count:
+            # The Document were edited without the DocumentSync
+            summary.rebuild()
+            self._dirty = None
+        rows = self.row_count()
+        if self.winfo_width() != self._width:
+            # Every row is drawn again in the new width
+            self._width = self.winfo_width()
+            self.rows = []
+            self._dirty = None
+        if rows != len(self.rows) or len(summary) != self._line_count:
+            self._dirty = None
+        if self._dirty is None:
+            changed = range(rows)
+        elif self._dirty:
+            # A line can be in the row after the one its number
+            # points to, rounding down
+            first, last = self._dirty
+            count = len(summary)
+            changed = range(first * rows // count,
+                            min(last * rows // count + 2, rows))
+        else:
+            changed = ()
+        self._dirty = ()
+        self._line_count = len(summary)
+
+        del self.rows[rows:]
+        self.rows.extend(None for _ in range(rows - len(self.rows)))
+        for row in changed:
+            values = self._summarize_row(row, rows)
+            if values != self.rows[row]:
+                self.rows[row] = values
+                self._draw_row(row, values)
+        for row in range(rows, len(self.bars)):
+            self.itemconfig(self.bars[row], state=HIDDEN)
+        for (row, kind), item in self.mark_items.items():
+            if row >= rows:
+                self.itemconfig(item, state=HIDDEN)
+        self.tag_raise(self.viewport)
+        self.set_view(*self.view)
+
+    def _summarize_row(self, row, rows):
+        """Returns (length, indent, marks) of the lines of the row,
+        marks being a tuple of the kinds found in them."""
+        summary = self.summary
+        first, last = self.line_range(row, rows)
+        step = max((last - first) // SAMPLES, 1)
+        length = max(summary.lengths[first:last:step])
+        indent = min(summary.indents[first:last:step])
+        marks = []
+        if self.hits:
+            start = self.document.line_start(first)
+            end = (self.document.line_start(last) if last < len(summary)
+                   else len(self.document) + 1)
+            if bisect_left(self.hits, start) < bisect_left(self.hits, end):
+                marks.append(HIT)
+        for kind in (MODIFIED, ERROR):
+            if summary.marks[kind].find(1, first, last) != -1:
+                marks.append(kind)
+        return length, min(indent, length), tuple(marks)
+
+    def _draw_row(self, row, values):
+        length, indent, marks = values
+        width = self.winfo_width() - MARK_WIDTH * len(MARK_COLORS)
+        scale = max(width, 1) / COLUMNS
+        y = row * ROW_HEIGHT
+        coords = (min(indent, COLUMNS) * scale, y,
+                  max(min(length, COLUMNS) * scale, 1), y + ROW_HEIGHT - 1)
+        if row < len(self.bars):
+            self.coords(self.bars[row], *coords)
+            self.itemconfig(self.bars[row],
+                            state=NORMAL if length else HIDDEN)
+        else:
+            self.bars.append(self.create_rectangle(
+                *coords, fill=SHAPE_COLOR, outline="",
+                state=NORMAL if length else HIDDEN))
+        for index, kind in enumerate(MARK_COLORS):
+            item = self.mark_items.get((row, kind))
+            if kind not in marks:
+                if item is not None:
+                    self.itemconfig(item, state=HIDDEN)
+                continue
+            right = self.winfo_width() - index * MARK_WIDTH
+            coords = (right - MARK_WIDTH + 1, y, right, y + ROW_HEIGHT)
+            if item is None:
+                self.mark_items[row, kind] = self.create_rectangle(
+                    *coords, fill=MARK_COLORS[kind], outline="")
+            else:
+                self.coords(item, *coords)
+                self.itemconfig(item, state=NORMAL)
+
+    def _on_click(self, event):
+        if not self.rows or self.on_jump is None:
+            return
+        row = min(max(event.y // ROW_HEIGHT, 0), len(self.rows) - 1)
+        self.on_jump(self.line_range(row, len(self.rows))[0])
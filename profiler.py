@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""This module measures where the Tk event loop spends its time.
+
+The Profiler is off unless it is installed. Installed, it wraps every
+python callback registered with Tk, the after and after_idle jobs and
+the commands of the menus, and records how long each of them ran into
+a latency histogram per handler. A heartbeat job measures the lag of
+the event loop, i.e. how late a job runs after its time. The last
+TRACE_EVENTS calls are kept and can be dumped as a Chrome trace, which
+chrome://tracing and Perfetto open.
+"""
+
+import functools
+import json
+import os
+import time
+import tkinter as tk
+from collections import deque
+
+# Environment variable that turns the profiler on.
+PROFILE_VARIABLE = "TEXT_EDITOR_PROFILE"
+# Number of the last calls kept for the trace.
+TRACE_EVENTS = 100000
+# Interval of the heartbeat that measures the lag, in milliseconds.
+LAG_INTERVAL = 50
+# Interval of the updates of the overlay, in milliseconds.
+OVERLAY_INTERVAL = 500
+# Label of the lag of the event loop in the histograms.
+LAG_LABEL = "event loop lag"
+
+# Categories of the calls
+TK = "tk"
+AFTER = "after"
+IDLE = "idle"
+MENU = "menu"
+
+
+def profiling_requested():
+    """Checks if the profiler is turned on by the environment."""
+    return os.environ.get(PROFILE_VARIABLE, "") not in ("", "0")
+
+
+def describe(function):
+    """Returns a readable name of the callback, lambdas are named by
+    where they are defined."""
+    function = getattr(function, "__func__", function)
+    name = getattr(function, "__qualname__", None) or repr(function)
+    code = getattr(function, "__code__", None)
+    if "<lambda>" in name and code is not None:
+        name = "{} ({}:{})".format(name, os.path.basename(
+            code.co_filename), code.co_firstlineno)
+    return name
+
+
+class Histogram:
+    """Latencies of one handler in buckets of powers of two
+    microseconds, bucket k holds latencies below 2 ** k us."""
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * 40
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        bucket = min(int(seconds * 1000000).bit_length(),
+                     len(self.buckets) - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Upper bound of the latency the fraction of the calls were
+        below, in seconds."""
+        wanted = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return min((1 << bucket) / 1000000, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "total_ms": self.total * 1000,
+                "mean_ms": self.total / self.count * 1000 if self.count
+                           else 0,
+                "p50_ms": self.percentile(0.5) * 1000,
+                "p99_ms": self.percentile(0.99) * 1000,
+                "max_ms": self.max * 1000,
+                "buckets_us": {str(1 << bucket): count for bucket, count
+                               in enumerate(self.buckets) if count}}
+
+
+class Profiler:
+    """Records latencies of the callbacks of the Tk event loop.
+
+    Patches tkinter.Misc, so it sees the callbacks of every widget,
+    and only one Profiler should be installed at a time.
+    """
+    def __init__(self, trace_events=TRACE_EVENTS):
+        self.histograms = {}
+        self.events = deque(maxlen=trace_events)
+        self.started = time.perf_counter()
+        self.widget = None
+        self.on_overlay = None
+        # The slowest call since the last update of the overlay
+        self._slowest = None
+        self._expected = None
+        self._patched = []
+        self._original_after = tk.Misc.after
+        self._original_register = tk.Misc._register
+
+    def install(self, widget, on_overlay=None):
+        """Starts profiling.
+        Args:
+            widget (tk.Widget): widget the heartbeat and the overlay
+                jobs run on;
+            on_overlay (callable): called with a short summary of the
+                latencies every OVERLAY_INTERVAL.
+        """
+        self.widget = widget
+        self.on_overlay = on_overlay
+        profiler = self
+        original_after = self._original_after
+        original_register = self._original_register
+
+        def after(misc, ms, func=None, *args):
+            if func is not None:
+                func = profiler.wrap(func, IDLE if ms == "idle" else AFTER)
+            return original_after(misc, ms, func, *args)
+
+        def register(misc, func, subst=None, needcleanup=1):
+            # Jobs of after are wrapped by after already
+            if not getattr(func, "__qualname__", "").startswith("Misc.after"):
+                func = profiler.wrap(func, TK)
+            return original_register(misc, func, subst, needcleanup)
+
+        tk.Misc.after = after
+        # register is an alias of _register, bound when Misc were made
+        tk.Misc._register = tk.Misc.register = register
+        self._expected = time.perf_counter() + LAG_INTERVAL / 1000
+        original_after(widget, LAG_INTERVAL, self._beat)
+        original_after(widget, OVERLAY_INTERVAL, self._update_overlay)
+
+    def uninstall(self):
+        """Stops profiling and restores everything that were patched.
+        The jobs of the heartbeat and the overlay stop on their next
+        run."""
+        tk.Misc.after = self._original_after
+        tk.Misc._register = tk.Misc.register = self._original_register
+        for owner, name, value in self._patched:
+            setattr(owner, name, value)
+        self._patched = []
+        self.widget = None
+
+    def instrument(self, *classes):
+        """Wraps the public functions of the classes, like the
+        MenuMethods ones, so their calls are recorded as MENU calls."""
+        for owner in classes:
+            for name, value in list(vars(owner).items()):
+                if name.startswith("_") or not callable(value):
+                    continue
+                self._patched.append((owner, name, value))
+                setattr(owner, name, self.wrap(
+                    value, MENU, "{}.{}".format(owner.__name__, name)))
+
+    def wrap(self, function, category, label=None):
+        """Returns the function that records its calls."""
+        label = label or describe(function)
+        record = self.record
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(label, category, started,
+                       time.perf_counter() - started)
+        return timed
+
+    def record(self, label, category, started, duration):
+        histogram = self.histograms.get(label)
+        if histogram is None:
+            histogram = self.histograms[label] = Histogram()
+        histogram.add(duration)
+        self.events.append((label, category, started, duration))
+        if category != MENU and (self._slowest is None
+                                 or duration > self._slowest[1]):
+            self._slowest = (label, duration)
+
+    def overlay(self):
+        """Returns a short summary for the statusbar."""
+        lag = self.histograms.get(LAG_LABEL)
+        text = "lag p99 {:.0f} ms".format(
+            lag.percentile(0.99) * 1000 if lag else 0)
+        if self._slowest is not None:
+            label, duration = self._slowest
+            text += ", slowest {} {:.0f} ms".format(
+                label.split(" (")[0][-40:], duration * 1000)
+        return text
+
+    def summary(self):
+        """Returns the histograms as a dict, the slowest handlers
+        first."""
+        return {label: histogram.to_dict() for label, histogram in sorted(
+            self.histograms.items(), key=lambda item: -item[1].max)}
+
+    def dump(self, path=None):
+        """Writes the trace and the histograms in the Chrome trace
+        format.
+        Args:
+            path (str): path to the file, a new file in the home
+                directory if None.
+        Returns:
+            str: path to the written file.
+        Raises:
+            OSError: if the file can't be written.
+        """
+        if path is None:
+            path = os.path.join(os.path.expanduser("~"),
+                                "text_editor_profile_{}_{}.json".format(
+                                    os.getpid(), time.strftime("%Y%m%d%H%M%S")))
+        pid = os.getpid()
+        trace = [{"name": label, "cat": category, "ph": "X",
+                  "ts": (started - self.started) * 1000000,
+                  "dur": duration * 1000000, "pid": pid, "tid": 1}
+                 for label, category, started, duration in self.events]
+        with open(path, 'w') as work_file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms",
+                       "histograms": self.summary()}, work_file)
+        return path
+
+    def _beat(self):
+        if self.widget is None:
+            return
+        now = time.perf_counter()
+        lag = max(now - self._expected, 0.0)
+        self.histograms.setdefault(LAG_LABEL, Histogram()).add(lag)
+        self._expected = now + LAG_INTERVAL / 1000
+        self._original_after(self.widget, LAG_INTERVAL, self._beat)
+
+    def _update_overlay(self):
+        if self.widget is None:
+            return
+        if self.on_overlay is not None:
+            self.on_overlay(self.overlay())
+        self._slowest = None
+        self._original_after(self.widget, OVERLAY_INTERVAL,
+                             self._update_overlay)
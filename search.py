@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""This module finds matches of a query in text.
+
+Matching is done over a snapshot of a Document in windows of bounded
+size, so a search running in a background thread never holds the GIL
+for long and never copies the whole text at once.
+"""
+
+import mmap
+import os
+import queue
+import re
+import threading
+from array import array
+
+# Search modes
+LITERAL = "literal"
+IGNORE_CASE = "ignore case"
+REGEX = "regex"
+REGEX_IGNORE_CASE = "regex ignore case"
+
+# Number of characters searched at once.
+WINDOW_SIZE = 1024 * 1024
+# Characters added to a window so that matches crossing its end are
+# still found, and characters of the previous window kept at its start
+# so that anchors and lookbehinds see the text before the window.
+# Longer matches that cross the end of a window are cut.
+WINDOW_OVERLAP = 64 * 1024
+# Number of matches the worker collects before handing them over.
+BATCH_SIZE = 4096
+# Replacements closer to each other than this number of characters
+# are applied to the text as one edit.
+MERGE_GAP = 64 * 1024
+
+# Directories skipped by the search in files.
+IGNORED_DIRECTORIES = frozenset([
+    ".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv",
+    "venv", ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".ruff_cache",
+])
+# Files with a zero byte among their first BINARY_SAMPLE bytes are
+# considered binary and skipped.
+BINARY_SAMPLE = 8 * 1024
+# Files bigger than this number of bytes are memory-mapped instead of
+# being read.
+MMAP_SIZE = 16 * 1024 * 1024
+# Number of files searched by one task of the process pool.
+FILES_PER_TASK = 64
+# Matches reported per file, the rest of them are skipped.
+MAX_FILE_MATCHES = 1000
+# Number of characters of a matched line kept for the results.
+MAX_LINE_LENGTH = 200
+
+
+def query_mode(regex, match_case):
+    """Returns the search mode of the options of a search.
+    Args:
+        regex (bool): True if the query is a regular expression;
+        match_case (bool): True if the case of the letters matters.
+    Returns:
+        (str): LITERAL, IGNORE_CASE, REGEX or REGEX_IGNORE_CASE.
+    """
+    if regex:
+        return REGEX if match_case else REGEX_IGNORE_CASE
+    return LITERAL if match_case else IGNORE_CASE
+
+
+def compile_query(query, mode=LITERAL):
+    """Compiles the query into a regular expression.
+    Args:
+        query (str): text or pattern to look for;
+        mode (str): LITERAL, IGNORE_CASE, REGEX or REGEX_IGNORE_CASE.
+    Returns:
+        (re.Pattern): compiled pattern.
+    Raises:
+        re.error: if the query is not a valid regular expression in
+            the regex modes.
+    """
+    flags = re.MULTILINE
+    if mode in (IGNORE_CASE, REGEX_IGNORE_CASE):
+        flags |= re.IGNORECASE
+    if mode in (REGEX, REGEX_IGNORE_CASE):
+        return re.compile(query, flags)
+    return re.compile(re.escape(query), flags)
+
+
+def iter_windows(snapshot, size=WINDOW_SIZE, overlap=WINDOW_OVERLAP):
+    """Joins slices of a Document snapshot into windows of text.
+    Args:
+        snapshot (list): (str, start, end) slices as returned by
+            Document.snapshot;
+        size (int): number of characters every window owns;
+        overlap (int): number of characters of the previous window
+            added to the start of every window, and of the next
+            window added to its end.
+    Yields:
+        (int, str, int, int): offset of the window, its text, and the
+            range of the characters in it that belong to it and not
+            to the previous or the next window.
+    """
+    slices = iter(snapshot)
+    pending = []
+    pending_length = 0
+    offset = 0
+    first = 0
+    exhausted = False
+    while True:
+        # A window that doesn't end the text has more characters than
+        # it owns, so a match can't end at its end by mistake
+        while not exhausted and pending_length <= first + size + overlap:
+            try:
+                text, start, end = next(slices)
+            except StopIteration:
+                exhausted = True
+                break
+            pending.append(text[start:end])
+            pending_length += end - start
+        window = "".join(pending)
+        own = min(first + size, len(window)) if not exhausted else len(window)
+        yield offset, window, first, own
+        if own == len(window):
+            return
+        # The next window starts with the end of this one
+        kept = max(own - overlap, 0)
+        rest = window[kept:]
+        pending = [rest]
+        pending_length = len(rest)
+        offset += kept
+        first = own - kept
+
+
+def iter_matches(pattern, snapshot, cancelled=None, start=0):
+    """Finds matches of the pattern in a Document snapshot.
+
+    Every window is searched from the start of the characters it owns,
+    the characters before them are in the window too, so ^, \\b and
+    lookbehinds match like in the whole text.
+    Args:
+        pattern (re.Pattern): compiled query;
+        snapshot (list): (str, start, end) slices of the text;
+        cancelled (threading.Event): stops the search when set;
+        start (int): offset in the snapshot the search starts at, the
+            text before it is only looked at by the pattern.
+    Yields:
+        (int, re.Match): offset of the string of the match in the
+            snapshot and the match, in the order they appear in the
+            text.
+    """
+    # Matches starting before this offset are already found
+    resume = start
+    for offset, window, first, own in iter_windows(snapshot):
+        if cancelled is not None and cancelled.is_set():
+            return
+        # finditer treats empty matches the way re.sub does
+        for match in pattern.finditer(window, max(resume - offset, first)):
+            if match.start() >= own and own < len(window):
+                break
+            yield offset, match
+            resume = offset + match.end()
+        resume = max(resume, offset + own)
+
+
+def find_all(pattern, snapshot, cancelled=None):
+    """Finds matches of the pattern in a Document snapshot.
+    Args:
+        pattern (re.Pattern): compiled query;
+        snapshot (list): (str, start, end) slices of the text;
+        cancelled (threading.Event): stops the search when set.
+    Yields:
+        (array, array): offsets of starts and ends of a batch of
+            matches, in the order they appear in the text.
+    """
+    starts = array("q")
+    ends = array("q")
+    for offset, match in iter_matches(pattern, snapshot, cancelled):
+        starts.append(offset + match.start())
+        ends.append(offset + match.end())
+        if len(starts) >= BATCH_SIZE:
+            yield starts, ends
+            starts = array("q")
+            ends = array("q")
+    if starts:
+        yield starts, ends
+
+
+def find_next(pattern, document, offset=0):
+    """Finds the first match that starts at offset or after it, the
+    search wraps around the end of the document.
+    Returns:
+        (tuple or None): (start, end, re.Match) of the match.
+    """
+    for start in (offset, 0):
+        # The text before the start is seen by anchors and lookbehinds
+        base = max(start - WINDOW_OVERLAP, 0)
+        snapshot = document.snapshot(base)
+        for window_offset, match in iter_matches(pattern, snapshot,
+                                                 start=start - base):
+            return (base + window_offset + match.start(),
+                    base + window_offset + match.end(), match)
+    return None
+
+
+def plan_replacements(pattern, snapshot, replacement, expand=False):
+    """Computes replacements of all matches in one pass.
+    Args:
+        pattern (re.Pattern): compiled query;
+        snapshot (list): (str, start, end) slices of the text;
+        replacement (str): text that replaces every match;
+        expand (bool): replacement is a template with backreferences
+            like the repl argument of re.sub.
+    Returns:
+        (list): (start, end, text) edits in the order of the text.
+    """
+    edits = []
+    for offset, match in iter_matches(pattern, snapshot):
+        text = match.expand(replacement) if expand else replacement
+        edits.append((offset + match.start(), offset + match.end(), text))
+    return edits
+
+
+def merge_edits(edits, document, gap=MERGE_GAP):
+    """Merges edits that are close to each other, so thousands of
+    small edits can be applied as a few big ones.
+    Args:
+        edits (list): (start, end, text) edits in the order of the
+            text, as returned by plan_replacements;
+        document (Document): text the edits are made to;
+        gap (int): edits with fewer unchanged characters between them
+            are merged.
+    Returns:
+        (list): merged (start, end, text) edits in the order of the
+            text.
+    """
+    merged = []
+    parts = []
+    first = last = None
+    for start, end, text in edits:
+        if first is not None and start - last > gap:
+            merged.append((first, last, "".join(parts)))
+            parts = []
+            first = None
+        if first is None:
+            first = start
+        else:
+            parts.append(document.get_text(last, start))
+        parts.append(text)
+        last = end
+    if first is not None:
+        merged.append((first, last, "".join(parts)))
+    return merged
+
+
+def compile_bytes_query(query, mode=LITERAL):
+    """Compiles the query into a regular expression that matches
+    UTF-8 encoded bytes. Case is ignored only for ASCII letters.
+    Raises:
+        re.error: if the query is not a valid regular expression in
+            the regex modes.
+    """
+    flags = re.MULTILINE
+    query = query.encode("utf-8")
+    if mode in (IGNORE_CASE, REGEX_IGNORE_CASE):
+        flags |= re.IGNORECASE
+    if mode in (REGEX, REGEX_IGNORE_CASE):
+        return re.compile(query, flags)
+    return re.compile(re.escape(query), flags)
+
+
+def iter_files(root, ignored=IGNORED_DIRECTORIES):
+    """Yields paths of all files in the directory tree, except the
+    ones in ignored directories. Symlinks to directories are not
+    followed."""
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in ignored:
+                        directories.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path
+            except OSError:
+                continue
+
+
+def search_file(path, pattern):
+    """Finds matches of a bytes pattern in a file.
+    Returns:
+        (list): (path, line, text) of matched lines, line is counted
+            from 1. Binary and unreadable files have no matches.
+    """
+    try:
+        with open(path, 'rb') as work_file:
+            if work_file.read(BINARY_SAMPLE).find(b"\0") != -1:
+                return []
+            size = os.fstat(work_file.fileno()).st_size
+            if size == 0:
+                return []
+            if size > MMAP_SIZE:
+                data = mmap.mmap(work_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+            else:
+                work_file.seek(0)
+                data = work_file.read()
+    except (OSError, ValueError):
+        return []
+
+    results = []
+    line = 1
+    counted = 0
+    last_line = None
+    for match in pattern.finditer(data):
+        start = match.start()
+        # Newlines are counted between matches only
+        line += data[counted:start].count(b"\n")
+        counted = start
+        if line == last_line:
+            continue
+        last_line = line
+        line_start = data.rfind(b"\n", 0, start) + 1
+        line_end = data.find(b"\n", start)
+        if line_end == -1:
+            line_end = len(data)
+        line_end = min(line_end, line_start + MAX_LINE_LENGTH)
+        text = data[line_start:line_end].decode("utf-8", "replace")
+        results.append((path, line, text.rstrip("\r")))
+        if len(results) >= MAX_FILE_MATCHES:
+            break
+    if isinstance(data, mmap.mmap):
+        data.close()
+    return results
+
+
+def search_files(paths, pattern):
+    """Task of the process pool, searches a batch of files."""
+    results = []
+    for path in paths:
+        results.extend(search_file(path, pattern))
+    return results
+
+
+class FileSearch:
+    """Searches a directory tree with a pool of processes.
+
+    A walker thread lists the files and hands them to the pool in
+    batches, results of every batch are put into a queue as soon as
+    it is searched. The Tk side takes them out with poll(), which
+    never blocks. If the pool fails, e.g. a worker process dies, the
+    search stops and error holds the exception.
+    """
+    def __init__(self, root, pattern, workers=None):
+        """
+        Args:
+            root (str): directory to search;
+            pattern (re.Pattern): bytes pattern, see
+                compile_bytes_query;
+            workers (int): number of processes, defaults to the
+                number of CPUs.
+        """
+        self.root = root
+        self.pattern = pattern
+        self.workers = workers or os.cpu_count() or 1
+        self.finished = False
+        self.files = 0
+        self.error = None
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        # Limits the number of batches waiting for the pool, so the
+        # walker doesn't list the whole tree ahead of the search
+        self._slots = threading.Semaphore(self.workers * 2)
+        self._executor = None
+        self._thread = threading.Thread(target=self._walk, daemon=True)
+
+    def start(self):
+        # The process pool is imported on the first search in files,
+        # importing it takes longer than the rest of the editor's
+        # start
+        import concurrent.futures # pylint: disable=import-outside-toplevel
+        import multiprocessing # pylint: disable=import-outside-toplevel
+        # Processes are spawned, forking a process with Tk running in
+        # it is not safe
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"))
+        self._thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def poll(self):
+        """Returns list of (path, line, text) results found since the
+        last call. finished is True once the last ones are returned."""
+        results = []
+        while True:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                return results
+            if batch is None:
+                self.finished = True
+                return results
+            results.extend(batch)
+
+    def _walk(self):
+        batch = []
+        try:
+            for path in iter_files(self.root):
+                if self._cancelled.is_set() or self.error is not None:
+                    return
+                batch.append(path)
+                if len(batch) >= FILES_PER_TASK:
+                    self._submit(batch)
+                    batch = []
+            if batch:
+                self._submit(batch)
+            # Every batch holds a slot until its results are collected
+            for _ in range(self.workers * 2):
+                self._slots.acquire()
+        finally:
+            self._queue.put(None)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+
+    def _submit(self, paths):
+        self.files += len(paths)
+        self._slots.acquire()
+        if self._cancelled.is_set():
+            self._slots.release()
+            return
+        try:
+            future = self._executor.submit(search_files, paths, self.pattern)
+        except RuntimeError as error:
+            # The pool is shut down by cancel, or broken
+            self._slots.release()
+            if not self._cancelled.is_set():
+                self._fail(error)
+            return
+        future.add_done_callback(self._collect)
+
+    def _collect(self, future):
+        try:
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                if not self._cancelled.is_set():
+                    self._fail(future.exception())
+                return
+            results = future.result()
+            if results:
+                self._queue.put(results)
+        finally:
+            self._slots.release()
+
+    def _fail(self, error):
+        """Keeps the first error of the pool, the search is stopped
+        after it."""
+        if self.error is None:
+            self.error = error
+
+
+class SearchWorker:
+    """Runs find_all in a background thread.
+
+    Batches of matches are put into a queue, the Tk side takes them
+    out with poll(), which never blocks.
+    """
+    def __init__(self, pattern, snapshot):
+        self.pattern = pattern
+        self.snapshot = snapshot
+        self.finished = False
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._search, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def poll(self):
+        """Returns list of (starts, ends) batches found since the last
+        call. finished is True once the last batch is returned."""
+        batches = []
+        while True:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                return batches
+            if batch is None:
+                self.finished = True
+                return batches
+            batches.append(batch)
+
+    def _search(self):
+        for batch in find_all(self.pattern, self.snapshot, self._cancelled):
+            self._queue.put(batch)
+        self._queue.put(None)
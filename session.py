@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""This module keeps the state of the editor's tabs.
+
+The session file remembers which files were open, so they can be
+restored the next time the editor starts. Texts of modified tabs that
+are hibernated are spilled into temporary files, so only the tabs in
+use keep their text in memory.
+"""
+
+import json
+import os
+
+# File the open tabs are remembered in between the runs.
+SESSION_FILE = os.path.join(os.path.expanduser("~"),
+                            ".text_editor_session.json")
+# Number of tabs that keep their text in memory. Least recently used
+# tabs above it are hibernated.
+LIVE_TABS = 8
+# Spilled texts are written with this encoding, it can hold any text
+# of the widget, lone surrogates included.
+ENCODING = "utf-8"
+ENCODING_ERRORS = "surrogatepass"
+
+
+def load_session(path=SESSION_FILE):
+    """Reads the session file.
+    Args:
+        path (str): path to the session file.
+    Returns:
+        tuple: (files, current) where files is a list of paths of
+            the open files and current is the index of the selected
+            one. ([], 0) if there is no valid session file.
+    """
+    try:
+        with open(path, 'r', encoding=ENCODING) as work_file:
+            session = json.load(work_file)
+        files = [file for file in session["files"] if isinstance(file, str)]
+        current = int(session.get("current", 0))
+    except (OSError, ValueError, KeyError, TypeError):
+        return [], 0
+    return files, max(0, min(current, len(files) - 1))
+
+
+def save_session(files, current, path=SESSION_FILE):
+    """Writes the session file, replacing it only when it is
+    written completely.
+    Args:
+        files (list): paths of the open files;
+        current (int): index of the selected file;
+        path (str): path to the session file.
+    Returns:
+        None
+    Raises:
+        OSError: if the file can't be written.
+    """
+    import tempfile # pylint: disable=import-outside-toplevel
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_file = tempfile.mkstemp(
+        prefix=".session.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(descriptor, 'w', encoding=ENCODING) as work_file:
+            json.dump({"files": files, "current": current}, work_file,
+                      indent=1)
+        os.replace(temp_file, path)
+    except OSError:
+        os.remove(temp_file)
+        raise
+
+
+def spill(chunks):
+    """Writes a text into a new temporary file.
+    Args:
+        chunks (iterable): strings the text consists of, like the
+            ones of Document.iter_chunks.
+    Returns:
+        str: path to the file.
+    Raises:
+        OSError: if the file can't be written.
+    """
+    import tempfile # pylint: disable=import-outside-toplevel
+    descriptor, path = tempfile.mkstemp(prefix="text_editor.",
+                                        suffix=".spill")
+    try:
+        # No newline translation, the text is read back unchanged
+        with os.fdopen(descriptor, 'w', encoding=ENCODING,
+                       errors=ENCODING_ERRORS, newline="") as work_file:
+            for chunk in chunks:
+                work_file.write(chunk)
+    except OSError:
+        os.remove(path)
+        raise
+    return path
+
+
+def read_spill(path):
+    """Returns the text written by spill."""
+    with open(path, 'r', encoding=ENCODING, errors=ENCODING_ERRORS,
+              newline="") as work_file:
+        return work_file.read()
+
+
+def remove_spill(path):
+    """Removes the file written by spill, if it still exists."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""The modules of the editor are imported from the directory above."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
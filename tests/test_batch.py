@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Tests of the batch mode."""
+
+import re
+import batch
+import search
+
+
+def test_replace_in_file_longer_than_window(tmp_path):
+    text = "x = 1\nxy = 2\n" * (search.WINDOW_SIZE // 7)
+    path = tmp_path / "file.txt"
+    path.write_bytes(text.encode("utf-8"))
+    pattern = search.compile_query(r"^x", search.REGEX)
+    job = batch.Job(pattern, "# x", False, None, None, None, False,
+                    search.MAX_FILE_MATCHES)
+    result = batch.process_file(str(path), job)
+    assert result["matches"] == text.count("\n")
+    assert path.read_bytes().decode("utf-8") == re.sub(
+        r"(?m)^x", "# x", text)
+
+
+def test_find_reports_lines(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"one\ntwo two\nthree\n")
+    job = batch.Job(search.compile_query("TWO", search.IGNORE_CASE), None,
+                    False, None, None, None, False, 1)
+    result = batch.process_file(str(path), job)
+    assert result["matches"] == 2
+    assert result["lines"] == [(2, 1, "two two")]
+    assert "changed" in result and not result["changed"]
+
+
+def test_regex_follows_match_case():
+    parser = batch.make_parser()
+    for argv, flags in ((["--find", "a+", "--regex", "."], re.IGNORECASE),
+                        (["--find", "a+", "--regex", "--match-case", "."], 0)):
+        job = batch.make_job(parser.parse_args(argv), parser)
+        assert job.pattern.flags & re.IGNORECASE == flags
+
+
+def test_mixed_newlines_are_reported_when_written(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"foo\r\nbar\nfoo\r\n")
+    find = batch.Job(search.compile_query("foo"), None, False, None, None,
+                     None, False, 10)
+    result = batch.process_file(str(path), find)
+    assert not result["changed"] and "new_format" not in result
+    assert path.read_bytes() == b"foo\r\nbar\nfoo\r\n"
+
+    result = batch.process_file(str(path), find._replace(replacement="baz"))
+    assert batch.format_result(result) == [
+        "{}: 2 replaced, UTF-8 CRLF mixed -> UTF-8 CRLF".format(path)]
+    assert path.read_bytes() == b"baz\r\nbar\r\nbaz\r\n"
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Tests of the line diff."""
+
+import random
+import pytest
+import diff
+
+
+def apply_hunks(old, new, hunks):
+    lines = []
+    line = 0
+    for old_start, old_end, new_start, new_end in hunks:
+        assert old_start >= line
+        lines += old[line:old_start] + new[new_start:new_end]
+        line = old_end
+    return lines + old[line:]
+
+
+def apply_edits(text, edits):
+    for start, end, replacement in edits:
+        text = text[:start] + replacement + text[end:]
+    return text
+
+
+def random_pair(generator, alphabet="abcdefg"):
+    old = [generator.choice(alphabet) for _ in range(generator.randrange(40))]
+    new = list(old)
+    for _ in range(generator.randrange(8)):
+        line = generator.randrange(len(new) + 1)
+        if generator.randrange(2) or not new:
+            new.insert(line, generator.choice(alphabet + "xyz"))
+        else:
+            del new[min(line, len(new) - 1)]
+    return old, new
+
+
+@pytest.mark.parametrize("patience", [False, True])
+def test_round_trip(patience):
+    generator = random.Random(0)
+    for _ in range(2000):
+        old, new = random_pair(generator)
+        hunks = diff.diff_lines(old, new, patience=patience)
+        assert apply_hunks(old, new, hunks) == new
+        assert apply_edits("\n".join(old), diff.text_edits(old, new, hunks)) \
+            == "\n".join(new)
+
+
+def test_myers_finds_fewest_changes():
+    assert diff.diff_lines(list("abcabba"), list("cbabac")) == [
+        (0, 2, 0, 0), (3, 3, 1, 2), (5, 6, 4, 4), (7, 7, 5, 6)]
+
+
+def test_gives_up_after_max_cost():
+    old = ["a", "b", "c", "d", "e"]
+    new = ["a", "x", "y", "z", "e"]
+    assert diff.diff_lines(old, new, max_cost=2) == [(1, 4, 1, 4)]
+
+
+def test_big_text_with_scattered_edits():
+    generator = random.Random(1)
+    old = ["line {}".format(line) for line in range(20000)]
+    new = list(old)
+    for _ in range(30):
+        line = generator.randrange(len(new))
+        new[line:line + 1] = ["changed {}".format(line), "inserted"]
+    for patience in (False, True):
+        hunks = diff.diff_lines(old, new, patience=patience)
+        assert apply_hunks(old, new, hunks) == new
+        assert len(hunks) <= 30
+
+
+class Line(str):
+    """Line whose hash collides with the hashes of all other lines."""
+    def __hash__(self):
+        return 1
+
+    __eq__ = str.__eq__
+
+
+@pytest.mark.parametrize("patience", [False, True])
+def test_hash_collisions(patience):
+    generator = random.Random(2)
+    for _ in range(200):
+        old, new = random_pair(generator)
+        old = [Line(line) for line in old]
+        new = [Line(line) for line in new]
+        hunks = diff.diff_lines(old, new, patience=patience)
+        assert apply_hunks(old, new, hunks) == new
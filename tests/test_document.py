@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Tests of the piece table Document."""
+
+import random
+import pytest
+import document as document_module
+from document import Document
+
+
+def check(document, text):
+    """Compares every query of the document with the plain text."""
+    assert len(document) == len(text)
+    assert document.get_text() == text
+    lines = text.split("\n")
+    assert document.line_count == len(lines)
+    assert document.byte_size == len(text.encode("utf-8", "surrogatepass"))
+    offset = 0
+    for number, line in enumerate(lines):
+        assert document.line_start(number) == offset
+        assert document.get_line(number) == line
+        offset += len(line) + 1
+    for offset in range(len(text) + 1):
+        line = text.count("\n", 0, offset)
+        column = offset - (text.rfind("\n", 0, offset) + 1)
+        assert document.line_of_offset(offset) == line
+        assert document.offset_to_position(offset) == (line, column)
+        assert document.position_to_offset(line, column) == offset
+        byte = len(text[:offset].encode("utf-8", "surrogatepass"))
+        assert document.offset_to_byte(offset) == byte
+        assert document.byte_to_offset(byte) == offset
+
+
+def test_random_edits():
+    generator = random.Random(0)
+    alphabet = "ab\né€\U0001f600"
+    document = Document("start\ntext")
+    text = "start\ntext"
+    for step in range(300):
+        if step % 100 == 0:
+            check(document, text)
+        if generator.randrange(3) or not text:
+            offset = generator.randrange(len(text) + 1)
+            inserted = "".join(generator.choice(alphabet)
+                               for _ in range(generator.randrange(1, 8)))
+            document.insert(offset, inserted)
+            text = text[:offset] + inserted + text[offset:]
+        else:
+            offset = generator.randrange(len(text))
+            length = generator.randrange(1, min(6, len(text) - offset) + 1)
+            document.delete(offset, length)
+            text = text[:offset] + text[offset + length:]
+        start = generator.randrange(len(text) + 1)
+        end = generator.randrange(start, len(text) + 1)
+        assert document.get_text(start, end) == text[start:end]
+        assert "".join(document.iter_chunks(start, end)) == text[start:end]
+    check(document, text)
+
+
+def test_empty_document():
+    document = Document()
+    check(document, "")
+    document.insert(0, "a\nb")
+    document.clear()
+    check(document, "")
+
+
+def test_snapshot_survives_edits():
+    document = Document("one\ntwo\nthree")
+    snapshot = document.snapshot(2, 10)
+    document.delete(0, 5)
+    document.insert(3, "inserted")
+    assert "".join(text[start:end] for text, start, end in snapshot) == \
+        "one\ntwo\nthree"[2:10]
+
+
+def test_byte_offset_inside_character():
+    document = Document("a€b")
+    # The euro sign takes bytes 1 to 3
+    assert [document.byte_to_offset(byte) for byte in range(6)] == \
+        [0, 1, 1, 1, 2, 3]
+
+
+@pytest.mark.parametrize("step", [1, 3, 16])
+def test_byte_steps_of_long_lines(monkeypatch, step):
+    monkeypatch.setattr(document_module, "BYTE_STEP", step)
+    monkeypatch.setattr(document_module, "ADD_BUFFER_SIZE", 40)
+    generator = random.Random(step)
+    # A buffer that turns non-ASCII after some ASCII text
+    text = "ascii line\n" + "x" * 20
+    document = Document(text)
+    document.insert(len(text), "é")
+    text += "é"
+    for _ in range(100):
+        offset = generator.randrange(len(text) + 1)
+        inserted = "".join(generator.choice("ab€\U0001f600\udc80")
+                           for _ in range(generator.randrange(1, 30)))
+        document.insert(offset, inserted)
+        text = text[:offset] + inserted + text[offset:]
+    check(document, text)
+
+
+def test_conversions_encode_one_step(monkeypatch):
+    monkeypatch.setattr(document_module, "BYTE_STEP", 8)
+    document = Document("€" * 1000)
+    encoded = []
+    def encoded_length(text):
+        encoded.append(len(text))
+        return len(text.encode("utf-8", "surrogatepass"))
+    monkeypatch.setattr(document_module, "_encoded_length", encoded_length)
+    document.insert(995, "a")
+    document.delete(500, 1)
+    assert document.offset_to_byte(700) == 2100
+    assert document.byte_to_offset(2101) == 700
+    assert max(encoded) < 8
+
+
+@pytest.mark.parametrize("call", [
+    lambda document: document.insert(4, "x"),
+    lambda document: document.delete(2, 2),
+    lambda document: document.line_of_offset(-1),
+    lambda document: document.line_start(5),
+])
+def test_out_of_range(call):
+    with pytest.raises(IndexError):
+        call(Document("abc"))
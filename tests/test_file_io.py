@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Tests of the detection of file formats, reading and writing."""
+
+import codecs
+import os
+import pytest
+import file_io
+from file_io import FileFormat
+
+
+def round_trip(path, data):
+    path.write_bytes(data)
+    text, file_format, size = file_io.read_text(str(path))
+    assert size == len(data)
+    written = file_io.write_text(str(path), [text[:7], text[7:]],
+                                 file_format)
+    data = path.read_bytes()
+    assert written == len(data)
+    return text, file_format, data
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+def test_newlines_round_trip(tmp_path, newline):
+    data = newline.join(["first", "second", "", "last"]).encode("utf-8")
+    text, file_format, written = round_trip(tmp_path / "file.txt", data)
+    assert text == "first\nsecond\n\nlast"
+    assert file_format == FileFormat("utf-8", b"", newline)
+    assert written == data
+
+
+@pytest.mark.parametrize("bom, encoding", [
+    (codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"), (codecs.BOM_UTF32_LE, "utf-32-le")])
+def test_byte_order_marks_round_trip(tmp_path, bom, encoding):
+    data = bom + "añb\r\n€\r\n".encode(encoding)
+    text, file_format, written = round_trip(tmp_path / "file.txt", data)
+    assert text == "añb\n€\n"
+    assert file_format == FileFormat(encoding, bom, "\r\n")
+    assert written == data
+
+
+def test_legacy_encoding(tmp_path):
+    data = "caf\xe9 €\n".encode("cp1252")
+    text, file_format, written = round_trip(tmp_path / "file.txt", data)
+    assert text == "caf\xe9 €\n"
+    assert file_format.encoding == "cp1252"
+    assert written == data
+
+
+def test_mixed_newlines_are_reported(tmp_path):
+    data = b"foo\r\nbar\nbaz\rend\r\n"
+    text, file_format, written = round_trip(tmp_path / "file.txt", data)
+    assert text == "foo\nbar\nbaz\nend\n"
+    assert file_format == FileFormat("utf-8", b"", "\r\n", True)
+    assert file_format.describe() == "UTF-8 CRLF mixed"
+    assert written == b"foo\r\nbar\r\nbaz\r\nend\r\n"
+
+
+def test_newline_of_first_line():
+    assert file_io.detect_format(b"a\rb\r\nc").newline == "\r"
+    assert file_io.detect_format(b"a\nb\r\n").newline == "\n"
+    assert file_io.detect_format(b"a\r\nb\r").newline == "\r\n"
+    assert file_io.detect_format(b"no newline").newline == os.linesep
+
+
+def test_undecodable_bytes_after_sample(tmp_path):
+    data = (b"valid utf-8 \xc3\xa9\n" * (file_io.SAMPLE_SIZE // 14)
+            + b"broken \xff\xfe\xc3 bytes\n")
+    text, file_format, written = round_trip(tmp_path / "file.txt", data)
+    assert file_format.encoding == "utf-8"
+    assert "\udcff\udcfe\udcc3" in text
+    assert written == data
+
+
+def test_failed_write_keeps_the_file(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"old")
+    with pytest.raises(ValueError):
+        file_io.write_text(str(path), ["caf\xe9", "€"],
+                           FileFormat("ascii", b"", "\n"))
+    assert path.read_bytes() == b"old"
+    assert os.listdir(str(tmp_path)) == ["file.txt"]
+
+
+def test_longest_line_across_blocks():
+    longest, run = file_io.longest_line("abc", 0)
+    assert (longest, run) == (3, 3)
+    longest, run = file_io.longest_line("de\nf\nghij", run)
+    assert (longest, run) == (5, 4)
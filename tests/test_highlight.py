@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Tests of the lexers and of the relexing after the edits."""
+
+import pytest
+from document import Document
+from highlight import Highlighter, PythonLexer, lexer_for_file
+
+
+class FakeText:
+    """Stands for the tk.Text widget, only remembers the scheduling."""
+    def __init__(self):
+        self.jobs = 0
+
+    def tag_config(self, tag, **options):
+        pass
+
+    def tag_lower(self, tag, below):
+        pass
+
+    def tag_remove(self, tag, start, end):
+        pass
+
+    def after_idle(self, function):
+        self.jobs += 1
+        return "job"
+
+    def after_cancel(self, job):
+        pass
+
+
+def lex_all(lexer, text):
+    """Returns states at the starts of the lines, lexed from scratch."""
+    states = [lexer.initial_state]
+    for line in text.split("\n")[:-1]:
+        states.append(lexer.lex_line(line, states[-1])[1])
+    return states
+
+
+def converge(highlighter):
+    """Lexes like the background steps until the states are correct,
+    returns the number of lexed lines."""
+    count = 0
+    while highlighter.next_line is not None:
+        highlighter._lex_next()
+        count += 1
+    return count
+
+
+def make_highlighter(text):
+    document = Document(text)
+    highlighter = Highlighter(FakeText(), document, PythonLexer())
+    converge(highlighter)
+    return document, highlighter
+
+
+def kinds(line, state=PythonLexer.NORMAL):
+    tokens, state = PythonLexer().lex_line(line, state)
+    return [(kind, line[start:end]) for kind, start, end in tokens], state
+
+
+def test_tokens():
+    assert kinds("def f(x): return len(x) # done") == ([
+        ("keyword", "def"), ("definition", "f"), ("keyword", "return"),
+        ("builtin", "len"), ("comment", "# done")], PythonLexer.NORMAL)
+    assert kinds("x = 0x1F + 1.5e3 + 'a\\'b'") == ([
+        ("number", "0x1F"), ("number", "1.5e3"), ("string", "'a\\'b'")],
+        PythonLexer.NORMAL)
+    assert kinds("@property") == ([("decorator", "@property")],
+                                  PythonLexer.NORMAL)
+
+
+def test_strings_over_lines():
+    tokens, state = kinds('x = """doc')
+    assert tokens == [("string", '"""doc')]
+    assert state == PythonLexer.STRING_STATES['"""']
+    assert kinds('end""" if', state) == ([
+        ("string", 'end"""'), ("keyword", "if")], PythonLexer.NORMAL)
+    # Single quotes continue only after a backslash
+    assert kinds("'open")[1] == PythonLexer.NORMAL
+    assert kinds("'open\\")[1] == PythonLexer.STRING_STATES["'"]
+
+
+def test_lexer_for_file():
+    assert isinstance(lexer_for_file("a/b.PY"), PythonLexer)
+    assert lexer_for_file("notes.txt") is None
+    assert lexer_for_file(None) is None
+
+
+TEXT = "".join("line_{} = {}\n".format(number, number)
+               for number in range(100))
+
+
+def test_initial_lexing():
+    document, highlighter = make_highlighter(TEXT)
+    assert list(highlighter.states) == lex_all(PythonLexer(), TEXT)
+    assert highlighter.next_line is None
+
+
+@pytest.mark.parametrize("offset, insert", [
+    (TEXT.index("line_10"), '"""'),
+    (TEXT.index("line_10"), '"""\nnew\n'),
+    (0, "'''"),
+    (len(TEXT), '"""\nopen'),
+])
+def test_opening_string_relexes_to_the_end(offset, insert):
+    document, highlighter = make_highlighter(TEXT)
+    document.insert(offset, insert)
+    highlighter.on_edit("insert", offset, insert)
+    converge(highlighter)
+    text = document.get_text()
+    assert list(highlighter.states) == lex_all(PythonLexer(), text)
+
+
+def test_edit_stops_once_states_match():
+    document, highlighter = make_highlighter(TEXT)
+    offset = TEXT.index("line_50")
+    document.insert(offset, "x\ny")
+    highlighter.on_edit("insert", offset, "x\ny")
+    # The edited lines and the one after them
+    assert converge(highlighter) == 2
+    assert list(highlighter.states) == lex_all(
+        PythonLexer(), document.get_text())
+
+
+def test_closing_string_converges():
+    text = 'x = 1\n"""\n' + TEXT + '"""\ny = 2\n'
+    document, highlighter = make_highlighter(text)
+    assert highlighter.states[3] == PythonLexer.STRING_STATES['"""']
+    document.delete(6, 3)
+    highlighter.on_edit("delete", 6, '"""')
+    converge(highlighter)
+    assert list(highlighter.states) == lex_all(
+        PythonLexer(), document.get_text())
+    assert highlighter.states[3] == PythonLexer.NORMAL
+
+
+def test_deleting_lines():
+    document, highlighter = make_highlighter('a = """\n' + TEXT)
+    start = 8
+    removed = document.get_text(start, start + 40)
+    document.delete(start, 40)
+    highlighter.on_edit("delete", start, removed)
+    converge(highlighter)
+    assert list(highlighter.states) == lex_all(
+        PythonLexer(), document.get_text())
+    assert len(highlighter.states) == document.line_count
+    assert len(highlighter.tagged) == document.line_count
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Tests of the journals of the edits."""
+
+import json
+import os
+import time
+import journal
+from document import Document
+
+
+class Widget:
+    """Stands for the widget the flush timer runs on, the timer never
+    fires by itself."""
+    def __init__(self):
+        self.jobs = {}
+
+    def after(self, delay, callback):
+        self.jobs[len(self.jobs)] = callback
+        return len(self.jobs) - 1
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def read_records(path):
+    try:
+        return journal.read_journal(path)[1]
+    except (OSError, ValueError):
+        return None
+
+
+def test_records_replay_edits(tmp_path):
+    file = tmp_path / "file.txt"
+    file.write_text("first line\nsecond line")
+    directory = str(tmp_path / "journals")
+    record = journal.Journal(Widget(), str(file), directory)
+    edits = [("insert", 0, "new "), ("delete", 4, "first "),
+             ("insert", 10, "€\ud800")]
+    for edit in edits:
+        record.record(*edit)
+    record.flush()
+    wait_for(lambda: read_records(record.path) == [
+        (journal.INSERT, 0, "new "), (journal.DELETE, 4, 6),
+        (journal.INSERT, 10, "€\ud800")])
+
+    header, records = journal.read_journal(record.path)
+    assert header["file"] == str(file)
+    assert (header["size"], header["mtime"]) == journal.file_state(str(file))
+    document = Document(file.read_text())
+    for operation, offset, value in records:
+        if operation == journal.INSERT:
+            document.insert(offset, value)
+        else:
+            document.delete(offset, value)
+    assert document.get_text() == "new line\ns€\ud800econd line"
+
+    record.close()
+    assert not os.path.exists(record.path)
+
+
+def test_flushes_after_many_edits(tmp_path):
+    file = tmp_path / "file.txt"
+    file.write_text("")
+    widget = Widget()
+    record = journal.Journal(widget, str(file), str(tmp_path))
+    for offset in range(journal.FLUSH_EDITS):
+        record.record("insert", offset, "x")
+    assert not record.pending and not widget.jobs
+    wait_for(lambda: len(read_records(record.path) or ())
+             == journal.FLUSH_EDITS)
+    record.close()
+
+
+def test_broken_line_ends_records(tmp_path):
+    path = tmp_path / "a.1.journal"
+    path.write_text(json.dumps({"file": "a", "size": 0, "mtime": 0}) + "\n"
+                    + json.dumps(["i", 0, "x"]) + "\n" + '["d", 0')
+    assert journal.read_journal(str(path))[1] == [("i", 0, "x")]
+
+
+def test_finds_journals_of_finished_editors(tmp_path):
+    own = journal.journal_path("file", str(tmp_path))
+    left = journal.journal_path("file", str(tmp_path), pid=2 ** 22 + 1)
+    for path in (own, left, str(tmp_path / "other.txt")):
+        open(path, 'w').close()
+    assert journal.find_journals(str(tmp_path)) == [left]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Tests of the sparse LineIndex of the large file view."""
+
+import random
+import pytest
+from large_file import LineIndex
+
+
+def check(data, step):
+    """Compares every query of the index with a scan of the data."""
+    index = LineIndex(data, step)
+    starts = [0] + [offset + 1 for offset, byte in enumerate(data)
+                    if byte == ord("\n")]
+    assert index.line_count == len(starts)
+    assert list(index.offsets) == sorted(set(index.offsets))
+    for line, start in enumerate(starts):
+        assert index.line_offset(line) == start
+    assert index.line_offset(-1) == 0
+    assert index.line_offset(len(starts)) == starts[-1]
+    line = 0
+    for offset in range(len(data)):
+        if line + 1 < len(starts) and starts[line + 1] <= offset:
+            line += 1
+        assert index.line_of_offset(offset) == line
+        assert index.line_start(offset) == starts[line]
+        assert index.next_line(offset) == (
+            starts[line + 1] if line + 1 < len(starts) else None)
+    for line, start in enumerate(starts):
+        assert index.previous_line(start) == (
+            starts[line - 1] if line else None)
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"\n",
+    b"\n\n\n\n\n\n",
+    b"one line without a newline",
+    b"a\nbb\nccc\ndddd\n",
+    b"\n" + b"x" * 50 + b"\n" + b"y" * 3,
+])
+@pytest.mark.parametrize("step", [1, 2, 3, 7, 64])
+def test_small_data(data, step):
+    check(data, step)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_data(seed):
+    generator = random.Random(seed)
+    lengths = [generator.choice([0, 1, 5, 30, 200]) for _ in range(60)]
+    data = b"\n".join(b"z" * length for length in lengths)
+    check(data, generator.choice([4, 16, 100]))
+
+
+def test_lines_longer_than_step():
+    # Checkpoints fall inside lines, only their starts are indexed
+    data = b"\n".join(b"w" * 100 for _ in range(10))
+    index = LineIndex(data, 16)
+    assert all(data[offset - 1:offset] == b"\n"
+               for offset in index.offsets[1:])
+    check(data, 16)
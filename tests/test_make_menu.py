@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Tests of the compiled menus and of their predicates."""
+
+from tkinter.constants import NORMAL, DISABLED, SEPARATOR, NO, YES
+from make_menu import (CompiledMenu, MenuEntry, compile_menu, setup_menu,
+                       update_menu)
+
+
+class FakeMenu:
+    """Stands for the tk.Menu, records the entries and the options."""
+    def __init__(self):
+        self.options = {"tearoff": YES}
+        self.entries = []
+
+    def config(self, **options):
+        self.options.update(options)
+
+    def cget(self, option):
+        return self.options[option]
+
+    def entryconfig(self, index, **options):
+        self.entries[index].update(options)
+
+    def add_command(self, **options):
+        self.entries.append(dict(options, entry_type="command"))
+
+    def add_separator(self, **options):
+        self.entries.append(dict(options, entry_type="separator"))
+
+    def add_cascade(self, **options):
+        self.entries.append(dict(options, entry_type="cascade"))
+
+    def add_checkbutton(self, **options):
+        self.entries.append(dict(options, entry_type="checkbutton"))
+
+    def add_radiobutton(self, **options):
+        self.entries.append(dict(options, entry_type="radiobutton"))
+
+    def post(self):
+        self.options["postcommand"]()
+
+
+CONTENT = [
+    dict(entry_type="command", label="Save", accelerator="Ctrl+S"),
+    SEPARATOR,
+    dict(entry_type="Cascade", label="Recent", menu=[
+        dict(entry_type="command", label="a.txt"),
+        dict(entry_type="options", bg="red")]),
+    dict(entry_type="options", tearoff=YES),
+]
+
+
+def test_compile_menu():
+    saved = []
+    compiled = compile_menu(CONTENT, {"Save": lambda: saved})
+    assert compiled.options == (("tearoff", YES),)
+    save, separator, recent = compiled.entries
+    assert save.entry_type == "command"
+    assert save.options == (("label", "Save"), ("accelerator", "Ctrl+S"))
+    assert save.enabled() is saved
+    assert save.submenu is None
+    assert separator == MenuEntry(SEPARATOR, (), None, None)
+    assert recent.entry_type == "cascade"
+    assert recent.enabled is None
+    assert recent.submenu == CompiledMenu(
+        (MenuEntry("command", (("label", "a.txt"),), None, None),),
+        (("tearoff", NO), ("bg", "red")))
+    # The content is left unchanged and compiled content is kept
+    assert CONTENT[0]["entry_type"] == "command"
+    assert "menu" in CONTENT[2]
+    assert compile_menu(compiled) is compiled
+
+
+def test_predicates_of_submenus():
+    compiled = compile_menu(CONTENT, {"a.txt": lambda: False})
+    assert compiled.entries[2].submenu.entries[0].enabled() is False
+
+
+def test_update_menu():
+    state = {"undo": True}
+    compiled = compile_menu([
+        dict(entry_type="command", label="Undo"),
+        SEPARATOR,
+        dict(entry_type="command", label="Redo")],
+        {"Undo": lambda: state["undo"], "Redo": lambda: False})
+    menu = FakeMenu()
+    menu.config(tearoff=NO)
+    menu.entries = [{}, {}, {}]
+    update_menu(menu, compiled)
+    assert menu.entries == [{"state": NORMAL}, {}, {"state": DISABLED}]
+    state["undo"] = False
+    menu.config(tearoff=YES)
+    menu.entries.insert(0, {})
+    update_menu(menu, compiled)
+    assert menu.entries == [{}, {"state": DISABLED}, {},
+                            {"state": DISABLED}]
+
+
+def test_lazy_menu_is_filled_when_posted():
+    posted = []
+    compiled = compile_menu([
+        dict(entry_type="command", label="Cut"),
+        dict(entry_type="checkbutton", label="Wrap"),
+        dict(entry_type="options", postcommand=lambda: posted.append(1))],
+        {"Cut": lambda: False})
+    menu = FakeMenu()
+    setup_menu(menu, compiled, lazy=True, bg="white")
+    assert menu.cget("tearoff") == NO
+    assert menu.cget("bg") == "white"
+    assert menu.entries == []
+    menu.post()
+    menu.post()
+    assert menu.entries == [
+        {"label": "Cut", "entry_type": "command", "state": DISABLED},
+        {"label": "Wrap", "entry_type": "checkbutton"}]
+    assert posted == [1, 1]
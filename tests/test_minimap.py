@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Tests of the LineSummary the minimap is drawn from."""
+
+import random
+from document import Document
+import minimap
+from minimap import LineSummary, MODIFIED, ERROR, ERROR_CHARACTER
+
+
+def check(summary, text):
+    """Compares the summary with a summary of the text from scratch."""
+    expected = LineSummary(Document(text))
+    assert summary.lengths == expected.lengths
+    assert summary.indents == expected.indents
+    assert summary.marks[ERROR] == expected.marks[ERROR]
+    assert len(summary.marks[MODIFIED]) == len(summary)
+
+
+def edit(document, summary, operation, offset, text):
+    if operation == "insert":
+        document.insert(offset, text)
+    else:
+        document.delete(offset, len(text))
+    return summary.on_edit(operation, offset, text)
+
+
+def test_summary():
+    summary = LineSummary(Document("a\n    bcd\n\t\n" + ERROR_CHARACTER))
+    assert list(summary.lengths) == [1, 7, 1, 1]
+    assert list(summary.indents) == [0, 4, 1, 0]
+    assert summary.marks[ERROR] == b"\0\0\0\1"
+    assert summary.marks[MODIFIED] == bytes(4)
+
+
+def test_insert_marks_the_touched_lines():
+    document = Document("one\ntwo\nthree")
+    summary = LineSummary(document)
+    assert edit(document, summary, "insert", 5, "X\n  Y\nZ") == (1, 1, 3)
+    check(summary, document.get_text())
+    assert summary.marks[MODIFIED] == b"\0\1\1\1\0"
+    summary.clear_marks(MODIFIED)
+    assert summary.marks[MODIFIED] == bytes(5)
+
+
+def test_delete_joins_the_lines():
+    document = Document("one\ntwo\nthree\nfour")
+    summary = LineSummary(document)
+    assert edit(document, summary, "delete", 2, "e\ntwo\nth") == (0, 3, 1)
+    assert document.get_text() == "onree\nfour"
+    check(summary, document.get_text())
+    assert summary.marks[MODIFIED] == b"\1\0"
+
+
+def test_long_lines_keep_their_length(monkeypatch):
+    monkeypatch.setattr(minimap, "SCAN_LIMIT", 8)
+    document = Document("short\n")
+    summary = LineSummary(document)
+    edit(document, summary, "insert", 6, "  " + "x" * 30 + ERROR_CHARACTER)
+    assert list(summary.lengths) == [5, 33]
+    assert list(summary.indents) == [0, 2]
+    # The error past the scanned characters is not seen
+    assert summary.marks[ERROR] == b"\0\0"
+
+
+def test_random_edits():
+    generator = random.Random(0)
+    alphabet = "ab \n\t" + ERROR_CHARACTER
+    document = Document("start\n  text")
+    summary = LineSummary(document)
+    for _ in range(300):
+        text = document.get_text()
+        if generator.randrange(3) or not text:
+            offset = generator.randint(0, len(text))
+            value = "".join(generator.choice(alphabet)
+                            for _ in range(generator.randint(1, 8)))
+            edit(document, summary, "insert", offset, value)
+        else:
+            offset = generator.randrange(len(text))
+            length = generator.randint(1, min(8, len(text) - offset))
+            edit(document, summary, "delete", offset,
+                 text[offset:offset + length])
+        check(summary, document.get_text())
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Tests of the search over Document snapshots."""
+
+import re
+import pytest
+from document import Document
+import search
+
+
+def make_document(text, piece=100000):
+    """Returns a Document of the text made of many pieces, so the
+    snapshot has many slices."""
+    document = Document()
+    for start in range(0, len(text), piece):
+        document.insert(start, text[start:start + piece])
+    return document
+
+
+def spans(pattern, document, **kwargs):
+    return [(offset + match.start(), offset + match.end())
+            for offset, match in search.iter_matches(
+                pattern, document.snapshot(), **kwargs)]
+
+
+@pytest.fixture(scope="module", params=[0, 1, 3])
+def boundary_text(request):
+    """Text longer than two windows, with a line that starts the
+    parameter characters before the end of the first window."""
+    line = "xxxyy = 1 # text\n"
+    head = line * (search.WINDOW_SIZE // len(line) - 1)
+    head += "z" * (search.WINDOW_SIZE - len(head) - request.param - 1)
+    return head + "\n" + line * (search.WINDOW_SIZE // len(line) + 10)
+
+
+def test_windows_cover_text_once():
+    text = "".join(str(number % 10) for number in range(1000))
+    document = make_document(text, piece=37)
+    owned = []
+    for offset, window, first, own in search.iter_windows(
+            document.snapshot(), size=100, overlap=30):
+        assert window == text[offset:offset + len(window)]
+        owned.append(window[first:own])
+    assert "".join(owned) == text
+
+
+@pytest.mark.parametrize("query", [
+    r"^", r"^x", r"\bx", r"(?<=x)y", r"(?<!x)x", r"$", r"x+", r"\d$"])
+def test_matches_at_window_boundary(boundary_text, query):
+    pattern = re.compile(query, re.MULTILINE)
+    document = make_document(boundary_text)
+    assert spans(pattern, document) == [
+        match.span() for match in pattern.finditer(boundary_text)]
+
+
+def test_find_next_sees_text_before_offset(boundary_text):
+    pattern = re.compile(r"^x|\bz", re.MULTILINE)
+    document = make_document(boundary_text)
+    for offset in (1, search.WINDOW_SIZE - 2, search.WINDOW_SIZE + 1,
+                   len(boundary_text) - 1):
+        expected = (pattern.search(boundary_text, offset)
+                    or pattern.search(boundary_text))
+        assert search.find_next(pattern, document, offset)[:2] == \
+            expected.span()
+
+
+def test_find_all_batches():
+    text = "ab\n" * (search.BATCH_SIZE + 10)
+    pattern = search.compile_query("B", search.IGNORE_CASE)
+    batches = list(search.find_all(pattern, make_document(text).snapshot()))
+    assert [len(starts) for starts, _ in batches] == [search.BATCH_SIZE, 10]
+    assert list(batches[1][0]) == [
+        3 * line + 1 for line in range(search.BATCH_SIZE, len(text) // 3)]
+
+
+def apply_edits(document, edits):
+    for start, end, text in reversed(edits):
+        document.replace(start, end - start, text)
+
+
+@pytest.mark.parametrize("query, replacement, expand", [
+    (r"^", "# ", False),
+    (r"\bx", "X", False),
+    (r"(x+)(y*)", r"\2\1", True),
+    (r"z*$", "-", False),
+])
+def test_replace_all_like_re_sub(boundary_text, query, replacement, expand):
+    pattern = re.compile(query, re.MULTILINE)
+    document = make_document(boundary_text)
+    edits = search.plan_replacements(pattern, document.snapshot(),
+                                     replacement, expand=expand)
+    apply_edits(document, search.merge_edits(edits, document))
+    if not expand:
+        replacement = replacement.replace("\\", "\\\\")
+    assert document.get_text() == pattern.sub(replacement, boundary_text)
+
+
+@pytest.mark.parametrize("regex, match_case, mode", [
+    (False, True, search.LITERAL),
+    (False, False, search.IGNORE_CASE),
+    (True, True, search.REGEX),
+    (True, False, search.REGEX_IGNORE_CASE),
+])
+def test_query_mode(regex, match_case, mode):
+    assert search.query_mode(regex, match_case) == mode
+
+
+@pytest.mark.parametrize("mode, matches", [
+    (search.LITERAL, ["a.b"]),
+    (search.IGNORE_CASE, ["a.b", "A.B"]),
+    (search.REGEX, ["a.b", "axb"]),
+    (search.REGEX_IGNORE_CASE, ["a.b", "A.B", "axb", "AXB"]),
+])
+def test_modes(mode, matches):
+    text = "a.b A.B axb AXB"
+    assert search.compile_query("a.b", mode).findall(text) == matches
+    assert search.compile_bytes_query("a.b", mode).findall(
+        text.encode("utf-8")) == [match.encode("utf-8") for match in matches]
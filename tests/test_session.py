@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Tests of the session file and of the spilled texts."""
+
+import os
+import tempfile
+import pytest
+from document import Document
+from session import (load_session, save_session, spill, read_spill,
+                     remove_spill)
+
+
+@pytest.fixture
+def spill_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "plain\ntext",
+    "crlf\r\nand cr\rkept\r\n",
+    "unicode é€\U0001f600",
+    "lone surrogate \udc80 from a bad decoding",
+])
+def test_spill_round_trip(spill_directory, text):
+    document = Document(text)
+    path = spill(document.iter_chunks())
+    assert os.path.dirname(path) == str(spill_directory)
+    assert read_spill(path) == text
+    remove_spill(path)
+    assert not os.path.exists(path)
+    # Removing twice is harmless
+    remove_spill(path)
+
+
+def test_spill_of_many_chunks(spill_directory):
+    chunks = ["chunk {}\n".format(number) for number in range(1000)]
+    path = spill(iter(chunks))
+    assert read_spill(path) == "".join(chunks)
+    remove_spill(path)
+
+
+def test_failed_spill_leaves_no_file(spill_directory):
+    def chunks():
+        yield "start"
+        raise OSError("disk full")
+    with pytest.raises(OSError):
+        spill(chunks())
+    assert list(spill_directory.iterdir()) == []
+
+
+def test_session_round_trip(tmp_path):
+    path = str(tmp_path / "session.json")
+    save_session(["a.txt", "dir/b.py"], 1, path)
+    assert load_session(path) == (["a.txt", "dir/b.py"], 1)
+    save_session([], 0, path)
+    assert load_session(path) == ([], 0)
+    assert [file.name for file in tmp_path.iterdir()] == ["session.json"]
+
+
+@pytest.mark.parametrize("content, expected", [
+    (None, ([], 0)),
+    ("not json", ([], 0)),
+    ('{"current": 0}', ([], 0)),
+    ('{"files": ["a", 1, "b"], "current": 5}', (["a", "b"], 1)),
+    ('{"files": ["a"], "current": -2}', (["a"], 0)),
+    ('{"files": ["a"], "current": "x"}', ([], 0)),
+])
+def test_load_invalid_session(tmp_path, content, expected):
+    path = tmp_path / "session.json"
+    if content is not None:
+        path.write_text(content, encoding="utf-8")
+    assert load_session(str(path)) == expected
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Tests of the undo history."""
+
+import pytest
+import undo
+from undo import UndoHistory, INSERT, DELETE
+
+
+class Clock:
+    """Stands for the time module, the time moves only when told."""
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(undo, "time", fake)
+    return fake
+
+
+def apply(text, edits):
+    for operation, offset, value in edits:
+        if operation == INSERT:
+            text = text[:offset] + value + text[offset:]
+        else:
+            assert text[offset:offset + len(value)] == value
+            text = text[:offset] + text[offset + len(value):]
+    return text
+
+
+def type_text(history, text, offset, clock, pause=0.1):
+    for character in text:
+        history.record(INSERT, offset, character)
+        offset += 1
+        clock.now += pause
+
+
+def test_typing_is_one_group(clock):
+    history = UndoHistory()
+    type_text(history, "hello", 0, clock)
+    assert history.depth == 1
+    assert history.undo() == [(DELETE, 0, "hello")]
+    assert history.redo() == [(INSERT, 0, "hello")]
+
+
+def test_newline_and_pause_close_the_group(clock):
+    history = UndoHistory()
+    type_text(history, "ab\ncd", 0, clock)
+    assert history.depth == 2
+    clock.now += undo.MERGE_TIME + 1
+    type_text(history, "ef", 5, clock)
+    assert history.depth == 3
+
+
+def test_backspace_and_delete_merge(clock):
+    history = UndoHistory()
+    history.record(INSERT, 0, "abcdef", autoseparators=True)
+    history.separator()
+    # Backspace from the end, then Delete at the same offset
+    history.record(DELETE, 5, "f")
+    history.record(DELETE, 4, "e")
+    history.record(DELETE, 1, "b")
+    history.separator()
+    history.record(DELETE, 1, "c")
+    history.record(DELETE, 1, "d")
+    assert history.depth == 4
+    text = apply("", [(INSERT, 0, "abcdef"), (DELETE, 5, "f"),
+                      (DELETE, 4, "e"), (DELETE, 1, "b"), (DELETE, 1, "c"),
+                      (DELETE, 1, "d")])
+    for _ in range(3):
+        text = apply(text, history.undo())
+    assert text == "abcdef"
+
+
+def test_undo_and_redo_restore_text(clock):
+    history = UndoHistory()
+    text = ""
+    for operation, offset, value in [(INSERT, 0, "one two"),
+                                     (DELETE, 3, " two"),
+                                     (INSERT, 3, "\nthree")]:
+        history.record(operation, offset, value)
+        history.separator()
+        text = apply(text, [(operation, offset, value)])
+    assert text == "one\nthree"
+    states = [text]
+    while history.can_undo:
+        text = apply(text, history.undo())
+        states.append(text)
+    assert states == ["one\nthree", "one", "one two", ""]
+    while history.can_redo:
+        text = apply(text, history.redo())
+    assert text == "one\nthree"
+
+
+def test_new_edit_forgets_redo(clock):
+    history = UndoHistory()
+    history.record(INSERT, 0, "a")
+    history.undo()
+    assert history.can_redo
+    history.record(INSERT, 0, "b")
+    assert not history.can_redo
+
+
+def test_without_autoseparators_edits_join_the_open_group(clock):
+    history = UndoHistory()
+    history.record(INSERT, 0, "x" * 100, autoseparators=False)
+    history.record(DELETE, 10, "x" * 5, autoseparators=False)
+    assert history.depth == 1
+    assert apply("x" * 95, history.undo()) == ""
+
+
+def test_limit_forgets_oldest_groups(clock):
+    text = "x" * 1000
+    history = UndoHistory(limit=3 * undo._edit_size(text))
+    for offset in range(5):
+        history.record(INSERT, offset, text)
+        history.separator()
+    assert history.depth == 3
+    assert history.size <= history.limit
+    history.record(INSERT, 0, "y" * 10000)
+    assert history.depth == 0 and history.size == 0
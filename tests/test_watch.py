@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Tests of the polling FileWatcher and of the Tail."""
+
+import os
+import pytest
+from file_io import FileFormat
+from watch import FileWatcher, Tail, file_state
+
+
+class FakeWidget:
+    """Stands for a widget without Tk, so the watcher falls back to
+    polling. Scheduled calls run only when told."""
+    def __init__(self):
+        self.jobs = {}
+        self.count = 0
+
+    def after(self, delay, function):
+        self.count += 1
+        self.jobs[self.count] = (delay, function)
+        return self.count
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+    def run(self):
+        """Runs the calls scheduled so far."""
+        jobs, self.jobs = self.jobs, {}
+        for _, function in jobs.values():
+            function()
+
+
+@pytest.fixture
+def watched(tmp_path):
+    file = tmp_path / "watched.txt"
+    file.write_bytes(b"first")
+    widget = FakeWidget()
+    changes = []
+    watcher = FileWatcher(widget, str(file),
+                          lambda old, new: changes.append((old, new)), 50)
+    return file, widget, watcher, changes
+
+
+def test_polling_fallback(watched):
+    file, widget, watcher, changes = watched
+    assert [delay for delay, _ in widget.jobs.values()] == [50]
+    widget.run()
+    assert changes == []
+    # The poll schedules itself again
+    assert len(widget.jobs) == 1
+    old = watcher.state
+    file.write_bytes(b"second write")
+    widget.run()
+    assert changes == [(old, file_state(str(file)))]
+    assert changes[0][1].size == 12
+
+
+def test_replace_and_remove(watched):
+    file, widget, watcher, changes = watched
+    other = file.parent / "other.txt"
+    other.write_bytes(b"first")
+    os.replace(str(other), str(file))
+    widget.run()
+    assert len(changes) == 1
+    assert changes[0][0].inode != changes[0][1].inode
+    file.unlink()
+    widget.run()
+    assert changes[1][1] is None
+    widget.run()
+    assert len(changes) == 2
+
+
+def test_refresh_hides_own_saves(watched):
+    file, widget, watcher, changes = watched
+    file.write_bytes(b"saved by the editor")
+    watcher.refresh()
+    widget.run()
+    assert changes == []
+
+
+def test_close_stops_polling(watched):
+    file, widget, watcher, changes = watched
+    watcher.close()
+    assert widget.jobs == {}
+    file.write_bytes(b"changed")
+    widget.run()
+    assert changes == []
+
+
+def test_tail_decodes_split_characters(tmp_path):
+    file = tmp_path / "log.txt"
+    file.write_bytes(b"old\n")
+    tail = Tail(str(file), FileFormat("utf-8", False, "\n"), 4)
+    assert tail.pending(file_state(str(file))) == 0
+    data = "new é\nline\n".encode("utf-8")
+    with open(str(file), "ab") as work_file:
+        work_file.write(data[:5])
+    assert tail.pending(file_state(str(file))) == 5
+    assert tail.read() == "new "
+    with open(str(file), "ab") as work_file:
+        work_file.write(data[5:])
+    assert tail.read() == "é\nline\n"
+    assert tail.read() == ""
+    assert tail.offset == 4 + len(data)
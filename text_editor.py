@@ -2,88 +2,355 @@
 """Simple text editor made with tkinter.
 
 TODO:
-Figure out how to make line_numbers widget that will scroll together
-    with the Text widget. It should update automatically when the
-    number of "initiated" lines change and if the line number
-    should become highlighted when the cursor in in this line,
-    just like in Sublime;
-Create a separate module make_menus that is similar in function
-    to the GUIMaker module from the book. It should take a nested
-    list and construct a menu that could be used in the Menubar
-    as well as in ContextMenu. Should be able to pass icons and
-    shortcuts as optional arguments;
+Line number of the line with the cursor should become highlighted
+    in the line_numbers widget, just like in Sublime;
+Menus made by the make_menu module should be able to show icons;
 Create bar for buttons that duplicates some operations from the
     menubar. Should be able to hide it;
 The program should remember some options set by the user
     previously and store them for future use;
-The program should be able to support opening multiple text
-    files at once and give user an ability to freely switch
-    between them. The ttk.Notebook widget should do the trick;
+Tabs should be reorderable by dragging them;
 """
 
 import os
+import re
 import sys
+import textwrap
+from array import array
+from bisect import bisect_left, bisect_right
 import tkinter as tk
+from tkinter import ttk
 from tkinter.constants import * # pylint: disable=unused-wildcard-import
-import tkinter.messagebox
-import tkinter.filedialog
-from make_menu import make_menu_button
+from make_menu import make_menu_button, compile_menu, setup_menu
+from file_io import FileLoader, FileSaver, DEFAULT_FORMAT, longest_line
+from document import Document
+from large_file import LargeFileView, LARGE_FILE_THRESHOLD
+from long_lines import LongLineView, LONG_LINE_LENGTH
+from highlight import Highlighter, lexer_for_file
+from undo import UndoHistory
+import session
+from session import SESSION_FILE, LIVE_TABS
+import journal
+from journal import Journal, JOURNAL_DIR
+from watch import FileWatcher, FileReloader, Tail, TAIL_LIMIT
+from profiler import Profiler, profiling_requested
+from clipboard import Clipboard, ChunkedPaste, PASTE_CHUNK, PASTE_THRESHOLD
+from diff_view import DiffView, DiffRows, FileComparison
+from minimap import Minimap
+import search
 
 # Program's name:
 PROGRAM_NAME = "text_editor"
+# Mark that keeps the top of the view while a changed file is reloaded
+RELOAD_MARK = "reload_top"
+
+
+# Dialog modules are imported when the first dialog is shown, they
+# are not needed to show the window.
+def _messagebox():
+    import tkinter.messagebox # pylint: disable=import-outside-toplevel
+    return tkinter.messagebox
+
+
+def _filedialog():
+    import tkinter.filedialog # pylint: disable=import-outside-toplevel
+    return tkinter.filedialog
+
 
 class TextEditor(tk.Frame):
-    """Frame with a simple text editor. Main class of the program."""
-    def __init__(self, parent=None, file=None):
+    """Frame with a simple text editor. Main class of the program.
+
+    Every open file has its own Tab in the notebook. The textspace,
+    text, file, loader and saver attributes are the ones of the
+    selected tab.
+    """
+    def __init__(self, parent=None, file=None,
+                 large_file_threshold=LARGE_FILE_THRESHOLD,
+                 session_file=SESSION_FILE, live_tabs=LIVE_TABS,
+                 journal_dir=JOURNAL_DIR, profile=None):
         tk.Frame.__init__(self, parent)
         self.pack(expand=YES, fill=BOTH)
 
         # Class attributes
-        self.file = file
+        # Files bigger than this number of bytes are opened read-only
+        # in the LargeFileView
+        self.large_file_threshold = large_file_threshold
+        # File the open tabs are remembered in between the runs, None
+        # if they should not be remembered
+        self.session_file = session_file
+        # Number of tabs that keep their text in memory
+        self.live_tabs = live_tabs
+        # Directory the journals of the edits are kept in, None if the
+        # edits should not be journaled
+        self.journal_dir = journal_dir
+        # Tabs in the order of the notebook and the selected one
+        self.tabs = []
+        self.tab = None
+        # Loaded tabs, the least recently selected first
+        self.recent = []
         # Attributes for GUI widgets.
         # Assigned values during GUI construction
         self.menubar = None
-        self.textspace = None
-        self.text = None
+        self.notebook = None
         self.statusbar = None
+        self.findbar = None
+        self.context_menu = None
+        # Text copied from the editor, served to the other programs
+        self.clipboard = Clipboard(self)
+        # Profiler of the callbacks, installed before the widgets are
+        # made so it sees all of them. Turned on by the environment if
+        # profile is None.
+        self.profiler = None
+        if profile or (profile is None and profiling_requested()):
+            self.start_profiler()
 
         # GUI construction
         self.make_menubar()
-        self.make_textspace()
+        self.make_notebook()
         self.make_statusbar()
+        self.make_findbar()
+        self.make_context_menu()
 
         # Other GUI related functions
-        self.menubar._get_text()
         self.set_win_size()
-        self.bind_keys()
-        self._focus_on_text()
-        # TODO:
-        # Change in future
-        # Bare bones functionality if the file -> open function
-        if self.file:
-            MenuMethods.open(self.text, self, self.file)
-        # Used so undo method won't delete inserted text
-        # should add this line in the actual
-        # EditMenuMethods.open method
-        self.text.edit_reset()
+        # Closing the window exits like the Exit entry of the menu, so
+        # the modified tabs are saved, the session is remembered and
+        # the clipboard outlives the editor
+        self.master.protocol(
+            "WM_DELETE_WINDOW",
+            lambda: FileMenuMethods.exit(self.text, self))
+        self.restore_session()
+        # The file given on the command line is streamed in by the
+        # FileLoader like any other opened file, in a tab of its own
+        # next to the restored ones
+        if file:
+            MenuMethods.open(self.text, self, file)
+        self.recover_journals()
         self._update_window_title()
 
+    @property
+    def textspace(self):
+        return self.tab.textspace
+
+    @property
+    def text(self):
+        return self.tab.text
+
+    @property
+    def file(self):
+        return self.tab.file
+
+    @property
+    def loader(self):
+        return self.tab.loader
+
+    @property
+    def saver(self):
+        return self.tab.saver
+
+    @property
+    def reloader(self):
+        return self.tab.reloader
+
+    @property
+    def paster(self):
+        return self.tab.paster
+
     # GUI construction methods
     def make_menubar(self):
         """Creates Menubar widget on the top of the parent's window."""
         self.menubar = Menubar(self)
 
-    def make_textspace(self):
-        """Creates expandable Frame widget that contains the Text
-        widget."""
-        self.textspace = TextSpace(self)
-        self.text = self.textspace.text
+    def make_notebook(self):
+        """Creates expandable Notebook widget with a tab for every
+        open file."""
+        self.notebook = ttk.Notebook(self)
+        self.notebook.pack(side=TOP, expand=YES, fill=BOTH)
+        self.notebook.bind('<<NotebookTabChanged>>',
+                           lambda event: self._on_tab_changed())
 
     def make_statusbar(self):
         """Creates Statusbar widget on the bottom of the parent's
         window."""
         self.statusbar = Statusbar(self)
+
+    def make_findbar(self):
+        """Creates FindBar widget. It is shown above the statusbar
+        only when needed."""
+        self.findbar = FindBar(self)
+
+    def make_context_menu(self):
+        """Creates ContextMenu with the entries of the Edit menu."""
+        self.context_menu = ContextMenu(
+            self, self.menubar.get_compiled_menu("Edit"))
+
+    def connect_textspace(self, textspace):
+        """Connects the TextSpace of a newly loaded tab to the rest of
+        the editor."""
+        sync = textspace.sync
+        sync.add_listener(lambda *args: self._update_cursor_status())
+        sync.add_cursor_listener(self._update_cursor_status)
+        self.bind_keys(textspace.text)
+        textspace.set_wrap(self.menubar.wrap_words.get())
+
+    # Tabs
+    def add_tab(self, file=None):
+        """Adds a tab for the file to the end of the notebook. The
+        file is not loaded until the tab is selected.
+        Args:
+            file (str or None): path to the file, None for a new
+                untitled file.
+        Returns:
+            (Tab): the new tab.
+        """
+        tab = Tab(self, file)
+        self.tabs.append(tab)
+        self.notebook.add(tab.frame, text=tab.get_title())
+        return tab
+
+    def select_tab(self, tab):
+        """Shows the tab, loads it if it is not loaded."""
+        self.notebook.select(tab.frame)
+        # The notebook reports the change later, the tab is switched
+        # right away so the caller can use it.
+        self._on_tab_changed()
+
+    def find_tab(self, file):
+        """Returns the tab of the file, or None if it is not open."""
+        file = os.path.abspath(file)
+        for tab in self.tabs:
+            if tab.file and os.path.abspath(tab.file) == file:
+                return tab
+        return None
+
+    def close_tab(self, tab):
+        """Removes the tab, changes of its text are lost. The next tab
+        is selected, a new one is added if it was the last tab."""
+        index = self.tabs.index(tab)
+        self.tabs.remove(tab)
+        if tab in self.recent:
+            self.recent.remove(tab)
+        if not self.tabs:
+            self.add_tab()
+        if tab is self.tab:
+            self.select_tab(self.tabs[min(index, len(self.tabs) - 1)])
+        tab.close()
+
+    def hibernate_tabs(self):
+        """Hibernates the least recently selected tabs that keep their
+        text in memory above the live_tabs budget. Tabs that are
+        being loaded or saved are left alone."""
+        excess = len(self.recent) - self.live_tabs
+        for tab in list(self.recent):
+            if excess <= 0:
+                break
+            if tab is self.tab or tab.is_busy():
+                continue
+            if tab.hibernate():
+                self.recent.remove(tab)
+                excess -= 1
+
+    def _on_tab_changed(self):
+        frame = self.notebook.select()
+        tab = next((tab for tab in self.tabs if str(tab.frame) == frame),
+                   None)
+        if tab is None or tab is self.tab:
+            return
+        self.tab = tab
+        if tab.textspace is None:
+            tab.load()
+        if tab in self.recent:
+            self.recent.remove(tab)
+        self.recent.append(tab)
+        self.findbar.attach(tab.textspace)
+        self.menubar._get_text()
+        tab.update_menu()
+        self._focus_on_text()
+        self._update_window_title()
         self._update_cursor_status()
+        self.hibernate_tabs()
+
+    # Session
+    def restore_session(self):
+        """Adds tabs of the files that were open when the editor were
+        closed last time. Only the selected one is loaded."""
+        files, current = [], 0
+        if self.session_file is not None:
+            files, current = session.load_session(self.session_file)
+        for file in files:
+            if os.path.isfile(file):
+                self.add_tab(file)
+        if not self.tabs:
+            self.add_tab()
+        self.select_tab(self.tabs[min(current, len(self.tabs) - 1)])
+
+    # Profiling
+    def start_profiler(self):
+        """Starts recording latencies of the callbacks. Ctrl+Alt+P
+        dumps them."""
+        self.profiler = Profiler()
+        self.profiler.install(
+            self, on_overlay=lambda text: self.statusbar.show_profile(text))
+        self.profiler.instrument(FileMenuMethods, EditMenuMethods,
+                                 FormatMenuMethods, ViewMenuMethods,
+                                 HelpMenuMethods)
+        self.bind_all("<Control-Alt-p>", lambda event: self.dump_profile())
+
+    def dump_profile(self):
+        """Writes the recorded latencies as a Chrome trace."""
+        try:
+            path = self.profiler.dump()
+        except OSError as error:
+            _messagebox().showerror(title="Can't write the profile",
+                                    message=str(error))
+            return
+        self.statusbar.show_message("Profile written to {}".format(path))
+
+    def recover_journals(self):
+        """Offers to replay the journals left by an editor that didn't
+        close its files, e.g. because it crashed, on the files."""
+        if self.journal_dir is None:
+            return
+        for path in journal.find_journals(self.journal_dir):
+            try:
+                header, records = journal.read_journal(path)
+                state = journal.file_state(header["file"])
+            except (OSError, ValueError):
+                journal.remove_journal(path)
+                continue
+            journal.remove_journal(path)
+            if not records:
+                continue
+            file = header["file"]
+            name = os.path.basename(file)
+            if state != (header["size"], header["mtime"]):
+                _messagebox().showwarning(
+                    title="Changes not recovered",
+                    message="{} has been changed since the changes were "
+                            "made, they can't be recovered.".format(name))
+                continue
+            if not _messagebox().askyesno(
+                    title="Recover changes?",
+                    message="{} has changes that were not saved, "
+                            "recover them?".format(name)):
+                continue
+            MenuMethods.open(self.text, self, file)
+            tab = self.find_tab(file)
+            if tab is not None:
+                tab.when_loaded(
+                    lambda tab=tab, records=records: tab.replay(records))
+
+    def save_session(self):
+        """Remembers the files open in the tabs."""
+        if self.session_file is None:
+            return
+        tabs = [tab for tab in self.tabs if tab.file]
+        files = [os.path.abspath(tab.file) for tab in tabs]
+        current = tabs.index(self.tab) if self.tab in tabs else 0
+        try:
+            session.save_session(files, current, self.session_file)
+        except OSError:
+            pass
 
     # Additional methods
     def set_win_size(self, size=None, ratio=None):
@@ -115,29 +382,47 @@ class TextEditor(tk.Frame):
 
         self.master.geometry('{}x{}'.format(width, height))
 
-    def bind_keys(self):
-        """Bind keys to actions bedfore the program starts.
+    def bind_keys(self, text):
+        """Bind keys of the text widget of a tab to actions.
         """
 
-        # Keybinds for cursor position indicator in statusbar.
-        # Any pressed key or LMB click will update cursor position
-        # white textspace is in focus.
-        self.text.bind('<Key>',
-                       lambda event: self._update_cursor_status())
-        self.text.bind('<Button-1>',
-                       lambda event: self._update_cursor_status())
-        # self.textspace.bind_all('<MouseWheel>',
-        #     lambda event:self.update_line_numbers())
+        # Escape stops the file that is still being loaded.
+        text.bind('<Escape>',
+                  lambda event: self.cancel_loading())
+        # Ctrl+F moves the cursor forward in the default bindings of
+        # the Text widget, "break" stops it.
+        text.bind('<Control-f>',
+                  lambda event: MenuMethods.find(self.text, self)
+                  or "break")
+        text.bind('<Control-F>',
+                  lambda event: MenuMethods.find_and_replace(
+                      self.text, self) or "break")
+        text.bind('<Control-g>',
+                  lambda event: MenuMethods.go_to(self.text, self)
+                  or "break")
+        text.bind('<Control-w>',
+                  lambda event: MenuMethods.close_file(self.text, self)
+                  or "break")
+        text.bind('<Button-3>', self.context_menu.popup)
+        # The default bindings copy the text through Tcl strings,
+        # which freezes the editor for big selections.
+        text.bind('<<Copy>>',
+                  lambda event: MenuMethods.copy(self.text, self) or "break")
+        text.bind('<<Cut>>',
+                  lambda event: MenuMethods.cut(self.text, self) or "break")
+        text.bind('<<Paste>>',
+                  lambda event: MenuMethods.paste(self.text, self) or "break")
 
     def _update_cursor_status(self):
         """Updates cursor position indicator in statusbar
         """
-        # after_idle method is used to get cursor position after
-        # the action it is binded to were performed.
-        self.after_idle(self.statusbar._update_cursor_position)
+        # The statusbar is updated once per frame no matter how many
+        # edits and cursor moves happened in between.
+        self.statusbar.schedule_update()
 
-    # def update_line_numbers(self):
-    #     self.textspace.line_numbers.write_numbers()
+    def cancel_loading(self):
+        """Cancels loading of the file if it is still streaming in."""
+        self.tab.cancel_loading()
 
     def _focus_on_text(self):
         """Sets focus on the text widget."""
@@ -156,12 +441,407 @@ class TextEditor(tk.Frame):
         title = "{0} - {1}".format(filename, program)
         self.master.title(title)
 
+
+class Tab:
+    """File open in a tab of the notebook.
+
+    The page of the notebook always exists, the TextSpace with the
+    text is created when the tab is loaded. A hibernated tab drops its
+    TextSpace: an unmodified text is loaded from the file again, a
+    modified one is spilled into a temporary file first. Undo history
+    doesn't survive the hibernation.
+
+    Has the same file, loader, saver, textspace and statusbar
+    attributes as the TextEditor, so the service File menu methods
+    can work on a tab that is not selected.
+    """
+    def __init__(self, editor, file=None):
+        self.editor = editor
+        self.file = file
+        self.frame = tk.Frame(editor.notebook)
+        self.textspace = None
+        self.loader = None
+        self.saver = None
+        # Temporary file with the text of the hibernated modified tab
+        # and the format its file is saved with
+        self.spill = None
+        self.file_format = None
+        # Journal of the edits of the file, kept while the tab is
+        # hibernated
+        self.journal = None
+        # FileWatcher of the file, FileReloader that reads it again
+        # after it were changed by another program and Tail that
+        # reads what were appended to it
+        self.watcher = None
+        self.reloader = None
+        self.tail = None
+        # ChunkedPaste of a big text still being pasted
+        self.paster = None
+        # Whether the appended lines are shown as the file grows
+        self.follow_tail = False
+        # Cursor index, first visible fraction and top line of the
+        # large file view, restored once the tab is loaded again
+        self.view = None
+        # Callables called without arguments once the tab is loaded
+        self.on_load = []
+
+    @property
+    def text(self):
+        return self.textspace.text if self.textspace is not None else None
+
+    @property
+    def statusbar(self):
+        return self.editor.statusbar
+
+    @property
+    def large_file_threshold(self):
+        return self.editor.large_file_threshold
+
+    def get_title(self):
+        return os.path.basename(self.file) if self.file else "untitled"
+
+    def is_busy(self):
+        return (self.loader is not None or self.saver is not None
+                or self.reloader is not None or self.paster is not None)
+
+    def update_menu(self):
+        """Shows the state of the tab in the checkbuttons of the menus,
+        if the tab is selected."""
+        if self is not self.editor.tab or self.textspace is None:
+            return
+        menubar = self.editor.menubar
+        menubar.follow_tail.set(self.follow_tail)
+        menubar.protect_long_lines.set(self.textspace.long_lines is not None)
+
+    def is_modified(self):
+        if self.spill is not None:
+            return True
+        return (self.textspace is not None and self.loader is None
+                and bool(self.text.edit_modified()))
+
+    def is_blank(self):
+        """Checks if the tab is an empty untitled file, which can be
+        replaced by a file being opened."""
+        return (self.file is None and self.textspace is not None
+                and not self.is_busy() and not self.is_modified()
+                and not len(self.textspace.document))
+
+    def when_loaded(self, callback):
+        """Calls the callback once the text of the tab is loaded."""
+        if self.textspace is not None and self.loader is None:
+            callback()
+        else:
+            self.on_load.append(callback)
+
+    def load(self):
+        """Creates the TextSpace and fills it from the spilled text or
+        from the file."""
+        self.textspace = TextSpace(self.frame)
+        self.editor.connect_textspace(self.textspace)
+        if self.spill is not None:
+            self._restore_spill()
+        elif self.file is not None:
+            FileMenuMethods._open_file(self.text, self, self.file,
+                                       on_open=self._loaded)
+            return
+        self._loaded()
+
+    def _restore_spill(self):
+        try:
+            text = session.read_spill(self.spill)
+        except OSError as error:
+            FileMenuMethods._message_load_error(error)
+            return
+        self.textspace.set_lexer(self.file)
+        self.textspace.file_format = self.file_format
+        if longest_line(text)[0] > LONG_LINE_LENGTH:
+            self.textspace.document.insert(0, text)
+            self.textspace.minimap.reset()
+            self.textspace.protect()
+        else:
+            self.text.insert("1.0", text)
+        self.text.edit_reset()
+        self.text.edit_modified(True)
+        session.remove_spill(self.spill)
+        self.spill = None
+        self._connect_journal()
+
+    def _loaded(self):
+        self._restore_view()
+        callbacks, self.on_load = self.on_load, []
+        for callback in callbacks:
+            callback()
+
+    def _restore_view(self):
+        if self.view is None:
+            return
+        index, fraction, top_line = self.view
+        self.view = None
+        if self.textspace.large_file is not None:
+            self.textspace.large_file.show_line(top_line)
+        elif self.textspace.long_lines is not None:
+            self.textspace.long_lines.show_line(top_line)
+        else:
+            self.text.mark_set(INSERT, index)
+            self.text.yview_moveto(fraction)
+
+    def hibernate(self):
+        """Drops the TextSpace of the tab, spills the text first if it
+        is modified.
+        Returns:
+            (bool): False if the text couldn't be spilled and the tab
+                is left loaded.
+        """
+        textspace = self.textspace
+        if textspace.large_file is not None:
+            view = (None, 0, textspace.large_file.top_line)
+        elif textspace.long_lines is not None:
+            view = (None, 0, textspace.long_lines.top_line)
+        else:
+            view = (self.text.index(INSERT), self.text.yview()[0], 0)
+        if self.is_modified():
+            try:
+                self.spill = session.spill(textspace.document.iter_chunks())
+            except OSError:
+                return False
+            self.file_format = textspace.file_format
+        self.view = view
+        textspace.destroy()
+        self.textspace = None
+        return True
+
+    def start_journal(self, file):
+        """Starts journaling the edits of the text over, for the file
+        as it is on the disk now."""
+        if self.editor.journal_dir is None:
+            return
+        try:
+            if self.journal is None:
+                self.journal = Journal(self.frame, file,
+                                       self.editor.journal_dir)
+            else:
+                self.journal.reset(file)
+        except OSError:
+            self.close_journal()
+            return
+        self._connect_journal()
+
+    def _connect_journal(self):
+        if self.journal is None:
+            return
+        sync = self.textspace.sync
+        if self.journal.record not in sync.listeners:
+            sync.add_listener(self.journal.record)
+
+    def close_journal(self):
+        """Stops journaling and removes the journal, the text is saved
+        or its changes are discarded."""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def replay(self, records):
+        """Applies the edits recovered from a journal to the text.
+        Args:
+            records (list): records of journal.read_journal.
+        """
+        # The changes were made to the text in the widget
+        self.textspace.unprotect(self.file)
+        self.update_menu()
+        sync = self.textspace.sync
+        try:
+            for operation, offset, value in records:
+                index = sync.offset_to_index(offset)
+                if operation == journal.INSERT:
+                    self.text.insert(index, value)
+                else:
+                    self.text.delete(
+                        index, sync.offset_to_index(offset + value))
+        except (IndexError, ValueError, TypeError):
+            FileMenuMethods._message_load_error(
+                "The recovered changes are broken, only a part of them "
+                "were applied")
+        self.text.edit_modified(True)
+        self._update_window_title()
+
+    def start_watcher(self, file, size):
+        """Starts watching the file for changes made by other programs.
+        Args:
+            file (str): path to the file;
+            size (int): number of bytes of the file that are in the
+                text, the file is followed from there.
+        """
+        if self.watcher is not None and self.watcher.file == file:
+            self.watcher.refresh()
+        else:
+            self.stop_watcher()
+            self.watcher = FileWatcher(self.frame, file,
+                                       self._on_file_changed)
+        self.tail = Tail(file, self.textspace.file_format, size)
+
+    def stop_watcher(self):
+        if self.reloader is not None:
+            self.reloader.cancel()
+            self._finish_reload_state()
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        self.tail = None
+
+    def _on_file_changed(self, old, new):
+        """Listener of the FileWatcher."""
+        if self.textspace is None:
+            # Unmodified text is read from the file when the tab is
+            # loaded again
+            if self.spill is not None:
+                self.when_loaded(lambda: self._on_file_changed(old, new))
+            return
+        if self.is_busy():
+            # Own save, or the changes are read already
+            return
+        if new is None:
+            self.statusbar.show_message(
+                "{} has been removed".format(self.get_title()))
+            return
+        if (self.follow_tail and not self.is_modified() and old is not None
+                and new.inode == old.inode
+                and 0 <= self.tail.pending(new) <= TAIL_LIMIT):
+            self._read_tail()
+            return
+        if self.is_modified() and not _messagebox().askyesno(
+                title="Reload the file?",
+                message="{} has been changed by another program, reload "
+                        "it? Your changes can be undone.".format(
+                            self.get_title())):
+            return
+        self.reload()
+
+    def reload(self):
+        """Reads the file again in the background and replaces only the
+        lines that differ. The text is read-only meanwhile."""
+        self.reloader = FileReloader(
+            self.frame, self.textspace.document, self.file,
+            on_done=self._finish_reload,
+            on_error=self._reload_failed)
+        self.text.config(state=DISABLED)
+        self.statusbar.show_message("Reloading...")
+        self.reloader.start()
+
+    def _finish_reload_state(self):
+        self.reloader = None
+        if self.textspace is not None and self.textspace.long_lines is None:
+            self.text.config(state=NORMAL)
+
+    def _reload_failed(self, error):
+        self._finish_reload_state()
+        self.statusbar.show_message("")
+        FileMenuMethods._message_load_error(error)
+
+    def _finish_reload(self, edits, file_format, size):
+        self._finish_reload_state()
+        self._apply_changes(edits)
+        self.textspace.file_format = file_format
+        self.text.edit_modified(False)
+        self.tail = Tail(self.file, file_format, size)
+        self.start_journal(self.file)
+        self._update_window_title()
+        self.statusbar.show_message("Reloaded, {} blocks changed".format(
+            len(edits)))
+
+    def _read_tail(self):
+        try:
+            appended = self.tail.read()
+        except OSError as error:
+            FileMenuMethods._message_load_error(error)
+            return
+        if not appended:
+            return
+        view = self.textspace.long_lines
+        at_end = (view.at_end if view is not None
+                  else self.text.yview()[1] >= 1.0)
+        end = len(self.textspace.document)
+        self._apply_changes([(end, end, appended)])
+        self.text.edit_modified(False)
+        self.start_journal(self.file)
+        if at_end:
+            self.textspace.show_end()
+
+    def _apply_changes(self, edits):
+        """Applies the edits made by another program to the text as a
+        single undo step, the cursor and the top line of the view stay
+        where they were.
+        Args:
+            edits (list): (start, end, text) tuples in descending order
+                of offsets.
+        """
+        view = self.textspace.long_lines
+        if view is not None:
+            # The view is read-only, the Document is edited directly
+            # and only the visible rows are rendered again
+            document = self.textspace.document
+            minimap = self.textspace.minimap
+            for start, end, new_text in edits:
+                if end > start:
+                    deleted = document.get_text(start, end)
+                    document.delete(start, end - start)
+                    minimap.on_edit("delete", start, deleted)
+                if new_text:
+                    document.insert(start, new_text)
+                    minimap.on_edit("insert", start, new_text)
+            view.render()
+            return
+        text = self.text
+        sync = self.textspace.sync
+        text.mark_set(RELOAD_MARK, "@0,0")
+        text.mark_gravity(RELOAD_MARK, LEFT)
+        autoseparators = text.cget("autoseparators")
+        text.edit_separator()
+        text.config(autoseparators=False)
+        for start, end, new_text in edits:
+            index = sync.offset_to_index(start)
+            if end > start:
+                text.delete(index, sync.offset_to_index(end))
+            if new_text:
+                text.insert(index, new_text)
+        text.config(autoseparators=autoseparators)
+        text.edit_separator()
+        text.yview(RELOAD_MARK)
+        text.mark_unset(RELOAD_MARK)
+
+    def close(self):
+        """Removes the tab from the notebook, its text is lost."""
+        self.cancel_loading()
+        self.stop_watcher()
+        self.close_journal()
+        if self.textspace is not None:
+            self.textspace.destroy()
+            self.textspace = None
+        if self.spill is not None:
+            session.remove_spill(self.spill)
+            self.spill = None
+        self.editor.notebook.forget(self.frame)
+        self.frame.destroy()
+
+    def cancel_loading(self):
+        """Cancels loading of the file if it is still streaming in, or
+        the paste of a big text."""
+        if self.loader is not None:
+            self.loader.cancel()
+        if self.paster is not None:
+            self.paster.cancel()
+
+    def _update_window_title(self):
+        """Updates title of the tab, and of the main window if the tab
+        is selected."""
+        self.editor.notebook.tab(self.frame, text=self.get_title())
+        if self is self.editor.tab:
+            self.editor._update_window_title()
+
+
 class FileMenuMethods:
     """Container class for File menu methods"""
     def new_file(text, parent):
-        """Creates new file. If contents of the text widget were
-        modified, calls AskSave message dialog, execution of the
-        function stops in the option "Cancel" were chosen.
+        """Creates new file in a new tab.
         Args:
             text (tk.Text): instance of a tk.Text widget that used
                 as the textspace of the editor;
@@ -170,33 +850,61 @@ class FileMenuMethods:
         Returns:
             None
         """
-        if FileMenuMethods._save_modified(text, parent) is None:
-            return
-        text.delete("1.0", END)
+        parent.select_tab(parent.add_tab())
 
-        file = None
-        FileMenuMethods._set_current_file(file, parent)
-
-        parent._update_window_title()
-
-    def open(text, parent, file=None, **options):
+    def open(text, parent, file=None, on_open=None, **options):
+        """Opens the file in a new tab, asks for it if no file were
+        given. The tab of the file is selected if it is already open,
+        an empty untitled tab is reused.
+        Args:
+            text (tk.Text): Instance of the tkinter class Text;
+            parent (class): Parent of the class from where this method
+                were called;
+            file (str or None): Path to the file;
+            on_open (callable): called without arguments once the
+                file is completely loaded;
+            **options: keyword arguments for the Open dialog.
+        Returns:
+            None
+        """
+        file = file or _filedialog().Open(**options).show()
+        if not file:
+            return
+        tab = parent.find_tab(file)
+        if tab is None:
+            if parent.tab.is_blank():
+                tab = parent.tab
+                FileMenuMethods._open_file(tab.text, tab, file, tab._loaded)
+            else:
+                tab = parent.add_tab(file)
+        parent.select_tab(tab)
+        if on_open:
+            tab.when_loaded(on_open)
+
+    def close_file(text, parent):
+        """Closes the tab of the file. If contents of the text widget
+        were modified, calls AskSave message dialog, the tab stays
+        open if the option "Cancel" were chosen."""
         if FileMenuMethods._save_modified(text, parent) is None:
             return
-        FileMenuMethods._open_file(text, parent, file, **options)
+        parent.close_tab(parent.tab)
 
 
-    def save(text, parent):
+    def save(text, parent, wait=False):
         # not finished
+        if (FileMenuMethods._is_busy(parent)
+                or FileMenuMethods._is_read_only(parent)):
+            return
         file = parent.file
         if not file:
-            FileMenuMethods.save_as(text, parent)
+            FileMenuMethods.save_as(text, parent, wait)
         else:
             if not FileMenuMethods._is_modified(text):
                 pass
             else:
-                FileMenuMethods._save_file(text, file)
+                FileMenuMethods._save_file(text, file, parent.tab, wait)
 
-    def save_as(text, parent):
+    def save_as(text, parent, wait=False):
         # defaultextention="*.*" means that returned path will
         # have an extension chosen from the filetypes list
         # automatically added to it
@@ -208,60 +916,239 @@ class FileMenuMethods:
         # for example "cat.py", will be met with a messagebox
         # "Unacceptable filename", but choosing an existing file
         # will work without problems
-        file = tkinter.filedialog.asksaveasfilename(filetypes=[
+        if (FileMenuMethods._is_busy(parent)
+                or FileMenuMethods._is_read_only(parent)):
+            return
+        file = _filedialog().asksaveasfilename(filetypes=[
             ("All files", '*.*'), ("Text file", '.txt'), ("Python", ".py")],
              defaultextension="*.*")
         if file:
-            FileMenuMethods._save_file(text, file)
-            FileMenuMethods._set_current_file(file, parent)
+            # The tab takes the new name in _finish_save, once the
+            # file is written
+            FileMenuMethods._save_file(text, file, parent.tab, wait)
+
+    def compare_with_saved(text, parent):
+        """Opens the window with the changes of the text since its
+        file were saved."""
+        if (FileMenuMethods._is_busy(parent)
+                or FileMenuMethods._is_read_only(parent)):
+            return
+        if not parent.file or not os.path.isfile(parent.file):
+            parent.statusbar.show_message("No saved file to compare with")
+            return
+        DiffWindow(parent, parent.textspace, parent.file)
 
     def exit(text, parent):
-        if FileMenuMethods._save_modified(text, parent) is None:
-            return
+        parent.save_session()
+        for tab in list(parent.tabs):
+            if tab.is_modified():
+                parent.select_tab(tab)
+                if FileMenuMethods._save_modified(parent.text,
+                                                  parent) is None:
+                    return
+        for tab in parent.tabs:
+            tab.close_journal()
+        # The clipboard of X11 is lost with the program owning it
+        parent.clipboard.hand_off()
         parent.master.destroy()
 
     # Service methods
+    # parent of the methods that open and save files is the Tab the
+    # file is open in, which is not necessarily the selected one
 
-    def _open_file(text, parent, file=None, **options):
+    def _open_file(text, parent, file=None, on_open=None, **options):
         # TODO:
         # Make something that will remember user's last opened directory
         # so on the next open or save initial the saved path will be
         # used as initialdir
-        file = file or tkinter.filedialog.Open(**options).show()
+        file = file or _filedialog().Open(**options).show()
         if not file:
             return
+        try:
+            size = os.path.getsize(file)
+        except OSError as error:
+            FileMenuMethods._message_load_error(error)
+            return
 
+        parent.cancel_loading()
+        parent.textspace.close_large_file()
+        parent.textspace.close_long_lines()
         text.delete("1.0", END)
-        with open(file, 'r') as work_file:
-            for line in work_file:
-                text.insert(END, line)
+        if size > parent.large_file_threshold:
+            FileMenuMethods._open_large_file(text, parent, file, on_open)
+            return
+        # The file is streamed in by a background thread, the rest of
+        # the opening is done in _finish_open after the last chunk.
+        # Lines are highlighted as they come in.
+        parent.textspace.set_lexer(file)
+        parent.loader = FileLoader(
+            text, file,
+            on_progress=parent.statusbar.show_progress,
+            on_done=lambda completed: FileMenuMethods._finish_open(
+                text, parent, file, completed, on_open),
+            on_error=FileMenuMethods._message_load_error,
+            long_line=LONG_LINE_LENGTH,
+            on_long_line=lambda: FileMenuMethods._protect_loading(parent))
+        parent.statusbar.show_progress(0)
+        parent.loader.start()
+
+    def _protect_loading(parent):
+        """Switches the text being loaded to the LongLineView when the
+        FileLoader finds a line too long for the widget.
+        Returns:
+            callable: takes the rest of the blocks of the file.
+        """
+        textspace = parent.textspace
+        view = textspace.protect()
+        parent.update_menu()
+
+        def append(block):
+            offset = len(textspace.document)
+            textspace.document.insert(offset, block)
+            textspace.minimap.on_edit("insert", offset, block)
+            view.schedule_render()
+        return append
+
+    def _finish_open(text, parent, file, completed, on_open=None):
+        """Finishes opening of the file after the FileLoader is done.
+        Args:
+            text (tk.Text): Instance of the tkinter class Text;
+            parent (class): Parent of the class from where this method
+                were called;
+            file (str): Path to the file that were loaded;
+            completed (bool): False if the load were cancelled or
+                failed, only a part of the file is in the text then
+                and it is left untitled, so it can't overwrite the
+                file on save;
+            on_open (callable): called if the load were completed.
+        Returns:
+            None
+        """
+        # The file is saved back in the encoding and with the newlines
+        # it were read with
+        parent.textspace.file_format = parent.loader.format \
+            or DEFAULT_FORMAT
+        loaded = parent.loader.loaded
+        parent.loader = None
+        protected = parent.textspace.long_lines is not None
+        if protected:
+            text.config(state=DISABLED)
         text.mark_set(INSERT, "1.0")
         text.edit_reset()
-        text.edit_modified("False")
-        FileMenuMethods._set_current_file(file, parent)
-
-
-    def _save_file(text, file):
-        with open(file, 'w') as file:
-            # TODO:
-            # Taking all of the text at once will cause problems
-            # when dealing with big files;
-
-            # END+"-1line" used to avoid automatically adding a
-            # newline at the end of the file when saving
-            for line in text.get("1.0", END+"-1line"):
-                file.write(line)
         text.edit_modified(False)
+        if completed:
+            FileMenuMethods._set_current_file(file, parent)
+            parent.start_journal(file)
+            parent.start_watcher(file, loaded)
+            parent.statusbar.show_message(
+                "Long lines, read-only" if protected else "")
+        else:
+            FileMenuMethods._set_current_file(None, parent)
+            parent.close_journal()
+            parent.stop_watcher()
+            parent.statusbar.show_message("Loading cancelled")
+        parent._update_window_title()
+        parent.update_menu()
+        parent.statusbar.schedule_update()
+        if completed and on_open:
+            on_open()
+
+    def _open_large_file(text, parent, file, on_open=None):
+        """Opens the file read-only in the LargeFileView, which keeps
+        only the visible lines in the text."""
+        try:
+            parent.textspace.open_large_file(file)
+        except (OSError, ValueError) as error:
+            FileMenuMethods._message_load_error(error)
+            FileMenuMethods._set_current_file(None, parent)
+            on_open = None
+        else:
+            FileMenuMethods._set_current_file(file, parent)
+            parent.statusbar.show_message("Large file, read-only")
+        parent._update_window_title()
+        if on_open:
+            on_open()
+
+    def _is_read_only(parent):
+        """Checks if the text shows a file in the LargeFileView."""
+        return parent.textspace.large_file is not None
+
+    def _is_busy(parent):
+        """Checks if a file is still being loaded into the text or
+        saved from it."""
+        return (parent.loader is not None or parent.saver is not None
+                or parent.reloader is not None or parent.paster is not None)
+
+    def _wait_for_save(parent):
+        """Blocks until the save running in the background is done."""
+        if parent.saver is not None:
+            parent.saver.wait()
+
+    def _message_load_error(error):
+        title = "Can't open the file"
+        _messagebox().showerror(title=title, message=str(error))
+
+    def _save_file(text, file, parent, wait=False):
+        """Saves contents of the text into the file.
+        Args:
+            text (tk.Text): Instance of the tkinter class Text;
+            file (str): Path to the file;
+            parent (class): Parent of the class from where this method
+                were called;
+            wait (bool): If True returns only after the file is saved,
+                otherwise the file is written in the background.
+        Returns:
+            None
+        """
+        parent.saver = FileSaver(
+            text, file,
+            on_progress=lambda fraction: parent.statusbar.show_progress(
+                fraction, action="Saving", hint=None),
+            on_done=lambda saved, size, seconds: FileMenuMethods._finish_save(
+                text, parent, file, saved, size, seconds),
+            on_error=FileMenuMethods._message_save_error,
+            file_format=parent.textspace.file_format,
+            # The LongLineView keeps only the visible rows in the text
+            document=(parent.textspace.document
+                      if parent.textspace.long_lines is not None else None))
+        if wait:
+            parent.saver.run()
+        else:
+            parent.saver.start()
+
+    def _finish_save(text, parent, file, saved, size, seconds):
+        """Finishes saving of the file after the FileSaver is done."""
+        parent.saver = None
+        if saved:
+            text.edit_modified(False)
+            if file != parent.file:
+                # Saved under a new name with save_as
+                FileMenuMethods._set_current_file(file, parent)
+                parent._update_window_title()
+            # All the newlines are written as one kind
+            textspace = parent.textspace
+            textspace.file_format = textspace.file_format._replace(
+                mixed=False)
+            # The saved file has all the edits, the journal starts over
+            parent.start_journal(file)
+            parent.start_watcher(file, size)
+            parent.statusbar.show_throughput("Saved", size, seconds)
+        else:
+            parent.statusbar.show_message("Saving failed")
 
-    def _message_ask_save(file=None):
+    def _message_save_error(error):
+        title = "Can't save the file"
+        _messagebox().showerror(title=title, message=str(error))
+
+    def _message_ask_save(parent, file=None):
         if file:
-            filename = os.path.basename(filename)
+            filename = os.path.basename(file)
         else:
             filename = "The file"
         title = "Save changes?"
         message = "{} has been modified, save changes?".format(filename)
 
-        return tkinter.messagebox.askyesnocancel(title=title, message=message)
+        return AskSaveDialog(parent, title, message, file).ask()
 
     def _is_modified(text):
         """Checks if text were modified.
@@ -297,10 +1184,14 @@ class FileMenuMethods:
                 assumed that further execution of function from where
                 it was called will stop.
             """
+        # A partly loaded file is not a modification worth saving
+        parent.cancel_loading()
+        FileMenuMethods._wait_for_save(parent)
         if FileMenuMethods._is_modified(text):
-            save_before_action = FileMenuMethods._message_ask_save()
+            save_before_action = FileMenuMethods._message_ask_save(
+                parent, parent.file)
             if save_before_action:
-                FileMenuMethods.save(text, parent)
+                FileMenuMethods.save(text, parent, wait=True)
         else:
             save_before_action = False
 
@@ -317,68 +1208,150 @@ class FileMenuMethods:
             None
         """
         parent.file = file
+        parent.textspace.set_lexer(file)
 
 
 class EditMenuMethods:
     """Container class for Edit menu methods"""
-    # TODO:
-    # Some Edit methods should be grayed out if no text is selected
-    # or undo/redo stuck is empty
     def undo(text):
         text.edit_undo()
 
     def redo(text):
         text.edit_redo()
 
-    def cut(text):
-        EditMenuMethods.copy(text)
+    def cut(text, parent):
+        EditMenuMethods.copy(text, parent)
         EditMenuMethods.delete(text)
 
-    def copy(text):
-        # TODO:
-        # When selected text is copied into the clipboard and then
-        # the program window is closed the clipboard becomes empty.
-        if EditMenuMethods._text_selected(text):
-            text.clipboard_clear()
-            text.clipboard_append(text.selection_get())
-
-    def paste(text):
-        try:
-            clipboard_content = text.clipboard_get()
-        except TclError:
+    def copy(text, parent):
+        """Puts the selected text into the clipboard. The text is taken
+        from the Document as a snapshot, so even a huge selection is
+        not copied into one string."""
+        if not EditMenuMethods._text_selected(text):
             return
-
-        EditMenuMethods.delete(text)
-        text.insert(INSERT, clipboard_content)
+        textspace = parent.textspace
+        if textspace.large_file is not None:
+            # The text widget shows only a window of the file
+            content = text.get(SEL_FIRST, SEL_LAST)
+            parent.clipboard.set([(content, 0, len(content))])
+            return
+        start = textspace.sync.index_to_offset(SEL_FIRST)
+        end = textspace.sync.index_to_offset(SEL_LAST)
+        parent.clipboard.set(textspace.document.snapshot(start, end))
+
+    def paste(text, parent):
+        """Replaces the selection with the text of the clipboard. Big
+        texts are pasted in chunks as one undo step, the progress is
+        shown in the statusbar."""
+        tab = parent.tab
+        if tab.is_busy() or str(text.cget("state")) == DISABLED:
+            return
+        clipboard = parent.clipboard
+        if clipboard.owned and clipboard.length > PASTE_THRESHOLD:
+            chunks, length = clipboard.iter_chunks(), clipboard.length
+        else:
+            content = clipboard.get()
+            if content is None:
+                return
+            if len(content) <= PASTE_THRESHOLD:
+                EditMenuMethods.delete(text)
+                text.insert(INSERT, content)
+                text.see(INSERT)
+                return
+            length = len(content)
+            chunks = (content[start:start + PASTE_CHUNK]
+                      for start in range(0, length, PASTE_CHUNK))
+
+        def on_done(completed):
+            tab.paster = None
+            parent.statusbar.show_message(
+                "Pasted" if completed else "Paste cancelled")
+
+        tab.paster = ChunkedPaste(
+            text, chunks, length,
+            on_progress=lambda fraction: parent.statusbar.show_progress(
+                fraction, action="Pasting"),
+            on_done=on_done)
+        parent.statusbar.show_progress(0, action="Pasting")
+        tab.paster.start()
 
     def delete(text):
         if EditMenuMethods._text_selected(text):
             text.delete(SEL_FIRST, SEL_LAST)
 
-    def find():
-        pass
+    def find(text, parent):
+        """Shows the find bar with incremental search."""
+        parent.findbar.show()
 
-    def find_and_replace():
-        pass
+    def find_and_replace(text, parent):
+        """Shows the find bar with the replace row."""
+        parent.findbar.show(replace=True)
 
-    def find_in_files():
-        pass
+    def find_in_files(text, parent):
+        """Opens the window for search in files of a directory."""
+        FindInFilesWindow(parent)
 
-    def go_to():
-        pass
+    def go_to(text, parent):
+        """Opens the dialog that moves the cursor to a line, a line
+        and a column or a byte offset."""
+        GoToDialog(parent)
 
     def _text_selected(text):
         return text.tag_ranges(SEL)
 
+    def _clipboard_filled(parent):
+        return parent.clipboard.is_filled()
+
 
 class FormatMenuMethods:
     """Container class for Format menu methods"""
-    pass
+    def wrap_words(text, parent, wrap):
+        """Wraps the lines of all the tabs or stops wrapping them.
+        Args:
+            text (tk.Text): text of the selected tab;
+            parent (TextEditor): the editor;
+            wrap (bool): whether the lines should be wrapped.
+        """
+        for tab in parent.tabs:
+            if tab.textspace is not None:
+                tab.textspace.set_wrap(wrap)
+
+    def protect_long_lines(text, parent, protect):
+        """Shows the text of the selected tab read-only in the
+        LongLineView, or puts it back into the widget so it can be
+        edited, which is slow for very long lines.
+        Args:
+            text (tk.Text): text of the selected tab;
+            parent (TextEditor): the editor;
+            protect (bool): whether the text should be protected.
+        """
+        tab = parent.tab
+        textspace = parent.textspace
+        if tab.is_busy() or textspace.large_file is not None:
+            tab.update_menu()
+            return
+        if protect:
+            textspace.protect()
+            parent.statusbar.show_message("Long lines, read-only")
+        else:
+            textspace.unprotect(parent.file)
+            parent.statusbar.show_message("")
+        parent._update_cursor_status()
 
 
 class ViewMenuMethods:
     """Container class for View menu methods"""
-    pass
+    def follow_tail(text, parent, follow):
+        """Makes the selected tab show the lines appended to its file
+        as the file grows, like tail -f.
+        Args:
+            text (tk.Text): text of the selected tab;
+            parent (TextEditor): the editor;
+            follow (bool): whether the file should be followed.
+        """
+        parent.tab.follow_tail = follow
+        if follow:
+            parent.textspace.show_end()
 
 
 class HelpMenuMethods:
@@ -386,7 +1359,7 @@ class HelpMenuMethods:
     def show_help():
         pass
     def about():
-        tkinter.messagebox.showinfo(title=PROGRAM_NAME, message=__doc__)
+        _messagebox().showinfo(title=PROGRAM_NAME, message=__doc__)
 
 
 class MenuMethods(FileMenuMethods, EditMenuMethods,
@@ -411,6 +1384,12 @@ class MenuContents():
             dict(label="Save as...", entry_type="command",
                  accelerator="Ctrl+Shift+S",
                  command=lambda:MenuMethods.save_as(self.text, self.parent)),
+            dict(label="Compare with saved...", entry_type="command",
+                 command=lambda: MenuMethods.compare_with_saved(
+                     self.text, self.parent)),
+            dict(label="Close", entry_type="command", accelerator="Ctrl+W",
+                 command=lambda: MenuMethods.close_file(self.text,
+                                                        self.parent)),
             SEPARATOR,
             dict(label="Exit", entry_type="command",
                  command=lambda:MenuMethods.exit(self.text, self.parent))])
@@ -423,30 +1402,50 @@ class MenuContents():
                  command=lambda: MenuMethods.redo(self.text)),
             SEPARATOR,
             dict(label="Cut", entry_type="command", accelerator="Ctrl+X",
-                 command=lambda: MenuMethods.cut(self.text)),
+                 command=lambda: MenuMethods.cut(self.text, self.parent)),
             dict(label="Copy", entry_type="command", accelerator="Ctrl+C",
-                 command=lambda: MenuMethods.copy(self.text)),
+                 command=lambda: MenuMethods.copy(self.text, self.parent)),
             dict(label="Paste", entry_type="command", accelerator="Ctrl+V",
-                 command=lambda: MenuMethods.paste(self.text)),
+                 command=lambda: MenuMethods.paste(self.text, self.parent)),
             dict(label="Delete", entry_type="command", accelerator="Del",
                  command=lambda: MenuMethods.delete(self.text)),
             SEPARATOR,
-            dict(label="Find...", entry_type="command", accelerator="Ctrl+F"),
+            dict(label="Find...", entry_type="command", accelerator="Ctrl+F",
+                 command=lambda: MenuMethods.find(self.text, self.parent)),
             dict(label="Find and replace...", entry_type="command",
-                 accelerator="Ctrl+Shift+F"),
-            dict(label="Find in files...", entry_type="command"),
-            dict(label="Go to...", entry_type="command")])
+                 accelerator="Ctrl+Shift+F",
+                 command=lambda: MenuMethods.find_and_replace(self.text,
+                                                              self.parent)),
+            dict(label="Find in files...", entry_type="command",
+                 command=lambda: MenuMethods.find_in_files(self.text,
+                                                           self.parent)),
+            dict(label="Go to...", entry_type="command", accelerator="Ctrl+G",
+                 command=lambda: MenuMethods.go_to(self.text, self.parent))])
         self.menus.append(self.edit_menu_content)
     # Format menu:
+        self.wrap_words = tk.BooleanVar(self, value=False)
+        self.protect_long_lines = tk.BooleanVar(self, value=False)
         self.format_menu_content = ("Format", [
-            dict(label="Wrap words", entry_type="checkbutton"),
+            dict(label="Wrap words", entry_type="checkbutton",
+                 variable=self.wrap_words,
+                 command=lambda: MenuMethods.wrap_words(
+                     self.text, self.parent, self.wrap_words.get())),
+            dict(label="Protect long lines", entry_type="checkbutton",
+                 variable=self.protect_long_lines,
+                 command=lambda: MenuMethods.protect_long_lines(
+                     self.text, self.parent, self.protect_long_lines.get())),
             dict(label="Font...", entry_type="command"),])
         self.menus.append(self.format_menu_content)
     # View menu:
         # TODO
         # Statusbar should be a checkbutton
+        self.follow_tail = tk.BooleanVar(self, value=False)
         self.view_menu_content = ("View", [
-            dict(label="Statusbar", entry_type="command")])
+            dict(label="Statusbar", entry_type="command"),
+            dict(label="Follow end of file", entry_type="checkbutton",
+                 variable=self.follow_tail,
+                 command=lambda: MenuMethods.follow_tail(
+                     self.text, self.parent, self.follow_tail.get()))])
         self.menus.append(self.view_menu_content)
 
     # Help menu
@@ -459,13 +1458,31 @@ class MenuContents():
 
         # Lists of commands that should be disabled in
         # specific circumstances
-        # TODO:
-        # Use build in "postcommand" attribute of the Menu class
-        # to configure disabled menu entries when the menu is clicked
         self.disable_on_empty_stack = ["Undo"]
+        self.disable_on_empty_redo_stack = ["Redo"]
         self.disable_on_empty_selection = ["Cut", "Copy", "Delete"]
         self.disable_on_empty_clipboard = ["Paste"]
 
+        # The circumstances are checked only when a menu is opened
+        predicates = {}
+        for labels, predicate in (
+                (self.disable_on_empty_stack,
+                 lambda: self.parent.textspace.history.can_undo),
+                (self.disable_on_empty_redo_stack,
+                 lambda: self.parent.textspace.history.can_redo),
+                (self.disable_on_empty_selection,
+                 lambda: bool(MenuMethods._text_selected(self.text))),
+                (self.disable_on_empty_clipboard,
+                 lambda: MenuMethods._clipboard_filled(self.parent))):
+            predicates.update(dict.fromkeys(labels, predicate))
+        # Menus compiled once, so they can be built any number of times
+        self.compiled_menus = [(label, compile_menu(content, predicates))
+                               for label, content in self.menus]
+
+    def get_compiled_menu(self, label):
+        """Returns compiled content of the menu with the label."""
+        return dict(self.compiled_menus)[label]
+
 
 class Menubar(tk.Frame, MenuContents):
     """Frame containing menus."""
@@ -481,9 +1498,11 @@ class Menubar(tk.Frame, MenuContents):
         self.text = None
         self.parent = parent
 
-        # self.menus inherited from the class MenuContents
-        for menu in self.menus:
-            make_menu_button(self, menu).pack(side=LEFT)
+        # self.compiled_menus inherited from the class MenuContents
+        for menu in self.compiled_menus:
+            # Menus are filled when they are opened for the first
+            # time, the window is shown without waiting for them
+            make_menu_button(self, menu, lazy=True).pack(side=LEFT)
         self.pack(side=TOP, fill=X)
 
     def _get_text(self):
@@ -497,12 +1516,35 @@ class TextSpace(tk.Frame):
 
         # Class attributes
 
+        # Document that holds the text of the text widget and
+        # DocumentSync that keeps it up to date.
+        self.document = Document()
+        self.sync = None
+        # Undo history of the text, kept instead of the one of the
+        # widget so its memory is bounded
+        self.history = UndoHistory()
+        # Highlighter of the syntax of the text
+        self.highlighter = None
+        # Encoding and newlines of the file of the text
+        self.file_format = DEFAULT_FORMAT
+
         # Attributes for GUI widgets.
         # Assigned values during GUI construction
         self.text = None
-        # self.line_numbers = None
+        self.line_numbers = None
         self.x_scrollbar = None
         self.y_scrollbar = None
+        self.minimap = None
+        # Callables called without arguments when the view of the
+        # text changes
+        self.view_listeners = []
+        # LargeFileView of the file shown read-only, if any
+        self.large_file = None
+        # LongLineView of the text with lines too long for the
+        # widget, shown read-only, if any
+        self.long_lines = None
+        # Whether long lines are wrapped
+        self.wrap = False
 
         self.make_widgits()
         self.config_grid()
@@ -510,136 +1552,1549 @@ class TextSpace(tk.Frame):
 
     def make_widgits(self):
         self.make_text()
-        # Currently line numbers disabled
-        # self.make_line_numbers()
+        self.make_line_numbers()
         self.make_scrollbars()
+        self.make_minimap()
+        self.make_highlighter()
 
     def make_line_numbers(self):
         self.line_numbers = LineNumbers(self)
         self.line_numbers.grid(row=0, column=0, sticky=N+S)
+        self.sync.add_listener(self._on_edit)
 
     def make_text(self):
         # Should make a class in a future for a text widget
-        self.text = tk.Text(self, undo=YES)
+        self.text = tk.Text(self, undo=NO)
         self.text.grid(row=0, column=1, sticky=N+W+E+S)
+        self.sync = DocumentSync(self.text, self.document, self.history)
 
     def make_scrollbars(self):
         self.y_scrollbar = tk.Scrollbar(self, orient=VERTICAL)
-        self.y_scrollbar.config(command=self.text.yview)
-        self.text.config(yscrollcommand=self.y_scrollbar.set)
+        self.connect_y_scrollbar()
         self.y_scrollbar.grid(row=0, column=2, sticky=N+S)
 
         self.x_scrollbar = tk.Scrollbar(self, orient=HORIZONTAL)
+        self.connect_x_scrollbar()
+        self.x_scrollbar.grid(row=1, column=0, columnspan=2, sticky=W+E)
+
+    def make_minimap(self):
+        self.minimap = Minimap(self, self.document,
+                               on_jump=self.scroll_to_line)
+        self.minimap.grid(row=0, column=3, sticky=N+S)
+        self.sync.add_listener(self.minimap.on_edit)
+        # The modified marks are dropped when the text is saved
+        self.text.bind('<<Modified>>', lambda event: self.minimap.on_modified(
+            self.text.edit_modified()), add=True)
+
+    def make_highlighter(self):
+        self.highlighter = Highlighter(self.text, self.document)
+        self.sync.add_listener(self.highlighter.on_edit)
+        self.view_listeners.append(self.highlighter.on_view)
+
+    def set_lexer(self, file):
+        """Highlights the text as the contents of the file, judging by
+        its extension. The file shown in the LargeFileView and the
+        text shown in the LongLineView are never highlighted."""
+        lexer = (lexer_for_file(file) if self.large_file is None
+                 and self.long_lines is None else None)
+        self.highlighter.set_lexer(lexer)
+
+    def connect_y_scrollbar(self):
+        self.y_scrollbar.config(command=self.text.yview)
+        self.text.config(yscrollcommand=self._on_yscroll)
+
+    def connect_x_scrollbar(self):
         self.x_scrollbar.config(command=self.text.xview)
         self.text.config(xscrollcommand=self.x_scrollbar.set)
-        self.x_scrollbar.grid(row=1, column=0, columnspan=2, sticky=W+E)
+
+    def _on_yscroll(self, first, last):
+        """yscrollcommand of the text, the widget calls it whenever
+        its view changes."""
+        self.y_scrollbar.set(first, last)
+        self.line_numbers.schedule_redraw()
+        self.minimap.set_view(first, last)
+        for listener in self.view_listeners:
+            listener()
+
+    def _on_render(self):
+        """Called by the LongLineView after it renders its rows."""
+        self.line_numbers.schedule_redraw()
+        self.minimap.set_view(*self.y_scrollbar.get())
+
+    def _on_edit(self, operation, offset, text):
+        # Edits that don't add or remove lines and don't scroll the
+        # text leave the numbers where they are, unless lines are
+        # wrapped and may change their height.
+        if "\n" in text or self.text.cget("wrap") != NONE:
+            self.line_numbers.schedule_redraw()
+
+    def open_large_file(self, file):
+        """Shows the file read-only in a LargeFileView. The vertical
+        scrollbar is handed over to the view."""
+        self.close_large_file()
+        self.file_format = DEFAULT_FORMAT
+        self.large_file = LargeFileView(
+            self.text, self.y_scrollbar, file,
+            on_render=self.line_numbers.schedule_redraw)
+        # The file is not in the Document
+        self.minimap.grid_remove()
+
+    def close_large_file(self):
+        if self.large_file is not None:
+            self.large_file.close()
+            self.large_file = None
+            self.connect_y_scrollbar()
+            self.line_numbers.schedule_redraw()
+            self.minimap.grid()
+
+    def protect(self):
+        """Shows the text read-only in a LongLineView, which puts only
+        the visible rows into the widget. The text stays in the
+        Document, the widget is emptied without editing it.
+        Returns:
+            (LongLineView): the view.
+        """
+        if self.long_lines is None:
+            self.text.config(state=NORMAL)
+            self.sync.command("delete", "1.0", END)
+            self.text.config(wrap=NONE)
+            self.highlighter.set_lexer(None)
+            self.long_lines = LongLineView(
+                self.text, self.x_scrollbar, self.y_scrollbar,
+                self.document, self.sync.command, wrap=self.wrap,
+                on_render=self._on_render)
+            self.sync.view = self.long_lines
+        return self.long_lines
+
+    def unprotect(self, file=None):
+        """Puts the whole text back into the widget, so it can be
+        edited again.
+        Args:
+            file (str): path to the file of the text, for the
+                highlighting.
+        """
+        if self.long_lines is None:
+            return
+        self._close_long_lines()
+        for chunk in self.document.iter_chunks():
+            self.sync.command("insert", "end-1c", chunk)
+        self.text.mark_set(INSERT, "1.0")
+        self.set_lexer(file)
+        self.line_numbers.schedule_redraw()
+
+    def close_long_lines(self):
+        """Drops the LongLineView together with the text, before
+        another file is put into the widget."""
+        if self.long_lines is not None:
+            self._close_long_lines()
+            self.document.clear()
+            self.line_numbers.schedule_redraw()
+            self.minimap.reset()
+
+    def _close_long_lines(self):
+        self.long_lines.close()
+        self.long_lines = None
+        self.sync.view = None
+        self.connect_y_scrollbar()
+        self.connect_x_scrollbar()
+        self.config_text()
+
+    def show_end(self):
+        """Scrolls the text to its end."""
+        if self.long_lines is not None:
+            self.long_lines.yview(MOVETO, 1)
+        else:
+            self.text.see(END)
+
+    def set_wrap(self, wrap):
+        """Wraps the lines at the words, or at any character in the
+        LongLineView, or stops wrapping them."""
+        self.wrap = wrap
+        if self.long_lines is not None:
+            self.long_lines.set_wrap(wrap)
+        else:
+            self.config_text()
+        self.line_numbers.schedule_redraw()
+
+    def show_line(self, line):
+        """Moves the cursor to the start of the line counted from 1
+        and scrolls the text to it."""
+        if self.large_file is not None:
+            self.large_file.show_line(line - 1)
+            return
+        if self.long_lines is not None:
+            offset = self.document.line_start(
+                max(0, min(line - 1, self.document.line_count - 1)))
+            self.long_lines.show_offset(offset)
+            self.text.mark_set(INSERT, self.sync.offset_to_index(offset))
+            return
+        index = "{}.0".format(line)
+        self.text.mark_set(INSERT, index)
+        self.text.see(index)
+
+    def scroll_to_line(self, line):
+        """Scrolls the text so the line counted from 0 is in the middle
+        of the view, the cursor stays where it is."""
+        if self.long_lines is not None:
+            self.long_lines.show_line(line)
+            return
+        linespace = int(self.text.tk.call(
+            "font", "metrics", self.text.cget("font"), "-linespace")) or 1
+        self.text.yview("{}.0".format(line + 1))
+        self.text.yview_scroll(-(self.text.winfo_height() // linespace // 2),
+                               UNITS)
+
+    def show_byte(self, byte):
+        """Moves the cursor to the character at the byte offset in the
+        file and scrolls the text to it."""
+        if self.large_file is not None:
+            self.large_file.show_offset(byte)
+            return
+        offset = self.byte_to_offset(byte)
+        if self.long_lines is not None:
+            self.long_lines.show_offset(offset)
+        index = self.sync.offset_to_index(offset)
+        self.text.mark_set(INSERT, index)
+        self.text.see(index)
+
+    def offset_to_byte(self, offset):
+        """Converts offset in the text to offset in the file, counting
+        the byte order mark, the newlines and the characters as they
+        are encoded in the file_format."""
+        char_size = self.file_format.char_size
+        if char_size is None:
+            byte = self.document.offset_to_byte(offset)
+            char_size = 1
+        else:
+            # Exact for single byte encodings and UTF-32, characters
+            # outside of the BMP take 4 bytes in UTF-16
+            byte = offset * char_size
+        if self.file_format.newline == "\r\n":
+            byte += self.document.line_of_offset(offset) * char_size
+        return len(self.file_format.bom) + byte
+
+    def byte_to_offset(self, byte):
+        """Converts offset in the file to offset in the text, offsets
+        inside of a character are moved to its start."""
+        if self.file_format.char_size is None \
+                and self.file_format.newline != "\r\n":
+            return self.document.byte_to_offset(
+                byte - len(self.file_format.bom))
+        # Bytes grow with offsets, the last offset not after the byte
+        # is found by bisection
+        low, high = 0, len(self.document)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.offset_to_byte(middle) <= byte:
+                low = middle
+            else:
+                high = middle - 1
+        return low
 
     def config_text(self):
-        self.text.config(wrap=NONE)
+        self.text.config(wrap=WORD if self.wrap else NONE)
 
     def config_grid(self):
         self.columnconfigure(1, weight=1)
         self.rowconfigure(0, weight=1)
 
+    def destroy(self):
+        """Stops the pending redraws and gives the text its own command
+        back before the widgets are destroyed."""
+        self.close_large_file()
+        if self.long_lines is not None:
+            self.long_lines.close()
+            self.long_lines = None
+        self.highlighter.close()
+        self.line_numbers.cancel_redraw()
+        self.minimap.cancel_redraw()
+        self.sync.close()
+        tk.Frame.destroy(self)
+
+
+class DocumentSync:
+    """Mirrors edits of a tk.Text widget into a Document.
+
+    The Tcl command of the widget is replaced with a proxy, so every
+    insert, delete and replace - made from python, by the widget's own
+    bindings or by its undo mechanism - is applied to the Document
+    right after the widget. Everything else goes to the widget
+    untouched. The indices are resolved by the proxy before the
+    edit, the same way the widget resolves them.
+
+    Listeners are called after the Document is updated with
+    (operation, offset, text) where operation is "insert" or "delete"
+    and text is the inserted or deleted text. Cursor listeners are
+    called without arguments after the insert mark is set or the
+    selection changes.
+
+    The undo history of the widget is replaced with an UndoHistory:
+    edits are recorded into it and the "edit undo", "edit redo",
+    "edit separator" and "edit reset" commands, including the ones
+    of the widget's own bindings, are done by it.
+
+    While a LongLineView shows the text, the widget holds only the
+    rows of the view, and indices are converted by the view.
+    """
+    HISTORY_COMMANDS = frozenset(
+        ["undo", "redo", "separator", "reset", "canundo", "canredo"])
+
+    # Tcl errors of the widget reach the caller unchanged because the
+    # proxy is written in Tcl, python is only called to report an
+    # edit that already happened.
+    PROXY = textwrap.dedent("""
+        proc ::text_editor_proxy {orig callback args} {
+            set op [lindex $args 0]
+            if {$op in {mark tag}} {
+                # Moves of the cursor and changes of the selection
+                # are reported even when the widget is disabled
+                set result [$orig {*}$args]
+                lassign $args op action name
+                if {($op eq "mark" && $action eq "set"
+                        && $name eq "insert")
+                        || ($op eq "tag" && $action in {add remove}
+                            && $name eq "sel")} {
+                    $callback cursor {} {}
+                }
+                return $result
+            }
+            if {$op eq "edit" && [lindex $args 1] in
+                    {undo redo separator reset canundo canredo}} {
+                # The undo history is kept by python
+                return [$callback [lindex $args 1] {} {}]
+            }
+            if {$op ni {insert delete replace}
+                    || [$orig cget -state] ne "normal"} {
+                return [$orig {*}$args]
+            }
+            switch -- $op {
+                insert {
+                    set index [$orig index [lindex $args 1]]
+                    if {[$orig compare $index == end]} {
+                        set index [$orig index end-1c]
+                    }
+                    set chars ""
+                    foreach {text tags} [lrange $args 2 end] {
+                        append chars $text
+                    }
+                    $orig {*}$args
+                    if {$chars ne ""} {
+                        $callback insert $index $chars
+                    }
+                }
+                delete {
+                    if {[llength $args] > 3} {
+                        # Several ranges, delete them one by one
+                        # starting from the last one
+                        set ranges {}
+                        foreach {first last} [lrange $args 1 end] {
+                            set first [$orig index $first]
+                            if {$last eq ""} {set last "$first + 1c"}
+                            lappend ranges [list {*}[split $first .] \
+                                $first [$orig index $last]]
+                        }
+                        set ranges [lsort -integer -decreasing -index 1 $ranges]
+                        set ranges [lsort -integer -decreasing -index 0 $ranges]
+                        foreach range $ranges {
+                            ::text_editor_proxy $orig $callback delete \
+                                [lindex $range 2] [lindex $range 3]
+                        }
+                        return
+                    }
+                    set first [$orig index [lindex $args 1]]
+                    if {[llength $args] > 2} {
+                        set last [$orig index [lindex $args 2]]
+                    } else {
+                        set last [$orig index "$first + 1c"]
+                    }
+                    # The final newline is never deleted. Deleting
+                    # whole lines up to the end deletes the newline
+                    # before them instead, like the widget does.
+                    if {[$orig compare $last == end]} {
+                        set last [$orig index end-1c]
+                        if {[lindex [split $first .] 1] == 0
+                                && $first ne "1.0"} {
+                            set first [$orig index "$first - 1c"]
+                        }
+                    }
+                    if {[$orig compare $first >= $last]} {
+                        return
+                    }
+                    $orig delete $first $last
+                    $callback delete $first $last
+                }
+                replace {
+                    set first [$orig index [lindex $args 1]]
+                    set auto [$orig cget -autoseparators]
+                    if {$auto} {
+                        $callback separator {} {}
+                        $orig configure -autoseparators 0
+                    }
+                    ::text_editor_proxy $orig $callback delete \
+                        $first [lindex $args 2]
+                    ::text_editor_proxy $orig $callback insert \
+                        $first {*}[lrange $args 3 end]
+                    if {$auto} {
+                        $orig configure -autoseparators 1
+                        $callback separator {} {}
+                    }
+                }
+            }
+            return
+        }
+        """)
+
+    def __init__(self, text, document, history=None):
+        self.text = text
+        self.document = document
+        self.history = history or UndoHistory()
+        self.listeners = []
+        self.cursor_listeners = []
+        # True while edits from the history are applied, they are
+        # not recorded again
+        self._applying = False
+        # LongLineView that renders the Document into the widget
+        self.view = None
+
+        self.orig = text._w + "_orig"
+        callback = text.register(self._on_edit)
+        if not text.tk.call("info", "commands", "::text_editor_proxy"):
+            text.tk.eval(self.PROXY)
+        text.tk.call("rename", text._w, self.orig)
+        text.tk.call("interp", "alias", "", text._w,
+                     "", "::text_editor_proxy", self.orig, callback)
+        self.document.clear()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def close(self):
+        """Removes the proxy, the widget gets its own command back."""
+        self.text.tk.call("interp", "alias", "", self.text._w, "")
+        self.text.tk.call("rename", self.orig, self.text._w)
+
+    def command(self, *args):
+        """Calls the widget's own command, edits made by it are not
+        mirrored into the Document."""
+        return self.text.tk.call(self.orig, *args)
+
+    def add_cursor_listener(self, listener):
+        self.cursor_listeners.append(listener)
+
+    def remove_cursor_listener(self, listener):
+        self.cursor_listeners.remove(listener)
+
+    def index_to_offset(self, index):
+        """Converts index of the text widget to offset in the
+        document."""
+        if self.view is not None:
+            return self.view.index_to_offset(index)
+        line, column = map(int, self.text.index(index).split('.'))
+        if line > self.document.line_count:
+            return len(self.document)
+        return self.document.position_to_offset(line - 1, column)
+
+    def offset_to_index(self, offset):
+        """Converts offset in the document to "line.column" index of
+        the text widget."""
+        if self.view is not None:
+            return self.view.offset_to_index(offset)
+        line, column = self.document.offset_to_position(offset)
+        return "{}.{}".format(line + 1, column)
+
+    def _position_to_offset(self, index):
+        """Converts already resolved index to offset without asking
+        the widget."""
+        line, column = map(int, index.split('.'))
+        return self.document.position_to_offset(line - 1, column)
+
+    def _on_edit(self, operation, first, second):
+        # Exceptions must not get back into the Tcl proxy, they are
+        # reported the same way tkinter reports callback errors.
+        try:
+            if operation == "cursor":
+                for listener in self.cursor_listeners:
+                    listener()
+                return None
+            if operation in self.HISTORY_COMMANDS:
+                return self._edit_history(operation)
+            offset = self._position_to_offset(first)
+            if operation == "insert":
+                text = second
+                self.document.insert(offset, text)
+            else:
+                end = self._position_to_offset(second)
+                text = self.document.get_text(offset, end)
+                self.document.delete(offset, end - offset)
+            if not self._applying:
+                self.history.record(operation, offset, text, bool(
+                    self.text.tk.call(self.orig, "cget", "-autoseparators")))
+            for listener in self.listeners:
+                listener(operation, offset, text)
+        except Exception: # pylint: disable=broad-except
+            self.text._report_exception()
+        return None
+
+    def _edit_history(self, command):
+        """Does the "edit" command of the widget with the history.
+        Returns:
+            bool or str: result of "canundo" and "canredo", empty
+                string for the other commands.
+        """
+        if command == "canundo":
+            return self.history.can_undo
+        if command == "canredo":
+            return self.history.can_redo
+        if command == "separator":
+            self.history.separator()
+        elif command == "reset":
+            self.history.reset()
+        elif str(self.text.cget("state")) == NORMAL:
+            edits = (self.history.undo() if command == "undo"
+                     else self.history.redo())
+            self._apply(edits)
+        return ""
+
+    def _apply(self, edits):
+        """Applies edits from the history and moves the cursor to the
+        last of them, like the widget does on undo."""
+        if not edits:
+            return
+        self._applying = True
+        try:
+            for operation, offset, text in edits:
+                index = self.offset_to_index(offset)
+                if operation == "insert":
+                    self.text.insert(index, text)
+                    cursor = offset + len(text)
+                else:
+                    self.text.delete(
+                        index, self.offset_to_index(offset + len(text)))
+                    cursor = offset
+        finally:
+            self._applying = False
+        self.text.mark_set(INSERT, self.offset_to_index(cursor))
+        self.text.see(INSERT)
+
 
 class LineNumbers(tk.Canvas):
+    """Gutter with numbers of the lines visible in the text widget.
+
+    Only the visible lines are drawn, starting from the one at "@0,0",
+    so the cost of a redraw depends on the height of the widget and
+    not on the length of the text. Canvas items are reused between
+    redraws. Redraws are requested by TextSpace on scrolling and by
+    edits that change the number of lines, and several requests made
+    before the Tk loop gets idle result in one redraw.
+    """
     def __init__(self, parent=None):
-        tk.Canvas.__init__(self, parent)
+        tk.Canvas.__init__(self, parent, highlightthickness=0)
         self.parent = parent
         self.text = self.parent.text
 
-        self.num_of_lines = self.get_num_of_lines()
+        # Canvas text items, the first num_of_items of them are shown
+        self.items = []
+        self.num_of_items = 0
+        self.num_of_digits = 0
+        self._redraw_job = None
 
-        self.set_width(30)
-        self.write_numbers()
+        self.bind('<Configure>', lambda event: self.schedule_redraw())
+        self.schedule_redraw()
 
     def set_width(self, width):
         self.config(width=width)
 
+    def schedule_redraw(self):
+        """Redraws the numbers once the Tk loop gets idle."""
+        if self._redraw_job is None:
+            self._redraw_job = self.after_idle(self.write_numbers)
+
+    def cancel_redraw(self):
+        if self._redraw_job is not None:
+            self.after_cancel(self._redraw_job)
+            self._redraw_job = None
+
     def write_numbers(self):
-        # num_of_lines = self.get_num_of_lines()
-        # if num_of_lines > self.num_of_lines:
-        self.num_of_lines = self.get_num_of_lines()
-        self.text.update()
-        self.delete(ALL)
-
-        for n in range(1, self.num_of_lines+1):
-            i = "{0}.0".format(n)
-            dline = self.text.dlineinfo(i)
-            if dline:
-                y_pos = dline[1]
-                self.create_text(1, y_pos, anchor=N+W, text=n)
-
-        # num_of_digits = len(str(self.num_of_lines))
-        # i = self.text.index('@0,0')
-        # self.text.update()
-        # self.delete(ALL)
-        # # Lines indexed from 1, not from 0, that is why the range
-        # # function called with (1, n+1)
-        # while True:
-        #     dline = self.text.dlineinfo(i)
-        #     if dline:
-        #         y = dline[1]
-        #         linenum = i.split('.')[0]
-        #         # Rjust doesn't work for some reason
-        #         # linenum = linenum.rjust(num_of_digits)
-        #         self.create_text(1, y, anchor=N+W, text=linenum)
-        #         i = self.text.index('{0}+1line'.format(i))
-        #     else:
-        #         break
+        self._redraw_job = None
+        font = self.text.cget("font")
+        first_line = self.get_first_line()
+        self._fit_width(self.get_num_of_lines() + first_line, font)
+
+        shown = 0
+        index = self.text.index('@0,0')
+        while True:
+            dline = self.text.dlineinfo(index)
+            if dline is None:
+                break
+            line = int(index.split('.')[0])
+            number = self.get_line_number(line, first_line)
+            if number is not None:
+                self._show_item(shown, dline[1], number, font)
+                shown += 1
+            # The first visible line may be shown from its middle if
+            # it is wrapped, the next ones are shown from the start
+            index = '{0}.0'.format(line + 1)
+            if self.text.compare(index, ">=", END):
+                break
+
+        for item in self.items[shown:self.num_of_items]:
+            self.itemconfig(item, state=HIDDEN)
+        self.num_of_items = shown
+
+    def _show_item(self, number, y_pos, line, font):
+        """Shows the number-th item of the gutter at y_pos."""
+        if number < len(self.items):
+            item = self.items[number]
+            self.coords(item, self.winfo_width() - 2, y_pos)
+            self.itemconfig(item, text=line, font=font, state=NORMAL)
+        else:
+            item = self.create_text(self.winfo_width() - 2, y_pos,
+                                    anchor=N+E, text=line, font=font)
+            self.items.append(item)
+
+    def _fit_width(self, num_of_lines, font):
+        """Makes the gutter wide enough for the biggest line number."""
+        num_of_digits = len(str(num_of_lines))
+        if num_of_digits != self.num_of_digits:
+            self.num_of_digits = num_of_digits
+            width = self.tk.call("font", "measure", font,
+                                 "0" * max(num_of_digits, 2))
+            self.set_width(int(width) + 6)
+
+    def get_first_line(self):
+        """Number of the file's line shown on the first line of the
+        widget minus one. Not 0 only in the LargeFileView."""
+        large_file = self.parent.large_file
+        return large_file.top_line if large_file is not None else 0
+
+    def get_line_number(self, line, first_line):
+        """Number of the file's line shown on the line of the widget,
+        None if it continues a wrapped line in the LongLineView."""
+        long_lines = self.parent.long_lines
+        if long_lines is not None:
+            return long_lines.line_number(line - 1)
+        return line + first_line
 
     def get_num_of_lines(self):
-        num_of_lines = int(self.text.index(END+'-1l').split('.')[0])
-        return num_of_lines
+        return self.parent.document.line_count
+
+
+class FindBar(tk.Frame):
+    """Frame with incremental search of the text.
+
+    Search starts shortly after the query stops changing and runs in a
+    SearchWorker over a snapshot of the Document, a new query or an
+    edit cancels it and starts a new one. Matches arrive in batches
+    and are kept as arrays of offsets, only the ones in or near the
+    viewport are highlighted in the text widget.
+    """
+    # Delays before the search starts, in milliseconds
+    TYPING_DELAY = 150
+    EDIT_DELAY = 300
+    POLL_INTERVAL = 30
+    # Highlighted matches are limited, so a screen full of one letter
+    # matches doesn't make the text slow
+    MAX_HIGHLIGHTS = 2000
+    TAG = "found"
+
+    def __init__(self, parent=None):
+        tk.Frame.__init__(self, parent)
+        self.parent = parent
+        # TextSpace of the selected tab, set by attach
+        self.textspace = None
+        self.text = None
+        self.sync = None
+
+        self.query = tk.StringVar(self)
+        self.replacement = tk.StringVar(self)
+        self.match_case = tk.BooleanVar(self, value=False)
+        self.regex = tk.BooleanVar(self, value=False)
+        # Offsets of starts and ends of the matches found so far
+        self.starts = array('q')
+        self.ends = array('q')
+        self.worker = None
+        self.visible = False
+        self.replacing = False
+        self._search_job = None
+        self._poll_job = None
+        self._highlight_job = None
+
+        self.make_widgets()
+        self.query.trace_add(
+            "write", lambda *args: self.schedule_search(self.TYPING_DELAY))
+
+    def attach(self, textspace):
+        """Makes the find bar search in the text of the TextSpace
+        instead of the previous one."""
+        if self.textspace is not None:
+            self.stop_search()
+            self.clear_matches()
+            self.sync.remove_listener(self._on_edit)
+            self.textspace.view_listeners.remove(self.schedule_highlight)
+        self.textspace = textspace
+        self.text = textspace.text
+        self.sync = textspace.sync
+        self.text.tag_config(self.TAG, background="yellow")
+        self.text.tag_lower(self.TAG, SEL)
+        self.sync.add_listener(self._on_edit)
+        textspace.view_listeners.append(self.schedule_highlight)
+        if self.visible:
+            self.schedule_search(0)
+
+    def make_widgets(self):
+        # Replace row is packed below the find row only when replacing
+        self.find_row = tk.Frame(self)
+        self.find_row.pack(side=TOP, fill=X)
+        self.replace_row = tk.Frame(self)
+        self.make_find_row(self.find_row)
+        self.make_replace_row(self.replace_row)
+
+    def make_find_row(self, row):
+        tk.Label(row, text="Find:", width=8, anchor=W).pack(side=LEFT)
+        self.entry = tk.Entry(row, textvariable=self.query)
+        self.entry.pack(side=LEFT, expand=YES, fill=X)
+        self.entry.bind('<Return>', lambda event: self.find_next())
+        self.entry.bind('<Shift-Return>',
+                        lambda event: self.find_next(backwards=True))
+        self.entry.bind('<Escape>', lambda event: self.hide())
+        for label, variable in (("Match case", self.match_case),
+                                ("Regex", self.regex)):
+            tk.Checkbutton(row, text=label, variable=variable,
+                           command=lambda: self.schedule_search(0)
+                           ).pack(side=LEFT)
+        tk.Button(row, text="Previous",
+                  command=lambda: self.find_next(backwards=True)
+                  ).pack(side=LEFT)
+        tk.Button(row, text="Next", command=self.find_next).pack(side=LEFT)
+        tk.Button(row, text="Close", command=self.hide).pack(side=LEFT)
+
+    def make_replace_row(self, row):
+        tk.Label(row, text="Replace:", width=8, anchor=W).pack(side=LEFT)
+        self.replace_entry = tk.Entry(row, textvariable=self.replacement)
+        self.replace_entry.pack(side=LEFT, expand=YES, fill=X)
+        self.replace_entry.bind('<Return>', lambda event: self.replace_next())
+        self.replace_entry.bind('<Escape>', lambda event: self.hide())
+        tk.Button(row, text="Replace",
+                  command=self.replace_next).pack(side=LEFT)
+        tk.Button(row, text="Replace all",
+                  command=self.replace_all).pack(side=LEFT)
+
+    def show(self, replace=False):
+        if not self.visible:
+            self.visible = True
+            self.pack(side=BOTTOM, fill=X)
+        if replace and not self.replacing:
+            self.replace_row.pack(side=TOP, fill=X)
+        elif not replace and self.replacing:
+            self.replace_row.pack_forget()
+        self.replacing = replace
+        if EditMenuMethods._text_selected(self.text):
+            self.query.set(self.text.get(SEL_FIRST, SEL_LAST))
+        self.entry.focus()
+        self.entry.select_range(0, END)
+        self.schedule_search(0)
+
+    def hide(self):
+        self.visible = False
+        self.pack_forget()
+        self.stop_search()
+        self.clear_matches()
+        self.text.focus()
+
+    def get_mode(self):
+        return search.query_mode(self.regex.get(), self.match_case.get())
+
+    def schedule_search(self, delay):
+        """(Re)starts the search after delay in milliseconds."""
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(delay, self.start_search)
+
+    def start_search(self):
+        self._search_job = None
+        self.stop_search()
+        self.clear_matches()
+        if not self.visible or not self.query.get():
+            self.parent.statusbar.show_message("")
+            return
+        pattern = self.get_pattern()
+        if pattern is None:
+            return
+        self.worker = search.SearchWorker(pattern,
+                                          self.sync.document.snapshot())
+        self.worker.start()
+        self.parent.statusbar.show_message("Searching...")
+        self._poll_job = self.after(self.POLL_INTERVAL, self._poll)
+
+    def stop_search(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+            self._poll_job = None
+
+    def clear_matches(self):
+        self.starts = array('q')
+        self.ends = array('q')
+        self.text.tag_remove(self.TAG, "1.0", END)
+        self.textspace.minimap.set_hits(self.starts)
+
+    def _poll(self):
+        self._poll_job = None
+        for starts, ends in self.worker.poll():
+            self.starts.extend(starts)
+            self.ends.extend(ends)
+        self.textspace.minimap.set_hits(self.starts)
+        self.schedule_highlight()
+        if self.worker.finished:
+            self.worker = None
+            self.parent.statusbar.show_message(
+                "{} matches".format(len(self.starts)))
+        else:
+            self.parent.statusbar.show_message(
+                "Searching... {} matches".format(len(self.starts)))
+            self._poll_job = self.after(self.POLL_INTERVAL, self._poll)
+
+    def _on_edit(self, operation, offset, text):
+        # Offsets of the matches are not valid after an edit
+        if self.visible and self.query.get():
+            self.stop_search()
+            self.clear_matches()
+            self.schedule_search(self.EDIT_DELAY)
+
+    def schedule_highlight(self):
+        if self._highlight_job is None and self.visible:
+            self._highlight_job = self.after_idle(self.highlight)
+
+    def highlight(self):
+        """Highlights matches in the viewport and one screen above
+        and below it."""
+        self._highlight_job = None
+        self.text.tag_remove(self.TAG, "1.0", END)
+        if not self.starts:
+            return
+        top = self.sync.index_to_offset("@0,0")
+        bottom = self.sync.index_to_offset("@{},{}".format(
+            self.text.winfo_width(), self.text.winfo_height()))
+        margin = bottom - top
+        first = bisect_left(self.ends, top - margin)
+        last = bisect_right(self.starts, bottom + margin)
+        last = min(last, first + self.MAX_HIGHLIGHTS)
+        indices = []
+        for i in range(first, last):
+            indices.append(self.sync.offset_to_index(self.starts[i]))
+            indices.append(self.sync.offset_to_index(self.ends[i]))
+        if indices:
+            self.text.tag_add(self.TAG, *indices)
+
+    def find_next(self, backwards=False):
+        """Selects the next match after the cursor, or the previous
+        one before the selection."""
+        if not self.starts:
+            return
+        if backwards:
+            if EditMenuMethods._text_selected(self.text):
+                cursor = self.sync.index_to_offset(SEL_FIRST)
+            else:
+                cursor = self.sync.index_to_offset(INSERT)
+            i = bisect_left(self.starts, cursor) - 1
+        else:
+            cursor = self.sync.index_to_offset(INSERT)
+            i = bisect_left(self.starts, cursor)
+            if i == len(self.starts):
+                i = 0
+        self.select_match(i)
+
+    def select_match(self, i):
+        self.select_range(self.starts[i], self.ends[i])
+
+    def select_range(self, start, end):
+        """Selects text between two offsets and shows it."""
+        if self.sync.view is not None:
+            # Only the rows in the viewport have indices
+            self.sync.view.show_offset(start)
+        start = self.sync.offset_to_index(start)
+        end = self.sync.offset_to_index(end)
+        self.text.tag_remove(SEL, "1.0", END)
+        self.text.tag_add(SEL, start, end)
+        self.text.mark_set(INSERT, end)
+        self.text.see(start)
+        self.parent._update_cursor_status()
+
+    def get_pattern(self):
+        """Compiles the query, returns None and shows the error in
+        the statusbar if it is invalid."""
+        query = self.query.get()
+        if not query:
+            return None
+        try:
+            return search.compile_query(query, self.get_mode())
+        except re.error as error:
+            self.parent.statusbar.show_message(
+                "Invalid pattern: {}".format(error))
+            return None
+
+    def get_replacement(self, match):
+        """Backreferences in the replacement are expanded only in the
+        regex mode."""
+        if self.regex.get():
+            return match.expand(self.replacement.get())
+        return self.replacement.get()
+
+    def replace_next(self):
+        """Replaces the selected match and selects the next one."""
+        pattern = self.get_pattern()
+        if pattern is None or str(self.text.cget("state")) != NORMAL:
+            return
+        cursor = self.sync.index_to_offset(INSERT)
+        if EditMenuMethods._text_selected(self.text):
+            first = self.sync.index_to_offset(SEL_FIRST)
+            last = self.sync.index_to_offset(SEL_LAST)
+            match = pattern.fullmatch(
+                self.sync.document.get_text(first, last))
+            if match is not None:
+                replacement = self.get_replacement(match)
+                self.text.replace(SEL_FIRST, SEL_LAST, replacement)
+                cursor = first + len(replacement)
+        found = search.find_next(pattern, self.sync.document, cursor)
+        if found is not None:
+            self.select_range(found[0], found[1])
+
+    def replace_all(self):
+        """Replaces all matches. The replacements are computed in one
+        pass over the Document, merged into a few big edits and
+        applied from the last one, so they can be undone at once."""
+        pattern = self.get_pattern()
+        if pattern is None or str(self.text.cget("state")) != NORMAL:
+            return
+        self.stop_search()
+        document = self.sync.document
+        edits = search.plan_replacements(
+            pattern, document.snapshot(), self.replacement.get(),
+            expand=self.regex.get())
+        merged = search.merge_edits(edits, document)
+        # Edits are applied from the end of the text, so offsets of
+        # the ones that are not applied yet stay valid
+        indices = [(self.sync.offset_to_index(start),
+                    self.sync.offset_to_index(end), text)
+                   for start, end, text in merged]
+        self.text.edit_separator()
+        autoseparators = self.text.cget("autoseparators")
+        self.text.config(autoseparators=False)
+        try:
+            for start, end, text in reversed(indices):
+                self.text.replace(start, end, text)
+        finally:
+            self.text.config(autoseparators=autoseparators)
+            self.text.edit_separator()
+        self.parent.statusbar.show_message(
+            "Replaced {} occurrences".format(len(edits)))
+
+
+class FindInFilesWindow(tk.Toplevel):
+    """Window with search in all files of a directory tree.
+
+    The search runs in a search.FileSearch, results are added to the
+    list as they arrive. Double click on a result opens the file on
+    the matched line.
+    """
+    POLL_INTERVAL = 50
+    # Results added to the list per poll, so the window stays
+    # responsive when lots of them arrive at once
+    MAX_RESULTS_PER_POLL = 2000
+
+    def __init__(self, parent=None):
+        tk.Toplevel.__init__(self, parent)
+        self.parent = parent
+        self.title("Find in files")
+
+        self.query = tk.StringVar(self, value=parent.findbar.query.get())
+        directory = os.path.dirname(parent.file) if parent.file else os.getcwd()
+        self.directory = tk.StringVar(self, value=directory)
+        self.match_case = tk.BooleanVar(self, value=False)
+        self.regex = tk.BooleanVar(self, value=False)
+        # (path, line) of every entry of the results list
+        self.locations = []
+        self.pending = []
+        self.file_search = None
+        self._poll_job = None
+
+        self.make_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.query_entry.focus()
+
+    def make_widgets(self):
+        form = tk.Frame(self)
+        form.pack(side=TOP, fill=X)
+        form.columnconfigure(1, weight=1)
+        tk.Label(form, text="Find:").grid(row=0, column=0, sticky=W)
+        self.query_entry = tk.Entry(form, textvariable=self.query)
+        self.query_entry.grid(row=0, column=1, sticky=W+E)
+        self.query_entry.bind('<Return>', lambda event: self.start_search())
+        tk.Label(form, text="In:").grid(row=1, column=0, sticky=W)
+        tk.Entry(form, textvariable=self.directory).grid(row=1, column=1,
+                                                         sticky=W+E)
+        tk.Button(form, text="Browse...",
+                  command=self.ask_directory).grid(row=1, column=2)
+        options = tk.Frame(form)
+        options.grid(row=2, column=1, sticky=W)
+        tk.Checkbutton(options, text="Match case",
+                       variable=self.match_case).pack(side=LEFT)
+        tk.Checkbutton(options, text="Regex",
+                       variable=self.regex).pack(side=LEFT)
+        tk.Button(form, text="Search",
+                  command=self.start_search).grid(row=0, column=2, sticky=W+E)
+
+        self.status = tk.Label(self, anchor=W)
+        self.status.pack(side=BOTTOM, fill=X)
+        results = tk.Frame(self)
+        results.pack(side=TOP, expand=YES, fill=BOTH)
+        self.results = tk.Listbox(results, width=100, height=25)
+        y_scrollbar = tk.Scrollbar(results, orient=VERTICAL,
+                                   command=self.results.yview)
+        self.results.config(yscrollcommand=y_scrollbar.set)
+        y_scrollbar.pack(side=RIGHT, fill=Y)
+        self.results.pack(side=LEFT, expand=YES, fill=BOTH)
+        self.results.bind('<Double-Button-1>', lambda event: self.open_result())
+        self.results.bind('<Return>', lambda event: self.open_result())
+
+    def ask_directory(self):
+        directory = _filedialog().askdirectory(
+            parent=self, initialdir=self.directory.get())
+        if directory:
+            self.directory.set(directory)
+
+    def get_mode(self):
+        return search.query_mode(self.regex.get(), self.match_case.get())
+
+    def start_search(self):
+        self.stop_search()
+        self.results.delete(0, END)
+        self.locations = []
+        self.pending = []
+        query = self.query.get()
+        directory = os.path.abspath(self.directory.get())
+        if not query or not os.path.isdir(directory):
+            self.status.config(text="Nothing to search")
+            return
+        try:
+            pattern = search.compile_bytes_query(query, self.get_mode())
+        except re.error as error:
+            self.status.config(text="Invalid pattern: {}".format(error))
+            return
+        self.file_search = search.FileSearch(directory, pattern)
+        self.file_search.start()
+        self._poll_job = self.after(self.POLL_INTERVAL, self._poll)
+
+    def stop_search(self):
+        if self.file_search is not None:
+            self.file_search.cancel()
+            self.file_search = None
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+            self._poll_job = None
+
+    def _poll(self):
+        self._poll_job = None
+        self.pending.extend(self.file_search.poll())
+        shown = self.pending[:self.MAX_RESULTS_PER_POLL]
+        del self.pending[:self.MAX_RESULTS_PER_POLL]
+        entries = []
+        for path, line, text in shown:
+            self.locations.append((path, line))
+            relative = os.path.relpath(path, self.directory.get())
+            entries.append("{}:{}: {}".format(relative, line, text.strip()))
+        if entries:
+            self.results.insert(END, *entries)
+
+        if self.file_search.finished and not self.pending:
+            error = self.file_search.error
+            if error is not None:
+                self.status.config(text="Search failed: {}".format(
+                    str(error) or type(error).__name__))
+            else:
+                self.status.config(
+                    text="{} matches in {} files searched".format(
+                        len(self.locations), self.file_search.files))
+            self.file_search = None
+            return
+        self.status.config(text="Searching... {} matches".format(
+            len(self.locations)))
+        self._poll_job = self.after(self.POLL_INTERVAL, self._poll)
+
+    def open_result(self):
+        selection = self.results.curselection()
+        if not selection:
+            return
+        path, line = self.locations[selection[0]]
+        parent = self.parent
+        # The tab of the file is selected if the file is already open
+        FileMenuMethods.open(
+            parent.text, parent, path,
+            on_open=lambda: parent.textspace.show_line(line))
+        parent._focus_on_text()
+
+    def close(self):
+        self.stop_search()
+        self.destroy()
+
+
+class DiffWindow(tk.Toplevel):
+    """Window with the changes of the text since its file were saved,
+    the file on disk on the left and the text on the right.
+
+    The file is compared with the text in a diff_view.FileComparison.
+    Both sides are TextSpaces, the DiffView puts into them only the
+    rows in the viewport and takes over their vertical scrollbars, so
+    they always scroll together.
+    """
+    def __init__(self, parent=None, textspace=None, file=None):
+        tk.Toplevel.__init__(self, parent)
+        self.parent = parent
+        self.title("Changes of {}".format(os.path.basename(file)))
+        self.panes = []
+        self.make_widgets()
+        self.view = DiffView(
+            tuple(pane.text for pane in self.panes),
+            tuple(pane.sync.command for pane in self.panes),
+            tuple(pane.y_scrollbar for pane in self.panes))
+        self.comparison = FileComparison(self, textspace.document, file,
+                                         on_done=self._show_changes,
+                                         on_error=self._show_error)
+        self.comparison.start()
+        self.status.config(text="Comparing...")
+
+        self.bind('<n>', lambda event: self.next_change())
+        self.bind('<p>', lambda event: self.previous_change())
+        self.bind('<Escape>', lambda event: self.close())
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def make_widgets(self):
+        toolbar = tk.Frame(self)
+        toolbar.pack(side=TOP, fill=X)
+        tk.Button(toolbar, text="Previous change",
+                  command=self.previous_change).pack(side=LEFT)
+        tk.Button(toolbar, text="Next change",
+                  command=self.next_change).pack(side=LEFT)
+        tk.Button(toolbar, text="Close", command=self.close).pack(side=RIGHT)
+        self.status = tk.Label(toolbar, anchor=W)
+        self.status.pack(side=LEFT, fill=X, padx=4)
+
+        panes = tk.Frame(self)
+        panes.pack(side=TOP, expand=YES, fill=BOTH)
+        for column, label in enumerate(("On disk", "Edited")):
+            frame = tk.Frame(panes)
+            frame.grid(row=0, column=column, sticky=N+W+E+S)
+            panes.columnconfigure(column, weight=1, uniform="panes")
+            tk.Label(frame, text=label, anchor=W).pack(side=TOP, fill=X)
+            pane = TextSpace(frame)
+            # The rows show the numbers of their lines, which are
+            # not the lines of the widget
+            pane.line_numbers.grid_remove()
+            pane.minimap.grid_remove()
+            pane.text.config(width=60, height=30)
+            self.panes.append(pane)
+        panes.rowconfigure(0, weight=1)
+
+    def next_change(self):
+        self._show_status(self.view.next_hunk())
+
+    def previous_change(self):
+        self._show_status(self.view.previous_hunk())
+
+    def _show_changes(self, old, new, hunks):
+        self.comparison = None
+        self.view.set_rows(DiffRows(old, new, hunks))
+        if hunks:
+            self.next_change()
+        else:
+            self.status.config(text="No changes")
+
+    def _show_status(self, hunk):
+        count = len(self.view.rows.hunks)
+        if hunk is not None:
+            self.status.config(text="Change {} of {}".format(hunk + 1, count))
+        elif self.comparison is None:
+            self.status.config(text="No more changes")
+
+    def _show_error(self, error):
+        self.comparison = None
+        self.status.config(text="Can't read the file: {}".format(error))
+
+    def close(self):
+        if self.comparison is not None:
+            self.comparison.cancel()
+            self.comparison = None
+        self.view.close()
+        self.destroy()
+
+
+class AskSaveDialog(tk.Toplevel):
+    """Dialog that asks whether the changes of the text should be
+    saved, and shows the changes in a DiffWindow on request."""
+    def __init__(self, parent=None, title="", message="", file=None):
+        tk.Toplevel.__init__(self, parent)
+        self.parent = parent
+        self.file = file
+        # True for "Save", False for "Don't save", None for "Cancel"
+        self.answer = None
+        self.title(title)
+        self.transient(parent)
+        self.resizable(NO, NO)
+
+        tk.Label(self, text=message).pack(side=TOP, padx=8, pady=8)
+        buttons = tk.Frame(self)
+        buttons.pack(side=TOP, padx=4, pady=4)
+        save = tk.Button(buttons, text="Save",
+                         command=lambda: self.close(True))
+        save.pack(side=LEFT)
+        tk.Button(buttons, text="Don't save",
+                  command=lambda: self.close(False)).pack(side=LEFT)
+        tk.Button(buttons, text="Cancel",
+                  command=lambda: self.close(None)).pack(side=LEFT)
+        if file and os.path.isfile(file):
+            tk.Button(buttons, text="Show changes...",
+                      command=self.show_changes).pack(side=LEFT)
+
+        self.bind('<Return>', lambda event: self.close(True))
+        self.bind('<Escape>', lambda event: self.close(None))
+        self.protocol("WM_DELETE_WINDOW", lambda: self.close(None))
+        save.focus()
+
+    def ask(self):
+        """Waits for the answer.
+        Returns:
+            (bool or None): True if the changes should be saved, False
+                if they should not, None if the action should stop.
+        """
+        self.wait_visibility()
+        self.grab_set()
+        self.wait_window()
+        return self.answer
+
+    def show_changes(self):
+        """Shows the changes, the dialog waits until their window is
+        closed."""
+        window = DiffWindow(self.parent, self.parent.textspace, self.file)
+        window.transient(self)
+        self.grab_release()
+        window.wait_visibility()
+        window.grab_set()
+        self.wait_window(window)
+        self.grab_set()
+        self.focus()
+
+    def close(self, answer):
+        self.answer = answer
+        self.destroy()
+
+
+class GoToDialog(tk.Toplevel):
+    """Dialog that moves the cursor to a position in the text.
+
+    Accepts "line", "line:column" or "@byte" where line and column are
+    counted from 1 and byte from 0. Positions are looked up in the
+    line and byte indices of the Document, so the jump doesn't depend
+    on the size of the text.
+    """
+    POSITION = re.compile(r"\s*(?:@(\d+)|(\d+)(?:\s*[:.,]\s*(\d+))?)\s*$")
+
+    def __init__(self, parent=None):
+        tk.Toplevel.__init__(self, parent)
+        self.parent = parent
+        self.title("Go to")
+        self.transient(parent)
+        self.resizable(NO, NO)
+
+        self.position = tk.StringVar(self)
+        tk.Label(self, text="Line[:column] or @byte offset:").pack(
+            side=TOP, anchor=W, padx=4, pady=2)
+        self.entry = tk.Entry(self, textvariable=self.position, width=30)
+        self.entry.pack(side=TOP, fill=X, padx=4)
+        self.message = tk.Label(self, anchor=W)
+        self.message.pack(side=TOP, fill=X, padx=4)
+        buttons = tk.Frame(self)
+        buttons.pack(side=TOP, anchor=E, padx=4, pady=4)
+        tk.Button(buttons, text="Go", command=self.go).pack(side=LEFT)
+        tk.Button(buttons, text="Cancel", command=self.destroy).pack(side=LEFT)
+
+        self.entry.bind('<Return>', lambda event: self.go())
+        self.bind('<Escape>', lambda event: self.destroy())
+        self.entry.focus()
+
+    def go(self):
+        match = self.POSITION.match(self.position.get())
+        if match is None:
+            self.message.config(text="Expected line, line:column or @byte")
+            return
+        byte, line, column = match.groups()
+        textspace = self.parent.textspace
+        if byte is not None:
+            textspace.show_byte(int(byte))
+        else:
+            textspace.show_line(max(int(line), 1))
+            if column is not None and textspace.long_lines is not None:
+                # Only the rows in the viewport have indices
+                document = textspace.document
+                line = min(max(int(line), 1), document.line_count) - 1
+                end = (document.line_start(line + 1) - 1
+                       if line + 1 < document.line_count else len(document))
+                offset = min(document.line_start(line)
+                             + max(int(column) - 1, 0), end)
+                textspace.long_lines.show_offset(offset)
+                self.parent.text.mark_set(
+                    INSERT, textspace.sync.offset_to_index(offset))
+            elif column is not None and textspace.large_file is None:
+                # The widget stops columns past the end of the line at
+                # the end of the line
+                index = "{}.{}".format(max(int(line), 1),
+                                       max(int(column) - 1, 0))
+                self.parent.text.mark_set(INSERT, index)
+                self.parent.text.see(INSERT)
+        self.parent._update_cursor_status()
+        self.parent._focus_on_text()
+        self.destroy()
 
 
 class Statusbar(tk.Frame):
     """Frame containing text_editor's statusbar.
 
-    Have an indicator that displays current cursor position in
-    "line" | "column" format
+    Have indicators that display length and number of lines of the
+    text, size of the selection and current cursor position in
+    "line" | "column" format. The counts are read from the Document,
+    which is kept up to date from the edits, so the widget is never
+    asked for its text.
 
     TODO:
-        Create "length" and "number of lines" indicator like in the
-        notepad++;
-        Create "sel" indicator akin to one in the notepad++;
         CursorPosition and methods related to it should be separate
         class.
     """
+    # Minimal delay between two updates of the indicators, in
+    # milliseconds. Bursts of edits and cursor moves coming faster
+    # than that, like a held key or a mouse drag, are shown once.
+    UPDATE_DELAY = 16
+
     def __init__(self, parent=None):
         tk.Frame.__init__(self, parent)
         self.parent = parent
         self.pack(side=BOTTOM, expand=NO, fill=X)
+        self._update_job = None
+        # Label of the profiler overlay, made when it is first shown
+        self.profile = None
         self.make_cursor_position_box()
+        self.make_selection_box()
+        self.make_length_box()
+        self.make_format_box()
+        self.make_message_box()
 
     def make_cursor_position_box(self):
         self.cursor_position = tk.Label(self, width=40)
         self.cursor_position.pack(side=RIGHT)
 
+    def make_selection_box(self):
+        self.selection = tk.Label(self, width=24)
+        self.selection.pack(side=RIGHT)
+
+    def make_length_box(self):
+        self.length = tk.Label(self, width=32)
+        self.length.pack(side=RIGHT)
+
+    def make_format_box(self):
+        self.file_format = tk.Label(self, width=16)
+        self.file_format.pack(side=RIGHT)
+
+    def make_message_box(self):
+        self.message = tk.Label(self, anchor=W)
+        self.message.pack(side=LEFT, expand=YES, fill=X)
+
+    def show_message(self, message):
+        """Shows a message on the left side of the statusbar.
+        Args:
+            message (str): text of the message, empty string clears
+                the message.
+        """
+        self.message.config(text=message)
+
+    def show_profile(self, text):
+        """Shows the summary of the latencies made by the Profiler."""
+        if self.profile is None:
+            self.profile = tk.Label(self, anchor=W, fg="#a00000")
+            self.profile.pack(side=RIGHT, before=self.length)
+        self.profile.config(text=text)
+
+    def show_progress(self, fraction, action="Loading",
+                      hint="Esc to cancel"):
+        """Shows progress of the file being loaded or saved.
+        Args:
+            fraction (float): processed part of the file in range
+                between 0 and 1;
+            action (str): what is being done with the file;
+            hint (str or None): shown after the progress in brackets.
+        """
+        message = "{}... {:.0%}".format(action, fraction)
+        if hint:
+            message += " ({})".format(hint)
+        self.show_message(message)
+
+    def show_throughput(self, action, size, seconds):
+        """Shows how fast the file were processed.
+        Args:
+            action (str): what were done with the file;
+            size (int): size of the file in bytes;
+            seconds (float): time it took.
+        """
+        megabytes = size / (1024 * 1024)
+        speed = megabytes / seconds if seconds else 0
+        self.show_message("{} {:.1f} MB in {:.2f} s ({:.1f} MB/s)".format(
+            action, megabytes, seconds, speed))
+
     def get_cursor_pos(self):
         """Get current cursor position.
 
         Returns:
             list: [line, column]
         """
+        textspace = self.parent.textspace
+        if textspace.long_lines is not None:
+            line, column = textspace.document.offset_to_position(
+                textspace.sync.index_to_offset(INSERT))
+            return [line + 1, column]
         return self.parent.text.index(INSERT).split('.')
 
+    def get_cursor_byte(self):
+        """Get offset of the cursor in bytes from the start of the
+        file, read from the byte index of the Document.
+
+        Returns:
+            int: byte offset
+        """
+        textspace = self.parent.textspace
+        offset = textspace.sync.index_to_offset(INSERT)
+        if textspace.large_file is not None:
+            return (textspace.document.offset_to_byte(offset)
+                    + textspace.large_file.top_offset)
+        return textspace.offset_to_byte(offset)
+
+    def get_length(self):
+        """Get length of the text and number of its lines.
+
+        Returns:
+            tuple: (length, lines), length is in bytes for the file
+                shown in the large file view and in characters
+                otherwise
+        """
+        textspace = self.parent.textspace
+        if textspace.large_file is not None:
+            large_file = textspace.large_file
+            return large_file.size, large_file.index.line_count
+        document = textspace.document
+        return len(document), document.line_count
+
+    def get_selection_size(self):
+        """Get size of the selection.
+
+        Returns:
+            tuple: (characters, lines), both 0 if nothing is selected
+        """
+        text = self.parent.text
+        ranges = text.tag_ranges(SEL)
+        if not ranges:
+            return 0, 0
+        sync = self.parent.textspace.sync
+        first = sync.index_to_offset(ranges[0])
+        last = sync.index_to_offset(ranges[-1])
+        document = sync.document
+        lines = document.line_of_offset(last) \
+            - document.line_of_offset(first) + 1
+        return last - first, lines
+
+    def schedule_update(self):
+        """Updates the indicators after UPDATE_DELAY, unless an update
+        is already waiting."""
+        if self._update_job is None:
+            self._update_job = self.after(self.UPDATE_DELAY,
+                                          self.update_indicators)
+
+    def update_indicators(self):
+        self._update_job = None
+        self._update_length()
+        self._update_file_format()
+        self._update_selection()
+        self._update_cursor_position()
+
+    def _update_length(self):
+        self.length.config(text="length : {:,} lines : {:,}".format(
+            *self.get_length()))
+
+    def _update_file_format(self):
+        self.file_format.config(
+            text=self.parent.textspace.file_format.describe())
+
+    def _update_selection(self):
+        self.selection.config(text="Sel : {:,} | {:,}".format(
+            *self.get_selection_size()))
+
     def _update_cursor_position(self):
         """Update cursor position display.
         """
         cursor_pos = self.get_cursor_pos()
-        cursor_pos_text = "line {} col {}".format(*cursor_pos)
+        large_file = self.parent.textspace.large_file
+        if large_file is not None:
+            # Lines of the widget are counted from the top of the view
+            cursor_pos[0] = int(cursor_pos[0]) + large_file.top_line
+        cursor_pos_text = "line {} col {} byte {}".format(
+            *cursor_pos, self.get_cursor_byte())
         self.cursor_position.config(text=cursor_pos_text)
 
 
 class ContextMenu(tk.Menu):
-    def __init__(self, parent=None):
+    """Menu popped up by the right mouse button over the text. Built
+    from the compiled content of a menu of the menubar, so its entries
+    are enabled and disabled the same way."""
+    def __init__(self, parent=None, compiled_menu=None):
         tk.Menu.__init__(self, parent)
-        self.make_context_menu()
+        setup_menu(self, compiled_menu, lazy=True)
+
+    def popup(self, event):
+        self.tk_popup(event.x_root, event.y_root)
 
-        self.context_menu_content = []
+
+def main(argv=None):
+    """Opens the files given on the command line in the editor, or
+    edits them without it in the batch mode.
+    Args:
+        argv (list): command line arguments, the ones of the process
+            if None.
+    Returns:
+        int: exit status.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if "--batch" in argv:
+        # The batch mode needs neither Tk nor a display
+        import batch # pylint: disable=import-outside-toplevel
+        argv.remove("--batch")
+        return batch.main(argv)
+    import argparse # pylint: disable=import-outside-toplevel
+    parser = argparse.ArgumentParser(
+        prog="python -m text_editor",
+        description="Simple text editor made with tkinter.",
+        epilog="Run 'python -m text_editor --batch --help' for the batch "
+               "mode, which finds, replaces and converts files without "
+               "a display.")
+    parser.add_argument("files", nargs="*", metavar="file",
+                        help="file to open")
+    args = parser.parse_args(argv)
+    files = [os.path.abspath(file) for file in args.files]
+    editor = TextEditor(file=files[0] if files else None)
+    for file in files[1:]:
+        MenuMethods.open(editor.text, editor, file)
+    editor.mainloop()
+    return 0
 
 
 if __name__ == '__main__':
-    FILENAME = os.path.abspath(__file__)
-    TextEditor(file=FILENAME).mainloop()
+    sys.exit(main())
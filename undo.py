@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""This module keeps the undo history of the editor.
+
+Only the edits are stored: the operation, the offset and the inserted
+or deleted text. Characters typed or deleted one after another are
+merged into a single edit, and the history is kept below a memory
+limit by forgetting its oldest groups.
+"""
+
+import sys
+import time
+from collections import deque
+
+INSERT = "insert"
+DELETE = "delete"
+
+# Memory the history may take, in bytes.
+UNDO_LIMIT = 64 * 1024 * 1024
+# Keystrokes closer to each other than this number of seconds are
+# undone at once.
+MERGE_TIME = 1.0
+# Edits longer than this number of characters, like pastes, are never
+# merged with the ones before them.
+MERGE_LENGTH = 32
+# Approximate size of an edit without its text, in bytes.
+EDIT_OVERHEAD = 96
+
+
+class _Group:
+    """Edits that are undone and redone at once."""
+    __slots__ = ("edits", "size")
+
+    def __init__(self):
+        self.edits = []
+        self.size = 0
+
+
+def _edit_size(text):
+    return sys.getsizeof(text) + EDIT_OVERHEAD
+
+
+class UndoHistory:
+    """Undo and redo stacks of groups of edits.
+
+    Edits are (operation, offset, text) tuples, where operation is
+    INSERT or DELETE and offset is counted in characters of the text
+    before the edit. A group stays open for the following edits until
+    a separator, a newline or a pause in typing, or until an edit that
+    doesn't continue the last one.
+    """
+    def __init__(self, limit=UNDO_LIMIT):
+        """
+        Args:
+            limit (int): memory the history may take, in bytes.
+        """
+        self.limit = limit
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0
+        self._open = False
+        self._last_time = 0
+
+    @property
+    def depth(self):
+        """Number of groups that can be undone."""
+        return len(self.undo_stack)
+
+    @property
+    def redo_depth(self):
+        """Number of groups that can be redone."""
+        return len(self.redo_stack)
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def record(self, operation, offset, text, autoseparators=True):
+        """Adds the edit to the history and forgets the undone ones.
+        Args:
+            operation (str): INSERT or DELETE;
+            offset (int): offset of the first inserted or deleted
+                character;
+            text (str): inserted or deleted text;
+            autoseparators (bool): if False, the edit joins the open
+                group whatever it is, like in the tk.Text widget.
+        """
+        self._clear_redo()
+        now = time.monotonic()
+        group = self.undo_stack[-1] if self._open and self.undo_stack \
+            else None
+        continues = group is not None and self._continues(
+            group.edits[-1], operation, offset, text, now)
+        if group is None or (autoseparators and not continues):
+            group = _Group()
+            self.undo_stack.append(group)
+
+        if continues:
+            last = group.edits.pop()
+            group.size -= _edit_size(last[2])
+            edit = self._merge(last, offset, text)
+        else:
+            edit = (operation, offset, text)
+        group.edits.append(edit)
+        group.size += _edit_size(edit[2])
+        self.size += _edit_size(edit[2]) - (
+            _edit_size(last[2]) if continues else 0)
+        self._last_time = now
+        # Every typed line is undone separately
+        self._open = not (autoseparators and "\n" in text)
+        self._evict()
+
+    def separator(self):
+        """Closes the open group, the next edit starts a new one."""
+        self._open = False
+
+    def undo(self):
+        """Moves the last group to the redo stack.
+        Returns:
+            list: edits that undo the group, in the order they should
+                be applied.
+        """
+        if not self.undo_stack:
+            return []
+        self._open = False
+        group = self.undo_stack.pop()
+        self.redo_stack.append(group)
+        return [(DELETE if operation == INSERT else INSERT, offset, text)
+                for operation, offset, text in reversed(group.edits)]
+
+    def redo(self):
+        """Moves the last undone group back to the undo stack.
+        Returns:
+            list: edits of the group, in the order they should be
+                applied.
+        """
+        if not self.redo_stack:
+            return []
+        self._open = False
+        group = self.redo_stack.pop()
+        self.undo_stack.append(group)
+        return list(group.edits)
+
+    def reset(self):
+        """Forgets all the edits."""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+        self._open = False
+
+    def _continues(self, last, operation, offset, text, now):
+        """Checks if the edit is the next keystroke after the last
+        one."""
+        if (last[0] != operation or len(text) > MERGE_LENGTH
+                or now - self._last_time > MERGE_TIME):
+            return False
+        if operation == INSERT:
+            return offset == last[1] + len(last[2])
+        # Backspace deletes before the last deleted text, Delete
+        # deletes at the same offset
+        return offset + len(text) == last[1] or offset == last[1]
+
+    @staticmethod
+    def _merge(last, offset, text):
+        operation, last_offset, last_text = last
+        if operation == INSERT:
+            return (INSERT, last_offset, last_text + text)
+        if offset == last_offset:
+            return (DELETE, offset, last_text + text)
+        return (DELETE, offset, text + last_text)
+
+    def _clear_redo(self):
+        for group in self.redo_stack:
+            self.size -= group.size
+        self.redo_stack.clear()
+
+    def _evict(self):
+        """Forgets the oldest groups until the history fits in the
+        limit. A group bigger than the limit is forgotten too, the
+        history is empty then."""
+        while self.size > self.limit and self.undo_stack:
+            self.size -= self.undo_stack.popleft().size
+        if not self.undo_stack:
+            self._open = False
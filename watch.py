@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""This module notices when open files are changed by other programs.
+
+On Linux the directory of the file is watched with inotify, so the
+kernel tells when something happens in it and nothing is done in
+between. Elsewhere, or when inotify is not available, the file is
+polled with os.stat every POLL_INTERVAL. Either way a change is
+confirmed by comparing the inode, the size and the mtime of the file
+with the ones it had before.
+
+FileReloader reads the changed file in a background thread and finds
+the blocks of lines that differ from the text, so only they have to be
+replaced in the widget. Tail reads only the bytes appended to a file
+that grows, like a log.
+"""
+
+import os
+import queue
+import struct
+import sys
+import threading
+from collections import namedtuple
+import tkinter as tk
+from diff import diff_lines, text_edits
+from file_io import make_decoder, read_text
+
+# Files are polled every this number of milliseconds when inotify is
+# not available.
+POLL_INTERVAL = 1000
+# Events that come within this number of milliseconds after the first
+# one are checked together, e.g. the ones of a single write.
+SETTLE_DELAY = 100
+# Appends bigger than this number of bytes are reloaded in the
+# background instead of being read by the Tk loop.
+TAIL_LIMIT = 4 * 1024 * 1024
+# Number of milliseconds between the checks for the result of the
+# FileReloader.
+RESULT_INTERVAL = 20
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM
+              | IN_MOVED_TO | IN_CREATE | IN_DELETE)
+EVENT = struct.Struct("iIII")
+
+FileState = namedtuple("FileState", "inode size mtime")
+
+
+def file_state(file):
+    """Returns FileState of the file, or None if it doesn't exist."""
+    try:
+        status = os.stat(file)
+    except OSError:
+        return None
+    return FileState(status.st_ino, status.st_size, status.st_mtime_ns)
+
+
+class _Inotify:
+    """inotify instance watching one directory, called through ctypes
+    so no extension module is needed."""
+    def __init__(self, directory):
+        """
+        Raises:
+            OSError: if inotify is not available.
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is available only on Linux")
+        import ctypes # pylint: disable=import-outside-toplevel
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory),
+                                  WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, "inotify_add_watch failed", directory)
+
+    def read_names(self):
+        """Reads the waiting events.
+        Returns:
+            set: names of the files the events happened to, or None if
+                the kernel dropped some events.
+        """
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            position = 0
+            while position < len(data):
+                _, mask, _, length = EVENT.unpack_from(data, position)
+                position += EVENT.size
+                if mask & IN_Q_OVERFLOW:
+                    names = None
+                elif names is not None:
+                    names.add(os.fsdecode(
+                        data[position:position + length].rstrip(b"\0")))
+                position += length
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """Calls on_change when the file is changed, replaced or removed.
+
+    state is the FileState the file had the last time it were
+    checked, on_change is called with the old and the new one. The
+    editor's own saves change the file too, refresh is called after
+    them.
+    """
+    def __init__(self, widget, file, on_change, interval=POLL_INTERVAL):
+        """
+        Args:
+            widget (tk.Widget): widget the checks run on;
+            file (str): path to the file;
+            on_change (callable): called with the old and the new
+                FileState, either of them may be None if the file
+                didn't exist;
+            interval (int): milliseconds between the polls, used
+                when inotify is not available.
+        """
+        self.widget = widget
+        self.file = file
+        self.on_change = on_change
+        self.interval = interval
+        self.state = file_state(file)
+        self._name = os.path.basename(file)
+        self._job = None
+        self._inotify = None
+        try:
+            self._inotify = _Inotify(os.path.dirname(os.path.abspath(file)))
+            widget.tk.createfilehandler(self._inotify.fd, tk.READABLE,
+                                        self._on_events)
+        except (OSError, AttributeError, RuntimeError, tk.TclError):
+            # Polling is slower to notice, but works everywhere
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+            self._job = widget.after(interval, self._poll)
+
+    def refresh(self):
+        """Takes the current state of the file as the known one."""
+        self.state = file_state(self.file)
+
+    def close(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        if self._inotify is not None:
+            self.widget.tk.deletefilehandler(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+
+    def check(self):
+        """Compares the state of the file with the known one and calls
+        on_change if they differ."""
+        state = file_state(self.file)
+        if state != self.state:
+            old, self.state = self.state, state
+            self.on_change(old, state)
+
+    def _on_events(self, fd, mask): # pylint: disable=unused-argument
+        names = self._inotify.read_names()
+        if (names is None or self._name in names) and self._job is None:
+            self._job = self.widget.after(SETTLE_DELAY, self._settled)
+
+    def _settled(self):
+        self._job = None
+        self.check()
+
+    def _poll(self):
+        self._job = None
+        self.check()
+        if self._job is None and self._inotify is None:
+            self._job = self.widget.after(self.interval, self._poll)
+
+
+class FileReloader:
+    """Reads the file again in a background thread and finds the
+    edits that turn the text into its new contents.
+
+    The text is taken as a snapshot of the Document when the reloader
+    is created, the widget must not be edited until on_done is called.
+    """
+    def __init__(self, widget, document, file, on_done=None, on_error=None):
+        """
+        Args:
+            widget (tk.Widget): widget the result is polled on;
+            document (Document): document of the text;
+            file (str): path to the file;
+            on_done (callable): called with the edits of
+                diff.text_edits, the FileFormat and the size of the
+                file;
+            on_error (callable): called with the exception that
+                stopped the reading.
+        """
+        self.widget = widget
+        self.file = file
+        self.on_done = on_done
+        self.on_error = on_error
+        self.done = False
+        self._snapshot = document.snapshot()
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._job = None
+
+    def start(self):
+        self._thread.start()
+        self._job = self.widget.after(RESULT_INTERVAL, self._poll)
+
+    def cancel(self):
+        """Drops the result, the thread finishes on its own."""
+        self.done = True
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+
+    def _read(self):
+        try:
+            old = "".join(text[first:last] for text, first, last
+                          in self._snapshot).split("\n")
+            text, file_format, size = read_text(self.file)
+            new = text.split("\n")
+            del text
+            edits = text_edits(old, new, diff_lines(old, new))
+            self._queue.put((edits, file_format, size))
+        except (OSError, ValueError) as error:
+            self._queue.put(error)
+
+    def _poll(self):
+        self._job = None
+        if self.done:
+            return
+        try:
+            result = self._queue.get_nowait()
+        except queue.Empty:
+            self._job = self.widget.after(RESULT_INTERVAL, self._poll)
+            return
+        self.done = True
+        if isinstance(result, Exception):
+            if self.on_error:
+                self.on_error(result)
+        elif self.on_done:
+            self.on_done(*result)
+
+
+class Tail:
+    """Reads the bytes appended to a file since the last read.
+
+    The decoder keeps its state between the reads, so a character or
+    a newline split between two appends is decoded correctly.
+    """
+    def __init__(self, file, file_format, offset):
+        """
+        Args:
+            file (str): path to the file;
+            file_format (FileFormat): format of the file;
+            offset (int): number of bytes of the file already read.
+        """
+        self.file = file
+        self.offset = offset
+        self._decoder = make_decoder(file_format)
+
+    def pending(self, state):
+        """Returns number of bytes appended according to the
+        FileState."""
+        return state.size - self.offset
+
+    def read(self):
+        """Returns the text appended since the last read.
+        Raises:
+            OSError: if the file can't be read.
+        """
+        with open(self.file, 'rb') as work_file:
+            work_file.seek(self.offset)
+            data = work_file.read()
+        self.offset += len(data)
+        return self._decoder.decode(data)